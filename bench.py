@@ -0,0 +1,212 @@
+import argparse
+import contextlib
+import datetime as dt
+import inspect
+import io
+import json
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+import backtrader as bt
+import numpy as np
+
+from feeds import BAR_DTYPE, INTERVALS, ArrayData, to_seconds
+from profiling import FirstBar
+
+
+# Bar counts of the full suite
+SIZES = (10000, 1000000, 10000000)
+
+# Synthetic feeds: every calendar day or every minute from 1970-01-01
+SYNTHETIC = {
+    '1d': 86400,
+    '1m': 60,
+}
+
+# Cerebro settings compared by the suite
+MODES = {
+    'runonce': dict(preload=True, runonce=True),
+    'preload': dict(preload=True, runonce=False),
+    'stream': dict(preload=False, runonce=False),
+    # backtrader streams with exactbars=1: no preload and no runonce
+    'exactbars': dict(exactbars=1),
+}
+
+# Relative change of bars/second or peak RSS reported as a regression
+TOLERANCE = 0.2
+
+
+def strategies():
+    ''' Strategies defined in strategies.py, by name '''
+    import strategies as strg
+    return dict((name, obj) for name, obj in vars(strg).items()
+                if inspect.isclass(obj) and issubclass(obj, bt.Strategy)
+                and obj.__module__ == strg.__name__)
+
+
+def synthetic(size, interval='1d', seed=0):
+    '''Random OHLCV bars (BAR_DTYPE) starting on 1970-01-01.
+
+    The log price is a random walk folded into [-1, 1], so series of any
+    length stay in a realistic price range (about 18 to 136).
+    '''
+    step = SYNTHETIC[interval]
+    end = to_seconds(dt.date(1970, 1, 1)) + step * (size - 1)
+    if end >= to_seconds(dt.date(9999, 1, 1)):
+        raise ValueError('{} bars of {} go past year 9999'.format(size, interval))
+
+    rng = np.random.default_rng(seed)
+    sigma = 0.01 if interval == '1d' else 0.0005
+    walk = np.cumsum(rng.normal(0.0, sigma, size))
+    folded = 1.0 - np.abs(np.mod(walk + 1.0, 4.0) - 2.0)  # triangle wave
+
+    bars = np.zeros(size, dtype=BAR_DTYPE)
+    bars['datetime'] = np.arange(size) * step
+    bars['close'] = 50.0 * np.exp(folded)
+    bars['open'] = bars['close'] * np.exp(rng.normal(0.0, sigma / 4, size))
+    spread = np.abs(rng.normal(0.0, sigma / 2, size))
+    bars['high'] = np.maximum(bars['open'], bars['close']) * (1.0 + spread)
+    bars['low'] = np.minimum(bars['open'], bars['close']) * (1.0 - spread)
+    bars['volume'] = np.round(rng.lognormal(13.0, 0.5, size))
+    return bars
+
+
+def runcase(strategy, interval, size, mode):
+    '''Run one strategy over synthetic bars in this process.
+
+    Returns a dict with the case and its measures: wall time of cerebro.run,
+    startup (until the first bar reaches the strategy, which includes
+    preloading and runonce indicators), bars per second and peak RSS of the
+    process in MB.
+    '''
+    import stratlog
+    stratlog.quiet()
+
+    bars = synthetic(size, interval)
+    timeframe, compression = INTERVALS[interval]
+
+    cerebro = bt.Cerebro(**MODES[mode])
+    cerebro.adddata(ArrayData(dataname=bars, timeframe=timeframe,
+                              compression=compression))
+    if strategy == 'wmaStrategy':
+        cerebro.resampledata(cerebro.datas[0], timeframe=bt.TimeFrame.Weeks)
+    cerebro.broker.setcash(1000)
+    cerebro.addstrategy(strategies()[strategy])
+    cerebro.addanalyzer(FirstBar, _name='clock')
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        strat = cerebro.run()[0]
+    wall = time.perf_counter() - start
+
+    first = strat.analyzers.clock.first or start + wall
+    return dict(strategy=strategy, interval=interval, bars=size, mode=mode,
+                wall=wall, startup=first - start, barspersec=size / wall,
+                peakrss=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0)
+
+
+def _spawncase(strategy, interval, size, mode):
+    # Each case in a new interpreter, for a peak RSS of its own
+    case = dict(strategy=strategy, interval=interval, size=size, mode=mode)
+    proc = subprocess.run([sys.executable, __file__, '--case', json.dumps(case)],
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True)
+    if proc.returncode:
+        # Killed children (out of memory) print nothing
+        lines = proc.stderr.strip().splitlines()
+        return dict(strategy=strategy, interval=interval, bars=size, mode=mode,
+                    error=lines[-1] if lines else
+                    'exit code {}'.format(proc.returncode))
+    return json.loads(proc.stdout)
+
+
+def suite(names=None, intervals=tuple(SYNTHETIC), sizes=SIZES, modes=tuple(MODES),
+          verbose=True):
+    '''Run every combination of strategy, interval, size and mode, each one
+    in its own process. Cases that cannot run (a daily series past year 9999,
+    out of memory...) get an 'error' instead of measures.
+
+    Returns a JSON ready dict with the environment and the results.
+    '''
+    results = []
+    for interval in intervals:
+        for size in sizes:
+            for name in names or strategies():
+                for mode in modes:
+                    result = _spawncase(name, interval, size, mode)
+                    results.append(result)
+                    if verbose:
+                        print(_format(result))
+
+    return dict(python=platform.python_version(), backtrader=bt.__version__,
+                machine=platform.machine(), results=results)
+
+
+def _key(result):
+    return (result['strategy'], result['interval'], result['bars'], result['mode'])
+
+
+def compare(current, baseline, tolerance=TOLERANCE):
+    '''Cases slower (bars/second) or bigger (peak RSS) than in the baseline
+    by more than tolerance, as a list of messages.
+    '''
+    old = dict((_key(r), r) for r in baseline['results'] if 'error' not in r)
+    regressions = []
+    for result in current['results']:
+        before = old.get(_key(result))
+        if before is None or 'error' in result:
+            continue
+
+        if result['barspersec'] < before['barspersec'] * (1.0 - tolerance):
+            regressions.append('{} {} {} {}: {:.0f} bars/s, was {:.0f}'.format(
+                *_key(result), result['barspersec'], before['barspersec']))
+        if result['peakrss'] > before['peakrss'] * (1.0 + tolerance):
+            regressions.append('{} {} {} {}: {:.1f} MB peak, was {:.1f}'.format(
+                *_key(result), result['peakrss'], before['peakrss']))
+
+    return regressions
+
+
+def _format(result):
+    case = '{:<22} {:>3} {:>9} {:<10}'.format(*_key(result))
+    if 'error' in result:
+        return case + ' ' + result['error']
+    return case + ' {:>10.0f} bars/s {:>8.2f} s {:>7.2f} s startup {:>8.1f} MB'.format(
+        result['barspersec'], result['wall'], result['startup'], result['peakrss'])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the strategies over synthetic data')
+    parser.add_argument('--strategies', nargs='+', help='default: all')
+    parser.add_argument('--intervals', nargs='+', default=list(SYNTHETIC),
+                        choices=list(SYNTHETIC))
+    parser.add_argument('--sizes', nargs='+', type=int, default=list(SIZES))
+    parser.add_argument('--modes', nargs='+', default=list(MODES),
+                        choices=list(MODES))
+    parser.add_argument('--output', help='save the results as JSON')
+    parser.add_argument('--baseline', help='JSON results to compare with')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument('--case', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        case = json.loads(args.case)
+        print(json.dumps(runcase(case['strategy'], case['interval'],
+                                 case['size'], case['mode'])))
+        sys.exit(0)
+
+    current = suite(args.strategies, args.intervals, args.sizes, args.modes)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=1)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(current, json.load(f), args.tolerance)
+        for message in regressions:
+            print('REGRESSION', message)
+        sys.exit(1 if regressions else 0)
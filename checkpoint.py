@@ -0,0 +1,174 @@
+import datetime as dt
+import os
+import pickle
+
+import backtrader as bt
+
+
+# Broker attributes saved in a checkpoint
+BROKER_ATTRS = ('cash', 'startingcash', '_value', '_valuemkt', '_valuelever',
+                '_valuemktlever', '_leverage', '_unrealized', '_fundval',
+                '_fundshares')
+
+# Timer attributes tracking the days already seen
+TIMER_ATTRS = ('_curdate', '_curmonth', '_monthmask', '_curweek', '_weekmask')
+
+
+def load(filename):
+    ''' State saved by Checkpoint, None if the file does not exist '''
+    if not os.path.exists(filename):
+        return None
+
+    with open(filename, 'rb') as f:
+        return pickle.load(f)
+
+
+class Checkpoint(bt.Analyzer):
+    '''Save the state of a run to continue it later with the new bars only.
+
+    The state is taken after the last bar with no open orders: broker cash,
+    value, positions and fund shares, the timers of the strategy, its ledger
+    and the attributes listed in its checkpointattrs. Strategies opt in by
+    defining checkpointattrs and calling restore(self) at the end of their
+    start(), the others raise ValueError: they would start again from the
+    starting cash over the new bars only.
+
+    To continue, load the file and run the same strategy over the data from
+    state['fromdate'], which includes the warm up bars its indicators need
+    (minperiod - 1 bars before the first new one). Open trades are not
+    saved: a trade open at the checkpoint starts again in the next run.
+
+    Parameters
+    ----------
+    filename: str
+    Where the state is saved at stop.
+    state: dict
+    State of a previous run to continue from (see load), None to start.
+    '''
+
+    params = (
+        ('filename', 'checkpoint.pkl'),
+        ('state', None),
+    )
+
+    def start(self):
+        if not hasattr(self.strategy, 'checkpointattrs'):
+            raise ValueError('{} cannot be checkpointed, it has no '
+                             'checkpointattrs'.format(type(self.strategy).__name__))
+        self.restored = False  # set by restore, from the strategy start
+        self._snapshot = None
+        self._dates = []  # datetimes of the bars, for the warm up
+
+    def next(self):
+        # Checked here, the strategy start runs after the one of the analyzers
+        if not self.restored:
+            raise ValueError('{} does not call checkpoint.restore in its '
+                             'start'.format(type(self.strategy).__name__))
+
+        broker = self.strategy.broker
+        data = self.strategy.datas[0]
+        self._dates.append(data.datetime[0])
+        # Orders just created wait in submitted until the next bar
+        if broker.submitted or broker.get_orders_open() or broker._cash_addition:
+            return
+
+        strategy = self.strategy
+        self._snapshot = dict(
+            bars=len(self._dates),
+            dt=data.datetime[0],
+            broker=dict((name, getattr(broker, name)) for name in BROKER_ATTRS),
+            positions=[(broker.getposition(d).size, broker.getposition(d).price)
+                       for d in strategy.datas],
+            timers=[dict((name, getattr(t, name)) for name in TIMER_ATTRS)
+                    for t in _timers(strategy)],
+            attrs=dict((name, getattr(strategy, name))
+                       for name in getattr(strategy, 'checkpointattrs', ())),
+            ledger=len(strategy.ledger) if hasattr(strategy, 'ledger') else 0,
+        )
+
+    def stop(self):
+        state = self._snapshot
+        if state is None:
+            return  # orders open on every bar, keep the previous checkpoint
+
+        strategy = self.strategy
+        if hasattr(strategy, 'ledger'):
+            state['ledger'] = strategy.ledger.records[:state['ledger']].copy()
+
+        # Bars needed again by the indicators, counted back from the
+        # first bar after the checkpoint
+        warmup = strategy._minperiod - 1
+        dates = self._dates[:state.pop('bars')]
+        if warmup:
+            fromdate = bt.num2date(dates[max(0, len(dates) - warmup)])
+        elif strategy.datas[0]._timeframe >= bt.TimeFrame.Days:
+            # Daily feeds compare fromdate by date
+            fromdate = dt.datetime.combine(
+                bt.num2date(state['dt']).date() + dt.timedelta(days=1), dt.time())
+        else:
+            fromdate = bt.num2date(state['dt']) + dt.timedelta(seconds=1)
+        state['fromdate'] = fromdate
+        state['strategy'] = type(strategy).__name__
+        self.rets.update(state)
+
+        tmpname = self.p.filename + '.tmp'
+        with open(tmpname, 'wb') as f:
+            pickle.dump(state, f)
+        os.replace(tmpname, self.p.filename)
+
+
+def _timers(strategy):
+    # Timers added by the strategy, in creation order
+    return [t for t in strategy.cerebro._pretimers if t.p.owner is strategy]
+
+
+def _restoretimer(timer, attrs, lastdt):
+    # Timers are started after the strategies, so the days seen are set at
+    # the first check after the checkpoint, warm up bars do not fire it
+    def check(dt0):
+        if dt0 <= lastdt:
+            return False
+
+        del timer.check
+        for name, value in attrs.items():
+            setattr(timer, name, value)
+        return timer.check(dt0)
+
+    timer.check = check
+
+
+def restore(strategy):
+    '''Continue from the state given to the Checkpoint analyzer, if any.
+
+    Called by the strategies from start(), after their own setup.
+    '''
+    checkpoints = [analyzer for analyzer in strategy.analyzers
+                   if isinstance(analyzer, Checkpoint)]
+    for analyzer in checkpoints:
+        analyzer.restored = True
+
+    states = [analyzer.p.state for analyzer in checkpoints
+              if analyzer.p.state is not None]
+    if not states:
+        return
+    state = states[0]
+
+    if state['strategy'] != type(strategy).__name__:
+        raise ValueError('Checkpoint of {}, not of {}'.format(
+            state['strategy'], type(strategy).__name__))
+
+    broker = strategy.broker
+    for name, value in state['broker'].items():
+        setattr(broker, name, value)
+    for data, (size, price) in zip(strategy.datas, state['positions']):
+        if size:
+            broker.positions[data] = bt.Position(size, price)
+
+    for timer, attrs in zip(_timers(strategy), state['timers']):
+        _restoretimer(timer, attrs, state['dt'])
+
+    for name, value in state['attrs'].items():
+        setattr(strategy, name, value)
+
+    if hasattr(strategy, 'ledger'):
+        strategy.ledger.extend(state['ledger'])
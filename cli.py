@@ -0,0 +1,234 @@
+'''Run backtests from JSON run specs.
+
+    python cli.py spec.json [spec.json ...]
+    python cli.py -  # one spec per line from stdin, run as they arrive
+
+A spec file holds one spec or a list of them. A spec is an object with the
+keys of DEFAULTS, the missing ones take their default:
+
+    {"strategy": "wmaStrategy", "params": {"wmaPriceperiod": 20},
+     "tickers": ["KO", "PEP"], "cash": 1000, "resample": ["1wk"],
+     "plot": true}
+
+Only the standard library is imported at start up. backtrader, NumPy and
+the strategies are imported by the first run and matplotlib only if a spec
+plots, so the specs after the first one run in a warm process.
+'''
+import argparse
+import datetime as dt
+import json
+import os
+import sys
+import time
+
+
+# Keys of a run spec and their defaults
+DEFAULTS = dict(
+    strategy='BuyAndHold_More_Fund',  # class name in strategies.py
+    params={},  # strategy params
+    tickers=['KO'],  # one run per ticker
+    cash=1000,
+    fromdate='2007-01-01',
+    todate=None,  # today
+    interval='1d',
+    resample=[],  # intervals added as more datas, e.g. ['1wk'] for wmaStrategy
+    plot=False,  # save <plotdir>/<ticker>.<strategy>.png
+    plotdir='.',
+    cachedir='cache',
+    offline=False,
+)
+
+# DataCache of every (cachedir, offline), kept between specs
+_caches = dict()
+
+
+def load(filename):
+    '''(where, spec) of every spec of a file (one spec or a list), '-' reads
+    JSON lines from stdin as they arrive. where locates the spec in error
+    messages. A spec that cannot be read, is not valid JSON or not an
+    object comes as a ValueError, so the others still run.
+    '''
+    if filename == '-':
+        for number, line in enumerate(sys.stdin, 1):
+            if line.strip():
+                where = 'stdin line {}'.format(number)
+                yield where, _check(_decode(line))
+        return
+
+    try:
+        with open(filename) as f:
+            specs = _decode(f.read())
+    except (IOError, UnicodeDecodeError) as e:
+        specs = ValueError(str(e))
+
+    if isinstance(specs, list):
+        for number, spec in enumerate(specs, 1):
+            yield '{} item {}'.format(filename, number), _check(spec)
+    else:
+        yield filename, _check(specs)
+
+
+def _decode(text):
+    try:
+        return json.loads(text)
+    except ValueError as e:
+        return ValueError('Invalid JSON: {}'.format(e))
+
+
+def _check(spec):
+    if isinstance(spec, (dict, ValueError)):
+        return spec
+    return ValueError('A spec is a JSON object, not {}'.format(
+        type(spec).__name__))
+
+
+# Type of the value of every key, the dates are also checked as ISO dates
+_TYPES = dict(strategy=str, params=dict, tickers=list, cash=(int, float),
+              fromdate=str, todate=str, interval=str, resample=list,
+              plot=bool, plotdir=str, cachedir=str, offline=bool)
+
+
+def resolve(spec):
+    '''The spec with the defaults filled in, ValueError on unknown keys or
+    values of the wrong type
+    '''
+    unknown = set(spec) - set(DEFAULTS)
+    if unknown:
+        raise ValueError('Unknown spec keys: {}'.format(', '.join(sorted(unknown))))
+
+    resolved = dict(DEFAULTS)
+    resolved.update(spec)
+    if isinstance(resolved['tickers'], str):
+        resolved['tickers'] = [resolved['tickers']]
+    resolved['todate'] = resolved['todate'] or dt.date.today().isoformat()
+
+    for key, types in _TYPES.items():
+        value = resolved[key]
+        # bool is an int, but not a cash amount
+        if not isinstance(value, types) or \
+           (isinstance(value, bool) and types is not bool):
+            raise ValueError('{} must be {}, not {}'.format(
+                key, _typename(types), json.dumps(value)))
+    for key in ('tickers', 'resample'):
+        if not all(isinstance(value, str) for value in resolved[key]):
+            raise ValueError('{} must be a list of strings'.format(key))
+    for key in ('fromdate', 'todate'):
+        try:
+            dt.date.fromisoformat(resolved[key])
+        except ValueError:
+            raise ValueError('{} must be a YYYY-MM-DD date, not {}'.format(
+                key, resolved[key]))
+    return resolved
+
+
+def _typename(types):
+    names = dict(str='a string', dict='an object', list='a list',
+                 bool='true or false', int='a number')
+    return names[(types if isinstance(types, type) else types[0]).__name__]
+
+
+def run(spec):
+    '''Run a spec, one Cerebro per ticker.
+
+    Returns one dict per ticker: bars, final value and fund value, startup
+    (seconds from the start of the run, imports of the first run included,
+    until the first bar reaches the strategy), wall time and error, empty if
+    it ran.
+    '''
+    spec = resolve(spec)
+    return [_runticker(spec, ticker) for ticker in spec['tickers']]
+
+
+def _runticker(spec, ticker):
+    start = time.perf_counter()
+    row = dict(strategy=spec['strategy'], ticker=ticker, bars=0,
+               value=float('nan'), fundvalue=float('nan'), startup=0.0,
+               wall=0.0, error='')
+    try:
+        # Heavy imports, done once by the first run
+        import backtrader as bt
+
+        import strategies as strg
+        from datacache import DataCache
+        from profiling import FirstBar
+        from sweep import FinalValue
+
+        strategy = getattr(strg, spec['strategy'], None)
+        if not (isinstance(strategy, type) and issubclass(strategy, bt.Strategy)):
+            raise ValueError('No strategy {} in strategies.py'.format(
+                spec['strategy']))
+
+        key = (spec['cachedir'], spec['offline'])
+        if key not in _caches:
+            _caches[key] = DataCache(*key)
+        cache = _caches[key]
+
+        fromdate = dt.date.fromisoformat(spec['fromdate'])
+        todate = dt.date.fromisoformat(spec['todate'])
+        cerebro = bt.Cerebro(stdstats=spec['plot'])
+        data = cache.getfeed(ticker, fromdate, todate, spec['interval'])
+        cerebro.adddata(data)
+        for interval in spec['resample']:
+            cerebro.adddata(cache.getresampledfeed(ticker, fromdate, todate,
+                                                   interval,
+                                                   source=spec['interval']))
+        cerebro.broker.setcash(spec['cash'])
+        cerebro.addstrategy(strategy, **spec['params'])
+        cerebro.addanalyzer(FinalValue, _name='finalvalue')
+        cerebro.addanalyzer(FirstBar, _name='clock')
+
+        strat = cerebro.run()[0]
+        row['wall'] = time.perf_counter() - start
+        row['startup'] = (strat.analyzers.clock.first or start) - start
+        row['bars'] = len(data)
+        row.update(strat.analyzers.finalvalue.get_analysis())
+
+        if spec['plot']:
+            import plotting
+            os.makedirs(spec['plotdir'], exist_ok=True)
+            plotting.plot(strat, os.path.join(spec['plotdir'], '{}.{}.png'.format(
+                ticker, spec['strategy'])))
+    except Exception as e:
+        row['error'] = '{}: {}'.format(type(e).__name__, e)
+
+    return row
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Run backtests from JSON run specs')
+    parser.add_argument('specs', nargs='+',
+                        help="spec files, '-' for JSON lines from stdin")
+    parser.add_argument('--quiet', action='store_true',
+                        help='no strategy logging')
+    args = parser.parse_args(argv)
+
+    if args.quiet:
+        import stratlog
+        stratlog.quiet()
+
+    failed = False
+    for filename in args.specs:
+        for where, spec in load(filename):
+            try:
+                if isinstance(spec, ValueError):
+                    raise spec
+                rows = run(spec)
+            except Exception as e:
+                # Report it and go on with the next specs
+                if not isinstance(e, ValueError):
+                    e = '{}: {}'.format(type(e).__name__, e)
+                strategy = spec.get('strategy', '') if isinstance(spec, dict) else ''
+                rows = [dict(strategy=str(strategy),
+                             error='{}: {}'.format(where, e))]
+
+            from sweep import print_table
+            print_table(rows)
+            sys.stdout.flush()
+            failed = failed or any(row['error'] for row in rows)
+
+    return int(failed)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,307 @@
+import datetime as dt
+import json
+import os
+
+import numpy as np
+
+from feeds import ArrayData, BAR_DTYPE, INTERVALS, to_seconds
+
+
+def yahoo_fetcher(ticker, fromdate, todate, interval='1d'):
+    '''Download bars from Yahoo Finance (through yfinance).
+
+    Prices are adjusted with the adjusted close and rounded to 2 decimals,
+    the same way backtrader's YahooFinanceData does by default.
+
+    Returns a BAR_DTYPE array with the bars between fromdate and todate
+    (both included).
+    '''
+    import yfinance as yf  # only needed when going to the network
+
+    df = yf.download(ticker, start=fromdate, end=todate + dt.timedelta(days=1),
+                     interval=interval, auto_adjust=False, progress=False)
+    df = df.dropna()
+
+    bars = np.zeros(len(df), dtype=BAR_DTYPE)
+    if not len(df):
+        return bars
+
+    index = df.index.tz_localize(None) if df.index.tz else df.index
+    bars['datetime'] = index.values.astype('datetime64[s]').astype('i8')
+
+    close = df['Close'].values
+    adjclose = df['Adj Close'].values
+    adjfactor = close / adjclose
+
+    bars['open'] = np.round(df['Open'].values / adjfactor, 2)
+    bars['high'] = np.round(df['High'].values / adjfactor, 2)
+    bars['low'] = np.round(df['Low'].values / adjfactor, 2)
+    bars['close'] = np.round(adjclose, 2)
+    # If the price goes down, volume must go up and viceversa
+    bars['volume'] = np.round(df['Volume'].values * adjfactor, 0)
+    return bars
+
+
+class DataCache(object):
+    '''Local cache of OHLCV bars per ticker and interval.
+
+    Bars are stored as NumPy .npy files (one per ticker/interval) next to a
+    small json file with the date range already downloaded. Files are memory
+    mapped when read, so only the touched pages are loaded. When a range is
+    requested only the missing dates are fetched.
+
+    Parameters
+    ----------
+    cachedir: str
+    Directory for the cache files.
+    offline: bool
+    Never touch the network, serve only what is already cached.
+    fetcher: callable
+    fetcher(ticker, fromdate, todate, interval) -> BAR_DTYPE array. Defaults
+    to Yahoo Finance, tests can pass a local stand-in.
+    '''
+
+    def __init__(self, cachedir='cache', offline=False, fetcher=yahoo_fetcher):
+        self.cachedir = cachedir
+        self.offline = offline
+        self.fetcher = fetcher
+
+    def _path(self, ticker, interval, ext='.npy'):
+        return os.path.join(self.cachedir, ticker.upper(), interval + ext)
+
+    def _meta(self, ticker, interval):
+        try:
+            with open(self._path(ticker, interval, '.json')) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return None
+
+    def _write(self, ticker, interval, bars, meta):
+        path = self._path(ticker, interval)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temporary file and rename it, readers with the old file
+        # mapped keep seeing consistent data.
+        with open(path + '.tmp', 'wb') as f:
+            np.save(f, bars)
+        os.replace(path + '.tmp', path)
+
+        with open(self._path(ticker, interval, '.json'), 'w') as f:
+            json.dump(meta, f)
+
+    def coverage(self, ticker, interval='1d'):
+        ''' Downloaded (fromdate, todate) range or None if not cached '''
+        meta = self._meta(ticker, interval)
+        if meta is None:
+            return None
+
+        return (dt.date.fromisoformat(meta['fromdate']),
+                dt.date.fromisoformat(meta['todate']))
+
+    def load(self, ticker, interval='1d'):
+        ''' Memory mapped array with all the cached bars '''
+        path = self._path(ticker, interval)
+        if not os.path.exists(path):
+            return np.zeros(0, dtype=BAR_DTYPE)
+
+        return np.load(path, mmap_mode='r')
+
+    def save(self, ticker, interval, bars, fromdate, todate):
+        ''' Replace the cached bars and the covered date range '''
+        meta = dict(fromdate=fromdate.isoformat(), todate=todate.isoformat())
+        self._write(ticker, interval, bars, meta)
+
+    def get(self, ticker, fromdate, todate, interval='1d'):
+        '''Bars between fromdate and todate (both included).
+
+        Missing dates are fetched and merged into the cache first, unless in
+        offline mode.
+        '''
+        fromdate, todate = _asdate(fromdate), _asdate(todate)
+
+        if not self.offline:
+            self.update(ticker, fromdate, todate, interval)
+        elif self.coverage(ticker, interval) is None:
+            raise IOError('{} {} is not in the cache and offline mode is '
+                          'on'.format(ticker, interval))
+
+        bars = self.load(ticker, interval)
+        secs = bars['datetime']
+        first = np.searchsorted(secs, to_seconds(fromdate))
+        last = np.searchsorted(secs, to_seconds(todate + dt.timedelta(days=1)))
+        return bars[first:last]
+
+    def update(self, ticker, fromdate, todate, interval='1d'):
+        ''' Fetch the dates between fromdate and todate not yet in the cache '''
+        fromdate, todate = _asdate(fromdate), _asdate(todate)
+
+        # Today's bar is not complete yet, do not mark it as downloaded
+        todate = min(todate, dt.date.today() - dt.timedelta(days=1))
+
+        covered = self.coverage(ticker, interval)
+        if covered is None:
+            missing = [(fromdate, todate)]
+        else:
+            # Extend the covered range at both ends so it stays contiguous
+            missing = []
+            if fromdate < covered[0]:
+                missing.append((fromdate, covered[0] - dt.timedelta(days=1)))
+            if todate > covered[1]:
+                missing.append((covered[1] + dt.timedelta(days=1), todate))
+            fromdate = min(fromdate, covered[0])
+            todate = max(todate, covered[1])
+
+        missing = [(f, t) for f, t in missing if f <= t]
+        if not missing:
+            return False
+
+        chunks = [np.asarray(self.load(ticker, interval))]
+        for f, t in missing:
+            chunks.append(self.fetcher(ticker, f, t, interval))
+
+        self.save(ticker, interval, merge(chunks), fromdate, todate)
+        return True
+
+    def resampled(self, ticker, interval='1wk', source='1d'):
+        '''All the cached source bars resampled to interval ('1wk' or '1mo').
+
+        The result is stored next to the source bars and reused until the
+        source changes. When bars were only appended to the source, just the
+        last (maybe partial) period and the new ones are computed again.
+        '''
+        name = source + '.' + interval
+        bars = self.load(ticker, source)
+        state = dict(rows=len(bars),
+                     first=int(bars['datetime'][0]) if len(bars) else None,
+                     last=int(bars['datetime'][-1]) if len(bars) else None)
+
+        meta = self._meta(ticker, name)
+        if meta == state:
+            return self.load(ticker, name)
+
+        if meta and meta['rows'] and meta['first'] == state['first'] and \
+           meta['rows'] <= state['rows'] and \
+           int(bars['datetime'][meta['rows'] - 1]) == meta['last']:
+            # Appended source bars: keep the complete periods
+            done = np.asarray(self.load(ticker, name))[:-1]
+            first = 0
+            if len(done):
+                first = np.searchsorted(bars['datetime'], done['datetime'][-1],
+                                        side='right')
+            result = np.concatenate((done, resample(bars[first:], interval)))
+        else:
+            result = resample(bars, interval)
+
+        self._write(ticker, name, result, state)
+        return result
+
+    def getresampled(self, ticker, fromdate, todate, interval='1wk',
+                     source='1d', lagged=False):
+        '''Resampled bars for the source bars between fromdate and todate.
+
+        Gives the same bars as resampling only the source bars in the range,
+        the first and last periods may be partial.
+
+        backtrader's resampler only delivers a bar when the first source bar
+        of the next period arrives. With lagged=True the bars are stamped
+        with that datetime (the last one with the last source bar), so fed
+        to cerebro they are seen at the same time as with resampledata.
+        '''
+        bars = self.get(ticker, fromdate, todate, source)
+        if not len(bars):
+            return np.zeros(0, dtype=BAR_DTYPE)
+
+        stored = self.resampled(ticker, interval, source)
+        keys = periodkeys(bars['datetime'], interval)
+        storedkeys = periodkeys(stored['datetime'], interval)
+
+        # Only the edge periods can be cut by the dates, compute them again
+        result = resample(bars[keys == keys[0]], interval)
+        if keys[-1] != keys[0]:
+            middle = stored[(storedkeys > keys[0]) & (storedkeys < keys[-1])]
+            tail = resample(bars[keys == keys[-1]], interval)
+            result = np.concatenate((result, middle, tail))
+
+        if lagged:
+            starts = np.flatnonzero(np.diff(keys)) + 1
+            result['datetime'][:-1] = bars['datetime'][starts]
+            result['datetime'][-1] = bars['datetime'][-1]
+
+        return result
+
+    def getfeed(self, ticker, fromdate, todate, interval='1d', **kwargs):
+        ''' Backtrader data feed over the cached bars '''
+        timeframe, compression = INTERVALS[interval]
+        kwargs.setdefault('name', ticker)
+        return ArrayData(dataname=self.get(ticker, fromdate, todate, interval),
+                         timeframe=timeframe, compression=compression,
+                         fromdate=fromdate, todate=todate, **kwargs)
+
+    def getresampledfeed(self, ticker, fromdate, todate, interval='1wk',
+                         source='1d', lagged=True, **kwargs):
+        '''Preloaded feed with the resampled bars, to add to cerebro instead
+        of cerebro.resampledata(data, timeframe=...)
+
+        lagged=True (see getresampled) gives the same results as resampledata.
+        '''
+        timeframe, compression = INTERVALS[interval]
+        kwargs.setdefault('name', ticker + '.' + interval)
+        bars = self.getresampled(ticker, fromdate, todate, interval, source,
+                                 lagged)
+        return ArrayData(dataname=bars, timeframe=timeframe,
+                         compression=compression, **kwargs)
+
+
+def merge(chunks):
+    ''' Sort bars by datetime, later chunks win on repeated datetimes '''
+    bars = np.concatenate(chunks).astype(BAR_DTYPE)
+    # Reverse so that the stable sort puts the latest copy of a bar first
+    bars = bars[::-1][np.argsort(bars['datetime'][::-1], kind='stable')]
+    keep = np.ones(len(bars), dtype=bool)
+    keep[1:] = bars['datetime'][1:] != bars['datetime'][:-1]
+    return bars[keep]
+
+
+def periodkeys(secs, interval):
+    ''' Number of the week (ISO, starting on monday) or month of each bar '''
+    days = np.asarray(secs) // 86400
+    if interval == '1wk':
+        # 1970-01-01 was a thursday
+        return days - (days + 3) % 7
+
+    if interval == '1mo':
+        return days.astype('datetime64[D]').astype('datetime64[M]').astype('i8')
+
+    raise ValueError('Cannot resample to {}'.format(interval))
+
+
+def resample(bars, interval):
+    '''Resample bars to weeks ('1wk') or months ('1mo').
+
+    Like backtrader's resampler: first open, highest high, lowest low, last
+    close, summed volume and the datetime of the last bar of the period.
+    '''
+    if not len(bars):
+        return np.zeros(0, dtype=BAR_DTYPE)
+
+    keys = periodkeys(bars['datetime'], interval)
+    starts = np.flatnonzero(np.diff(keys)) + 1
+    ends = np.append(starts, len(bars)) - 1
+    starts = np.insert(starts, 0, 0)
+
+    out = np.zeros(len(starts), dtype=BAR_DTYPE)
+    out['datetime'] = bars['datetime'][ends]
+    out['open'] = bars['open'][starts]
+    out['high'] = np.maximum.reduceat(bars['high'], starts)
+    out['low'] = np.minimum.reduceat(bars['low'], starts)
+    out['close'] = bars['close'][ends]
+    out['volume'] = np.add.reduceat(bars['volume'], starts)
+    out['openinterest'] = bars['openinterest'][ends]
+    return out
+
+
+def _asdate(when):
+    if isinstance(when, dt.datetime):
+        return when.date()
+    return when
+
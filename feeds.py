@@ -0,0 +1,118 @@
+import backtrader as bt
+import datetime as dt
+import numpy as np
+
+
+# Layout of the OHLCV bars stored by the local cache. The datetime is kept as
+# naive (exchange local) seconds since the epoch.
+BAR_DTYPE = np.dtype([
+    ('datetime', 'i8'),
+    ('open', 'f8'),
+    ('high', 'f8'),
+    ('low', 'f8'),
+    ('close', 'f8'),
+    ('volume', 'f8'),
+    ('openinterest', 'f8'),
+])
+
+# Backtrader ordinal (days since 0001-01-01, plus one) of 1970-01-01.
+EPOCH_ORDINAL = 719163.0
+
+# Bar intervals (Yahoo naming) and their backtrader timeframe/compression.
+INTERVALS = {
+    '1m': (bt.TimeFrame.Minutes, 1),
+    '5m': (bt.TimeFrame.Minutes, 5),
+    '15m': (bt.TimeFrame.Minutes, 15),
+    '30m': (bt.TimeFrame.Minutes, 30),
+    '60m': (bt.TimeFrame.Minutes, 60),
+    '1d': (bt.TimeFrame.Days, 1),
+    '1wk': (bt.TimeFrame.Weeks, 1),
+    '1mo': (bt.TimeFrame.Months, 1),
+}
+
+
+def to_seconds(when):
+    ''' Naive date/datetime to epoch seconds '''
+    if not isinstance(when, dt.datetime):
+        when = dt.datetime.combine(when, dt.time())
+    return int((when - dt.datetime(1970, 1, 1)).total_seconds())
+
+
+def from_seconds(secs):
+    ''' Epoch seconds to naive datetime '''
+    return dt.datetime(1970, 1, 1) + dt.timedelta(seconds=int(secs))
+
+
+class ArrayData(bt.feed.DataBase):
+    '''Data feed over a NumPy structured array of bars (see BAR_DTYPE).
+
+    The array can be a memory-mapped file from the local cache. Only the rows
+    between fromdate and todate are read, chunk rows at a time, so a feed
+    that is not preloaded (exactbars, live mode) never holds all of them.
+
+    Parameters
+    ----------
+    dataname: np.ndarray
+    Structured array with the BAR_DTYPE fields, sorted by datetime.
+    chunk: int
+    Rows converted at once.
+    '''
+
+    params = (
+        ('chunk', 4096),
+    )
+
+    def start(self):
+        super(ArrayData, self).start()
+
+        bars = self.p.dataname
+        secs = bars['datetime']
+
+        # Skip the rows outside of the requested dates with a binary search
+        # instead of loading and discarding them bar by bar.
+        first, last = 0, len(bars)
+        if self.p.fromdate is not None:
+            fromdate = self.p.fromdate
+            if self.p.timeframe >= bt.TimeFrame.Days:
+                fromdate = fromdate.date()  # daily bars are stored at 00:00
+            first = np.searchsorted(secs, to_seconds(fromdate))
+        if self.p.todate is not None:
+            last = np.searchsorted(secs, to_seconds(self.p.todate), side='right')
+        self._bars = bars[first:last]
+        self._lines = [getattr(self.lines, name) for name in BAR_DTYPE.names[1:]]
+        self._next = 0  # first row of the next chunk
+        self._datetimes, self._columns = [], []
+        self._idx = -1
+
+    def _readchunk(self):
+        bars = self._bars[self._next:self._next + self.p.chunk]
+        self._next += len(bars)
+        self._datetimes = self._datenums(bars['datetime'])
+        self._columns = [bars[name].tolist() for name in BAR_DTYPE.names[1:]]
+        self._idx = 0
+
+    def _datenums(self, secs):
+        if self.p.timeframe >= bt.TimeFrame.Days:
+            # Daily and larger bars are stamped at the session end, like
+            # the Yahoo feed does.
+            return [bt.date2num(dt.datetime.combine(from_seconds(s).date(),
+                                                    self.p.sessionend))
+                    for s in secs]
+
+        return (EPOCH_ORDINAL + np.asarray(secs) / 86400.0).tolist()
+
+    def _load(self):
+        self._idx += 1
+
+        if self._idx >= len(self._datetimes):
+            if self._next >= len(self._bars):
+                # exhausted all rows
+                return False
+            self._readchunk()
+
+        idx = self._idx
+        self.lines.datetime[0] = self._datetimes[idx]
+        for line, values in zip(self._lines, self._columns):
+            line[0] = values[idx]
+
+        return True
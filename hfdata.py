@@ -0,0 +1,300 @@
+import csv
+import json
+import os
+
+import backtrader as bt
+import numpy as np
+
+from feeds import ArrayData, BAR_DTYPE, INTERVALS
+
+
+# Columns stored, one fixed-width file each. openinterest is not stored and
+# reads as 0.
+FIELDS = BAR_DTYPE.names[:-1]
+
+# Rows read, converted or written at once
+CHUNK = 1 << 20
+
+# CSV header names of the datetime column
+_DATETIME_NAMES = ('datetime', 'date', 'time', 'timestamp')
+
+
+def _column(path, name):
+    return os.path.join(path, name + '.bin')
+
+
+def _meta(path):
+    with open(os.path.join(path, 'meta.json')) as f:
+        return json.load(f)
+
+
+class HFFile(object):
+    '''Bars stored as one memory-mapped fixed-width file per column (see
+    HFWriter).
+
+    Indexed by a field name it gives that column, by a slice the bars of
+    those rows, like a BAR_DTYPE array. Slicing maps nothing: a column is
+    only mapped when asked for and only over the rows of the slice, so
+    reading the bars chunk by chunk keeps the resident memory at the size
+    of a chunk, however large the file is.
+
+    Parameters
+    ----------
+    path: str
+    Directory written by HFWriter.
+    '''
+
+    def __init__(self, path, first=0, last=None, meta=None):
+        self.path = path
+        self.meta = meta or _meta(path)
+        count = self.meta['count']
+        self.first = first
+        self.last = count if last is None else last
+
+    @property
+    def interval(self):
+        return self.meta['interval']
+
+    def __len__(self):
+        return self.last - self.first
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                raise ValueError('Only contiguous slices')
+            return HFFile(self.path, self.first + start,
+                          self.first + max(start, stop), self.meta)
+
+        dtype = BAR_DTYPE.fields[key][0]
+        if key not in FIELDS:
+            return np.zeros(len(self), dtype=dtype)
+        if not len(self):
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(_column(self.path, key), dtype=dtype, mode='r',
+                         offset=self.first * dtype.itemsize,
+                         shape=(len(self),))
+
+    def dates(self, fromdate=None, todate=None):
+        ''' Rows with their datetime between fromdate and todate (seconds) '''
+        secs = self['datetime']
+        first = 0 if fromdate is None else np.searchsorted(secs, fromdate)
+        last = len(self) if todate is None else \
+            np.searchsorted(secs, todate, side='right')
+        return self[first:last]
+
+
+class HFWriter(object):
+    '''Writes bars as one fixed-width file per column of FIELDS, for HFFile.
+
+    Bars are appended in chunks and must go on in time. The number of bars
+    in meta.json is only updated by close, rows written after it (by a
+    writer that did not close) are dropped by the next writer.
+
+    Parameters
+    ----------
+    path: str
+    Directory, created if needed. Bars already in it are kept and the new
+    ones appended.
+    interval: str
+    Of the bars, see feeds.INTERVALS.
+    '''
+
+    def __init__(self, path, interval='1m'):
+        if interval not in INTERVALS:
+            raise ValueError('Unknown interval {}'.format(interval))
+
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        try:
+            meta = _meta(path)
+        except IOError:
+            meta = dict(interval=interval, count=0)
+        if meta['interval'] != interval:
+            raise ValueError('{} has {} bars, not {}'.format(
+                path, meta['interval'], interval))
+
+        self.meta = meta
+        self.count = meta['count']
+        self._lastsecs = HFFile(path, meta=meta)['datetime'][-1] \
+            if self.count else None
+
+        self._files = []
+        for name in FIELDS:
+            f = open(_column(path, name), 'ab')
+            f.truncate(self.count * BAR_DTYPE.fields[name][0].itemsize)
+            self._files.append(f)
+
+    def append(self, bars):
+        ''' Write BAR_DTYPE bars, after the ones already written '''
+        if not len(bars):
+            return
+
+        secs = bars['datetime']
+        if np.any(secs[1:] <= secs[:-1]) or \
+           (self._lastsecs is not None and secs[0] <= self._lastsecs):
+            raise ValueError('Bars must be sorted and after the ones written')
+
+        for name, f in zip(FIELDS, self._files):
+            f.write(np.ascontiguousarray(bars[name],
+                                         dtype=BAR_DTYPE.fields[name][0]).tobytes())
+        self.count += len(bars)
+        self._lastsecs = secs[-1]
+
+    def close(self):
+        for f in self._files:
+            f.close()
+        self.meta['count'] = self.count
+        with open(os.path.join(self.path, 'meta.json'), 'w') as f:
+            json.dump(self.meta, f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def readcsv(filename, chunk=CHUNK):
+    '''BAR_DTYPE chunks of the bars of a CSV file with a header row.
+
+    Columns are found by name (Date or Datetime, Open, High, Low, Close,
+    Volume, case insensitive), others like Adj Close are ignored, as are
+    rows with empty or null values (Yahoo exports). Times are taken as
+    exchange local, a UTC offset after them is dropped.
+    '''
+    with open(filename, newline='') as f:
+        reader = csv.reader(f)
+        header = [name.strip().lower() for name in next(reader)]
+        names = dict((name, 'datetime' if name in _DATETIME_NAMES else name)
+                     for name in header)
+        columns = [(i, names[name]) for i, name in enumerate(header)
+                   if names[name] in FIELDS]
+        if 'datetime' not in [name for _, name in columns]:
+            raise ValueError('No date column in {}'.format(filename))
+
+        rows = []
+        for row in reader:
+            if row and not any(row[i] in ('', 'null') for i, _ in columns):
+                rows.append(row)
+            if len(rows) == chunk:
+                yield _parse(rows, columns)
+                rows = []
+        if rows:
+            yield _parse(rows, columns)
+
+
+def _parse(rows, columns):
+    bars = np.zeros(len(rows), dtype=BAR_DTYPE)
+    for i, name in columns:
+        values = [row[i] for row in rows]
+        if name == 'datetime':
+            bars[name] = np.array([value[:19] for value in values],
+                                  dtype='datetime64[s]').astype('i8')
+        else:
+            bars[name] = np.array(values, dtype='f8')
+    return bars
+
+
+def convert(source, path, interval='1m', chunk=CHUNK):
+    '''Write bars for HFData.
+
+    Parameters
+    ----------
+    source: str or np.ndarray
+    A CSV file (see readcsv) or BAR_DTYPE bars, such as the memory-mapped
+    ones of DataCache.load, converted chunk rows at a time.
+    path: str
+    See HFWriter, the bars are appended to the ones already there.
+    interval: str
+
+    Returns the number of bars written.
+    '''
+    if isinstance(source, str):
+        chunks = readcsv(source, chunk)
+    else:
+        chunks = (source[i:i + chunk] for i in range(0, len(source), chunk))
+
+    with HFWriter(path, interval) as writer:
+        first = writer.count
+        for bars in chunks:
+            writer.append(bars)
+        return writer.count - first
+
+
+class HFData(ArrayData):
+    '''Data feed over bars converted with convert (see HFFile).
+
+    Only the rows between fromdate and todate are used, found with a binary
+    search over the datetime column. Without preload they are read a chunk
+    at a time, so the memory used does not grow with the number of bars.
+    preload copies the columns into the line buffers a chunk at a time,
+    instead of going bar by bar through _load: no Python object per value
+    and the only memory left is the one of the buffers (56 bytes per bar).
+
+    Use getfeed to have the timeframe of the file set.
+
+    Parameters
+    ----------
+    dataname: str or HFFile
+    chunk: int
+    Rows read at once.
+    '''
+
+    params = (
+        ('chunk', 1 << 16),
+    )
+
+    def start(self):
+        if isinstance(self.p.dataname, str):
+            self.p.dataname = HFFile(self.p.dataname)
+        super(HFData, self).start()
+
+    def preload(self):
+        lines = [self.lines.datetime] + self._lines
+        if self._filters or self._ffilters or self._tzinput or \
+           any(line.mode != line.UnBounded for line in lines):
+            return super(HFData, self).preload()
+
+        for first in range(0, len(self._bars), self.p.chunk):
+            bars = self._bars[first:first + self.p.chunk]
+            datenums = np.asarray(self._datenums(bars['datetime']), dtype='f8')
+            # Same bars as the date checks of load
+            keep = (datenums >= self.fromdate) & (datenums <= self.todate)
+            columns = [datenums] + [bars[name] for name in BAR_DTYPE.names[1:]]
+            for line, values in zip(lines, columns):
+                line.array.frombytes(np.ascontiguousarray(
+                    values[keep], dtype='f8').tobytes())
+        self._next = len(self._bars)
+
+        self._last()
+        self.home()
+
+
+def getfeed(path, fromdate=None, todate=None, **kwargs):
+    ''' HFData over the bars in path, with the timeframe of their interval '''
+    bars = HFFile(path)
+    timeframe, compression = INTERVALS[bars.interval]
+    kwargs.setdefault('name', os.path.basename(os.path.normpath(path)))
+    return HFData(dataname=bars, timeframe=timeframe, compression=compression,
+                  fromdate=fromdate, todate=todate, **kwargs)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from datacache import DataCache
+
+    parser = argparse.ArgumentParser(
+        description='Convert CSV or cached bars for HFData')
+    parser.add_argument('source', help='CSV file, or a ticker with --cached')
+    parser.add_argument('path', help='output directory')
+    parser.add_argument('--interval', default='1m')
+    parser.add_argument('--cached', action='store_true',
+                        help='source is a ticker of the local cache')
+    parser.add_argument('--cachedir', default='cache')
+    args = parser.parse_args()
+
+    source = DataCache(args.cachedir, offline=True).load(
+        args.source, args.interval) if args.cached else args.source
+    print('{} bars written'.format(convert(source, args.path, args.interval)))
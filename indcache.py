@@ -0,0 +1,197 @@
+import array
+import collections
+import hashlib
+
+import backtrader as bt
+from backtrader.metabase import findowner
+
+
+class IndicatorCache(object):
+    '''LRU cache of computed indicator lines.
+
+    Entries are (minperiod, arrays), the arrays being the array.array storage
+    of the lines of the indicator. The least recently used entries are
+    dropped once the stored lines take more than maxbytes.
+
+    Parameters
+    ----------
+    maxbytes: int
+    Memory budget of the stored lines.
+    '''
+
+    def __init__(self, maxbytes=64 * 1024 * 1024):
+        self.maxbytes = maxbytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, minperiod, arrays):
+        if key in self._entries:
+            return
+
+        nbytes = sum(arr.itemsize * len(arr) for arr in arrays)
+        self._entries[key] = (minperiod, arrays, nbytes)
+        self.nbytes += nbytes
+        while self.nbytes > self.maxbytes and self._entries:
+            _, (_, _, dropped) = self._entries.popitem(last=False)
+            self.nbytes -= dropped
+
+    def clear(self):
+        self._entries.clear()
+        self.nbytes = 0
+
+
+# One cache per process, sweep workers fill their own
+_cache = IndicatorCache()
+
+
+def configure(maxbytes=64 * 1024 * 1024):
+    ''' Replace the shared cache with an empty one of maxbytes '''
+    global _cache
+    _cache = IndicatorCache(maxbytes)
+    return _cache
+
+
+def getcache():
+    return _cache
+
+
+class _ReadOnlyArray(array.array):
+    # Storage of cached lines, shared by every strategy using them: writing
+    # to it would change the lines of all of them
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError('Cached indicator lines are shared and read-only')
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _readonly
+    append = extend = insert = pop = remove = byteswap = reverse = _readonly
+    frombytes = fromfile = fromlist = fromunicode = _readonly
+
+
+class _CachedIndicator(bt.Indicator):
+    # Wraps _indcls, only created in runonce mode (see cached). On a cache
+    # miss the wrapped indicator is created as a child and its lines are
+    # stored after being computed, on a hit the stored lines are handed out
+    # and nothing is computed.
+
+    params = (
+        ('indparams', None),
+        ('key', None),
+    )
+
+    _indcls = None
+
+    def __init__(self):
+        self._entry = entry = _cache.get(self.p.key)
+        if entry is None:
+            self._inner = self._indcls(*self.datas, **self.p.indparams)
+            minperiod = self._inner._minperiod
+        else:
+            minperiod = entry[0]
+
+        self.updateminperiod(minperiod)
+        for line in self.lines:
+            line.updateminperiod(minperiod)
+
+    def _plotlabel(self):
+        # Params of the wrapped indicator, not the cache key
+        params = dict(self._indcls.params._getitems())
+        params.update(self.p.indparams)
+        return [params[name] for name in self._indcls.params._getkeys()]
+
+    def once(self, start, end):
+        if self._entry is None:
+            # One copy, made read-only, the inner lines stay writable
+            arrays = [_ReadOnlyArray(line.array.typecode, line.array)
+                      for line in self._inner.lines]
+            _cache.put(self.p.key, self._inner._minperiod, arrays)
+        else:
+            arrays = self._entry[1]
+
+        # Same data, same length: share the storage instead of copying
+        for line, arr in zip(self.lines, arrays):
+            line.array = arr
+
+
+_classes = dict()
+
+
+def _cachedclass(indcls):
+    # Wrapper class with the lines and plotting info of indcls
+    cls = _classes.get(indcls)
+    if cls is None:
+        plotinfo = dict(indcls.plotinfo._getitems())
+        plotinfo['plotname'] = plotinfo.get('plotname') or indcls.__name__
+        cls = type('Cached' + indcls.__name__, (_CachedIndicator,), dict(
+            _indcls=indcls,
+            lines=indcls.lines._getlines(),
+            plotinfo=plotinfo,
+            plotlines=dict(indcls.plotlines._getitems()),
+        ))
+        _classes[indcls] = cls
+    return cls
+
+
+def _fingerprint(obj):
+    # Identifies the values of an indicator input: the key of a cached
+    # indicator or a digest of all the lines of a preloaded data/line. None
+    # if the values are not known yet (not preloaded, plain indicator)
+    if isinstance(obj, _CachedIndicator):
+        return obj.p.key
+
+    digest = hashlib.blake2b(digest_size=16)
+    size = None
+    for line in obj.lines:
+        if not len(line.array):
+            return None
+        size = len(line.array)
+        digest.update(line.array)
+    return (size, digest.digest())
+
+
+def cached(indcls, *datas, **kwargs):
+    '''Create indcls(*datas, **kwargs) through the shared cache.
+
+    To be called from a strategy __init__ instead of creating the indicator.
+    Inputs are identified by their values, so every strategy instance of an
+    optstrategy grid (and every Cerebro of a sweep worker) asking for the
+    same indicator, params and data gets the same computed lines and only
+    the first one computes them. The lines are shared, not copied, and are
+    read-only (TypeError on writes).
+
+    Inputs can be preloaded data feeds, their lines or other cached
+    indicators; resampled feeds (resampledata) are not filled yet when the
+    strategy is created. The cache is only used in runonce mode, otherwise
+    (runonce=False, preload=False, exactbars, live feeds) and for any other
+    input the plain indicator is returned.
+    '''
+    cerebro = findowner(None, bt.Strategy).cerebro
+    if not (cerebro._dorunonce and cerebro._dopreload):
+        return indcls(*datas, **kwargs)
+
+    fingerprints = tuple(_fingerprint(data) for data in datas)
+    if None in fingerprints:
+        return indcls(*datas, **kwargs)
+
+    paramnames = indcls.params._getkeys()
+    indparams = dict((k, v) for k, v in kwargs.items() if k in paramnames)
+    others = dict((k, v) for k, v in kwargs.items() if k not in paramnames)
+
+    params = dict(indcls.params._getitems())
+    params.update(indparams)
+    key = (indcls, tuple(sorted(params.items())), fingerprints)
+    return _cachedclass(indcls)(*datas, indparams=indparams, key=key, **others)
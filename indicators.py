@@ -0,0 +1,94 @@
+import array
+import math
+
+import backtrader as bt
+import numpy as np
+
+
+def _setslice(line, start, end, values):
+    # Copy a NumPy array into the array.array storage of a line
+    chunk = array.array('d')
+    chunk.frombytes(np.ascontiguousarray(values, dtype='d').tobytes())
+    line.array[start:end] = chunk
+
+
+class RollingStats(bt.Indicator):
+    '''Rolling sum, mean and standard deviation (population) of a line.
+
+    The window is the last period values ending lag bars ago. Each new bar
+    only adds the value entering the window and removes the one leaving it,
+    so the cost per bar does not depend on the period. The indicator is
+    clocked by its data: on a weekly line used from a daily strategy nothing
+    is recomputed until a new weekly bar arrives. In runonce mode the whole
+    line is computed with NumPy cumulative sums.
+
+    Parameters
+    ----------
+    period: int
+    Number of values in the window.
+    lag: int
+    Bars between the current one and the newest value of the window, 1
+    leaves the current bar out.
+    '''
+
+    lines = ('sum', 'mean', 'std', 'sumsq',)
+    params = (
+        ('period', 4),
+        ('lag', 0),
+    )
+    plotlines = dict(sum=dict(_plotskip=True), sumsq=dict(_plotskip=True),
+                     std=dict(_plotskip=True))
+
+    def __init__(self):
+        self.addminperiod(self.p.period + self.p.lag)
+        self._lastlen = None
+        self._lastval = None
+
+    def _set(self, total, totalsq):
+        period = self.p.period
+        mean = total / period
+        self.lines.sum[0] = total
+        self.lines.sumsq[0] = totalsq
+        self.lines.mean[0] = mean
+        self.lines.std[0] = math.sqrt(max(totalsq / period - mean * mean, 0.0))
+
+    def nextstart(self):
+        window = self.data.get(ago=-self.p.lag, size=self.p.period)
+        self._set(math.fsum(window), math.fsum(x * x for x in window))
+        self._lastlen, self._lastval = len(self.data), self.data[-self.p.lag]
+
+    def next(self):
+        # Same data bar as in the last call (the clock of the strategy moved,
+        # not the one of the data): nothing to update
+        newest = self.data[-self.p.lag]
+        if len(self.data) == self._lastlen and newest == self._lastval:
+            return
+        self._lastlen, self._lastval = len(self.data), newest
+
+        # Written in terms of the previous values of the lines, so calling it
+        # again for the same bar (replayed data) gives the same result
+        oldest = self.data[-self.p.lag - self.p.period]
+        self._set(self.lines.sum[-1] + newest - oldest,
+                  self.lines.sumsq[-1] + newest * newest - oldest * oldest)
+
+    def oncestart(self, start, end):
+        self.once(start, end)
+
+    def once(self, start, end):
+        period, lag = self.p.period, self.p.lag
+
+        # Copy (not a view): a view would keep the array.array from growing
+        values = np.array(self.data.array[:end], dtype='d')
+        csum = np.concatenate(([0.0], np.cumsum(values)))
+        csumsq = np.concatenate(([0.0], np.cumsum(values * values)))
+
+        newest = np.arange(start, end) - lag + 1  # window end (excluded)
+        total = csum[newest] - csum[newest - period]
+        totalsq = csumsq[newest] - csumsq[newest - period]
+        mean = total / period
+        std = np.sqrt(np.maximum(totalsq / period - mean * mean, 0.0))
+
+        _setslice(self.lines.sum, start, end, total)
+        _setslice(self.lines.sumsq, start, end, totalsq)
+        _setslice(self.lines.mean, start, end, mean)
+        _setslice(self.lines.std, start, end, std)
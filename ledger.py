@@ -0,0 +1,129 @@
+import itertools
+import os
+import time
+
+import numpy as np
+
+
+# Kinds of ledger records
+BUY = 1
+SELL = 2
+TRADE = 3  # closed trade, with its pnl
+FUND = 4  # fund shares/value snapshot
+
+LEDGER_DTYPE = np.dtype([
+    ('dt', 'f8'),  # backtrader date number
+    ('kind', 'i1'),
+    ('size', 'f8'),
+    ('price', 'f8'),
+    ('value', 'f8'),
+    ('comm', 'f8'),
+    ('pnl', 'f8'),
+    ('pnlcomm', 'f8'),
+    ('fundshares', 'f8'),
+    ('fundvalue', 'f8'),
+])
+
+# Where strategies export their ledger at stop, None to keep it in memory only
+_exportdir = None
+
+# Runs exported by this process, part of the file names
+_runs = itertools.count(1)
+
+
+def configure(exportdir=None):
+    '''Export the ledgers at stop as
+    <exportdir>/<strategy>.<time>.<pid>.<run>.npy, one file per run even
+    for the runs of an optstrategy or of the sweep workers.
+    '''
+    global _exportdir
+    _exportdir = exportdir
+
+
+class Ledger(object):
+    '''Fills, closed trades and fund snapshots of a strategy.
+
+    Records go into a preallocated NumPy structured array (LEDGER_DTYPE) that
+    doubles its size when full, so nothing is formatted per event and memory
+    stays flat.
+
+    Parameters
+    ----------
+    capacity: int
+    Initial number of records.
+    '''
+
+    def __init__(self, capacity=1024):
+        self._records = np.zeros(capacity, dtype=LEDGER_DTYPE)
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    @property
+    def records(self):
+        ''' View of the used part of the array '''
+        return self._records[:self._len]
+
+    def _append(self, record):
+        if self._len == len(self._records):
+            grown = np.zeros(2 * len(self._records), dtype=LEDGER_DTYPE)
+            grown[:self._len] = self._records
+            self._records = grown
+
+        self._records[self._len] = record
+        self._len += 1
+
+    def extend(self, records):
+        ''' Append records, for example the ledger of a previous run '''
+        needed = self._len + len(records)
+        if needed > len(self._records):
+            grown = np.zeros(max(needed, 2 * len(self._records)),
+                             dtype=LEDGER_DTYPE)
+            grown[:self._len] = self.records
+            self._records = grown
+
+        self._records[self._len:needed] = records
+        self._len = needed
+
+    def fill(self, order):
+        ''' Record the execution of a completed order '''
+        ex = order.executed
+        kind = BUY if order.isbuy() else SELL
+        self._append((ex.dt, kind, ex.size, ex.price, ex.value, ex.comm,
+                      ex.pnl, ex.pnl - ex.comm, 0.0, 0.0))
+
+    def trade(self, trade):
+        ''' Record a closed trade '''
+        self._append((trade.dtclose, TRADE, trade.size, trade.price,
+                      trade.value, trade.commission, trade.pnl, trade.pnlcomm,
+                      0.0, 0.0))
+
+    def fund(self, dt, broker):
+        ''' Record the fund shares and value of the broker '''
+        self._append((dt, FUND, 0.0, 0.0, broker.get_value(), 0.0, 0.0, 0.0,
+                      broker.get_fundshares(), broker.get_fundvalue()))
+
+    def trim(self):
+        ''' Release the unused preallocated records '''
+        self._records = self.records.copy()
+
+    def save(self, filename):
+        '''Save the records as .npy. Written to a temporary file and
+        renamed, readers never see a partial file.
+        '''
+        with open(filename + '.tmp', 'wb') as f:
+            np.save(f, self.records)
+        os.replace(filename + '.tmp', filename)
+
+    def export(self, name):
+        '''Called by the strategies at stop: trims the array and saves it to
+        the configured export directory, if any. Returns the file name.
+        '''
+        self.trim()
+        if _exportdir is not None:
+            os.makedirs(_exportdir, exist_ok=True)
+            filename = os.path.join(_exportdir, '{}.{}.{}.{}.npy'.format(
+                name, time.strftime('%Y%m%d-%H%M%S'), os.getpid(), next(_runs)))
+            self.save(filename)
+            return filename
@@ -0,0 +1,271 @@
+import array
+import asyncio
+import datetime as dt
+import json
+import queue
+import threading
+import time
+
+import backtrader as bt
+import numpy as np
+
+import stratlog
+from feeds import BAR_DTYPE, EPOCH_ORDINAL, from_seconds
+
+
+class SocketData(bt.feed.DataBase):
+    '''Live feed of bars or ticks read from a local socket or a queue.
+
+    An asyncio reader, in a background thread, reads JSON lines from a TCP
+    (host, port) or Unix (path) socket and puts them in a queue, stamped
+    with their arrival time. _load blocks on the queue, so a bar reaches the
+    strategies as soon as it arrives. A line is a bar, with the BAR_DTYPE
+    fields (datetime in epoch seconds), or a tick, {"datetime": ...,
+    "price": ..., "volume": ...}, turned into a one price bar. The feed ends
+    when the socket is closed.
+
+    The arrival time of the current bar (time.perf_counter) is in
+    data.arrival, see DecisionLatency.
+
+    Parameters
+    ----------
+    host: str
+    port: int
+    TCP socket to read from.
+    path: str
+    Unix socket to read from, instead of host/port.
+    queue: queue.Queue
+    Read (arrival, message dict) items from this queue instead of a socket,
+    None ends the feed.
+    qcheck: float
+    Longest wait for a bar, in seconds, before cerebro checks timers and
+    other feeds again.
+    '''
+
+    params = (
+        ('host', '127.0.0.1'),
+        ('port', None),
+        ('path', None),
+        ('queue', None),
+        ('qcheck', 0.5),
+    )
+
+    def islive(self):
+        return True
+
+    def haslivedata(self):
+        return not self._queue.empty()
+
+    def start(self):
+        super(SocketData, self).start()
+        self.arrival = None
+        self._loop = self._task = None
+        self.put_notification(self.LIVE)
+
+        if self.p.queue is not None:
+            self._queue = self.p.queue
+            return
+
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=asyncio.run, args=(self._read(),),
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._loop is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._task.cancel)
+            except RuntimeError:
+                pass  # reader already done, loop closed
+
+    async def _read(self):
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.current_task()
+        try:
+            if self.p.path is not None:
+                reader, writer = await asyncio.open_unix_connection(self.p.path)
+            else:
+                reader, writer = await asyncio.open_connection(self.p.host,
+                                                               self.p.port)
+            try:
+                async for line in reader:
+                    arrival = time.perf_counter()
+                    self._queue.put((arrival, json.loads(line)))
+            finally:
+                writer.close()
+        finally:
+            self._queue.put(None)
+
+    def _load(self):
+        try:
+            item = self._queue.get(timeout=self._qcheck)
+        except queue.Empty:
+            return None  # nothing yet, cerebro comes back
+
+        if item is None:
+            return False  # socket closed
+
+        self.arrival, msg = item
+        secs = msg['datetime']
+        if self._timeframe >= bt.TimeFrame.Days:
+            # Stamped at the session end, like ArrayData does
+            self.lines.datetime[0] = bt.date2num(dt.datetime.combine(
+                from_seconds(secs).date(), self.p.sessionend))
+        else:
+            self.lines.datetime[0] = EPOCH_ORDINAL + secs / 86400.0
+
+        if 'price' in msg:
+            price = msg['price']
+            msg = dict(open=price, high=price, low=price, close=price,
+                       volume=msg.get('volume', 0.0))
+
+        for name in BAR_DTYPE.names[1:]:
+            getattr(self.lines, name)[0] = msg.get(name, 0.0)
+
+        return True
+
+
+class DecisionLatency(bt.Analyzer):
+    '''Time from the arrival of a bar to the orders sent on it.
+
+    Wraps buy and sell of the strategy (order_target_* go through them) and
+    measures against data.arrival of the first data, which must be a
+    SocketData. The latencies, in seconds, are logged at stop.
+    '''
+
+    def start(self):
+        self.latencies = array.array('d')
+        if isinstance(self.strategy.datas[0], SocketData):
+            for name in ('buy', 'sell'):
+                self._wrap(name)
+
+    def _wrap(self, name):
+        method = getattr(self.strategy, name)
+        data = self.strategy.datas[0]
+        latencies = self.latencies
+
+        def timed(*args, **kwargs):
+            order = method(*args, **kwargs)
+            if data.arrival is not None:
+                latencies.append(time.perf_counter() - data.arrival)
+            return order
+
+        setattr(self.strategy, name, timed)
+
+    def stop(self):
+        if not self.latencies:
+            return
+
+        lat = np.frombuffer(self.latencies, dtype='d')
+        self.rets['orders'] = len(lat)
+        self.rets['mean'] = lat.mean()
+        self.rets['p50'] = float(np.percentile(lat, 50))
+        self.rets['p99'] = float(np.percentile(lat, 99))
+        self.rets['max'] = lat.max()
+        stratlog.log(self.strategy, 'Decision latency, orders: %d, mean: %.1f us, '
+                     'p50: %.1f us, p99: %.1f us, max: %.1f us', len(lat),
+                     lat.mean() * 1e6, self.rets['p50'] * 1e6,
+                     self.rets['p99'] * 1e6, lat.max() * 1e6)
+
+
+def _message(row):
+    # BAR_DTYPE row to the JSON line sent by the replay server
+    msg = dict((name, row[name].item()) for name in BAR_DTYPE.names)
+    return (json.dumps(msg) + '\n').encode()
+
+
+class ReplayServer(object):
+    '''Serve bars as a live market data source would, for SocketData.
+
+    Every client gets all the bars, one JSON line each, interval seconds
+    apart, and then the connection is closed. The server runs in a
+    background thread.
+
+    Parameters
+    ----------
+    bars: np.ndarray
+    BAR_DTYPE array, for example from DataCache.get.
+    host: str
+    port: int
+    TCP address, port 0 picks a free one (see port once started).
+    path: str
+    Serve on this Unix socket instead.
+    interval: float
+    Seconds between bars.
+    '''
+
+    def __init__(self, bars, host='127.0.0.1', port=0, path=None, interval=0.0):
+        self.bars = bars
+        self.host, self.port, self.path = host, port, path
+        self.interval = interval
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=asyncio.run, args=(self._serve(),),
+                                        daemon=True)
+
+    def start(self):
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._stopped.set)
+        self._thread.join()
+
+    async def _handle(self, reader, writer):
+        try:
+            for row in self.bars:
+                writer.write(_message(row))
+                await writer.drain()
+                if self.interval:
+                    await asyncio.sleep(self.interval)
+        finally:
+            writer.close()
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        if self.path is not None:
+            server = await asyncio.start_unix_server(self._handle, self.path)
+        else:
+            server = await asyncio.start_server(self._handle, self.host,
+                                                self.port)
+            self.port = server.sockets[0].getsockname()[1]
+
+        self._ready.set()
+        async with server:
+            await self._stopped.wait()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from datacache import DataCache
+
+    parser = argparse.ArgumentParser(
+        description='Replay cached bars over a socket, for SocketData')
+    parser.add_argument('ticker')
+    parser.add_argument('--fromdate', default='2007-01-01')
+    parser.add_argument('--todate', default=dt.date.today().isoformat())
+    parser.add_argument('--port', type=int, default=9999)
+    parser.add_argument('--path', help='Unix socket instead of TCP')
+    parser.add_argument('--interval', type=float, default=0.1,
+                        help='seconds between bars')
+    args = parser.parse_args()
+
+    bars = DataCache(offline=True).get(
+        args.ticker, dt.date.fromisoformat(args.fromdate),
+        dt.date.fromisoformat(args.todate))
+    server = ReplayServer(bars, port=args.port, path=args.path,
+                          interval=args.interval).start()
+    print('Serving {} bars of {} on {}'.format(
+        len(bars), args.ticker, args.path or server.port))
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.close()
@@ -1,32 +1,67 @@
 import backtrader as bt
 import datetime as dt
+import sys
+import checkpoint
+import plotting
 import strategies as strg
+from datacache import DataCache
 
 
+# Save the chart to this file (e.g. 'KO.png') instead of opening the
+# interactive backtrader plot, for machines without a display
+plotfile = None
+
+# Strategy to run, only the ones with checkpointattrs continue from a
+# checkpoint
+strategycls = strg.BuyAndHold_More_Fund
+
 cerebro = bt.Cerebro()
 
-# Get data from Yahoo Finance
-data = bt.feeds.YahooFinanceData(
-    dataname='KO',    # Ticker
-    timeframe=bt.TimeFrame.Days, compression=1,
+# State of the previous run: only the bars after it are processed and the
+# fund continues where it was. Delete the file to start from scratch.
+state = None
+if hasattr(strategycls, 'checkpointattrs'):
+    state = checkpoint.load('checkpoint.pkl')
+if state and state['strategy'] != strategycls.__name__:
+    state = None  # saved by another strategy, start from the beginning
+fromdate = state['fromdate'] if state else dt.datetime(2007, 1, 1)
+
+# Get data from Yahoo Finance, only the dates not yet in the local cache are
+# downloaded. With offline=True the network is never used.
+cache = DataCache(cachedir='cache', offline=False)
+data = cache.getfeed(
+    'KO',    # Ticker
+    interval='1d',  # Daily bars
     # Do not pass values before this date
-    fromdate=dt.datetime(2007, 1, 1),
+    fromdate=fromdate,
     # Do not pass values after this date
-    todate=dt.datetime(2021, 5, 20),
-    reverse=False)
+    todate=dt.datetime.today())
+
+if not len(data.p.dataname):
+    sys.exit('No new bars since the last run')
 
 data.plotinfo.plotlog = True  # Semilog plot.
 cerebro.adddata(data)  # Load daily stock data to cerebro
-#cerebro.resampledata(data, timeframe=bt.TimeFrame.Weeks)  # Resampling data to week interval
+# Weekly bars for wmaStrategy, resampled once and kept in the cache. Same as
+# cerebro.resampledata(data, timeframe=bt.TimeFrame.Weeks)
+#cerebro.adddata(cache.getresampledfeed('KO', fromdate=fromdate, todate=dt.datetime.today(), interval='1wk'))
 
 cerebro.broker.setcash(1000)  # Available cash to invest
-cerebro.addstrategy(strg.BuyAndHold_More_Fund)  # Load strategy to cerebro
+cerebro.addstrategy(strategycls)  # Load strategy to cerebro
+if hasattr(strategycls, 'checkpointattrs'):
+    cerebro.addanalyzer(checkpoint.Checkpoint, filename='checkpoint.pkl',
+                        state=state)
 
-print('Starting Portfolio Value: {}'.format(cerebro.broker.getvalue()))
+# The broker is only restored from the checkpoint when the run starts
+startvalue = state['broker']['_value'] if state else cerebro.broker.getvalue()
+print('Starting Portfolio Value: {}'.format(startvalue))
 
-cerebro.run()  # Run Strategy
+strategy = cerebro.run()[0]  # Run Strategy
 
 print('Final Portfolio Value: {}'.format(cerebro.broker.getvalue()))
 
 # Plot
-cerebro.plot()
+if plotfile:
+    plotting.plot(strategy, plotfile)
+else:
+    cerebro.plot()
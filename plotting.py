@@ -0,0 +1,164 @@
+import backtrader as bt
+import numpy as np
+
+import ledger
+from feeds import EPOCH_ORDINAL
+
+
+def lttb(x, y, points):
+    '''Largest Triangle Three Buckets downsampling.
+
+    Keeps the first and last points and, from each of points - 2 buckets in
+    between, the one making the largest triangle with the point kept before
+    it and the average of the next bucket. Peaks and troughs survive, unlike
+    taking every k-th point.
+
+    Returns the indices of the points kept, all of them if there are not
+    more than points.
+    '''
+    n = len(x)
+    if points >= n or points < 3:
+        return np.arange(n)
+
+    x, y = np.asarray(x, dtype='f8'), np.asarray(y, dtype='f8')
+    edges = np.linspace(1, n - 1, points - 1).astype('i8')
+    keep = np.empty(points, dtype='i8')
+    keep[0], keep[-1] = 0, n - 1
+
+    # Average of every bucket, the last point is the bucket after the last
+    starts = np.append(edges[:-1], n - 1)
+    counts = np.diff(np.append(starts, n))
+    avgx = np.add.reduceat(x, starts) / counts
+    avgy = np.add.reduceat(y, starts) / counts
+
+    last = 0
+    for i in range(points - 2):
+        first, end = edges[i], edges[i + 1]
+        area = np.abs((x[last] - avgx[i + 1]) * (y[first:end] - y[last]) -
+                      (x[last] - x[first:end]) * (avgy[i + 1] - y[last]))
+        last = first + int(np.argmax(area))
+        keep[i + 1] = last
+
+    return keep
+
+
+def _clockdata(obj, strategy):
+    # Data feed whose bars an indicator or observer is computed on
+    clock = obj
+    while not isinstance(clock, bt.AbstractDataBase):
+        # Indicators on a single line (data.volume) are clocked by a stub
+        parent = getattr(clock, '_clock', None)
+        clock = parent if parent is not None else getattr(clock, '_owner', None)
+        if clock is None:
+            return strategy.datas[0]
+    return clock
+
+
+def _values(line):
+    if line.mode == line.QBuffer:
+        raise ValueError('Only the last bars are kept (exactbars=1), '
+                         'cannot plot')
+    return np.array(line.array[:line.buflen()])
+
+
+def _series(line, clock, points):
+    '''Dates (datetime64) and values of a line, without the NaN of its warm
+    up, downsampled to points with lttb.
+    '''
+    # Bar i of the line is bar i of its clock, like backtrader plots them
+    # (observers can have more values in runonce mode)
+    x = _values(clock.datetime)
+    y = _values(line)[:len(x)]
+    x = x[:len(y)]
+    valid = ~np.isnan(y)
+    x, y = x[valid], y[valid]
+    if points:
+        keep = lttb(x, y, points)
+        x, y = x[keep], y[keep]
+    return _dates(x), y
+
+
+def _dates(nums):
+    # backtrader date numbers to datetime64
+    return ((nums - EPOCH_ORDINAL) * 86400e3).astype('i8').astype('datetime64[ms]')
+
+
+def _lines(obj):
+    # (name, line) of the lines of an indicator or observer to draw
+    plotlines = obj.plotlines
+    for i, name in enumerate(obj.lines.getlinealiases()):
+        if not getattr(getattr(plotlines, name, None), '_plotskip', False):
+            yield name, obj.lines[i]
+
+
+def plot(strategy, filename, points=2000, width=16, height=9, dpi=100):
+    '''Save the chart of a finished run as an image, without a window.
+
+    The close of the first data with the indicators drawn over it, the
+    other indicators and the observers each in a panel below, and the
+    buys and sells of the strategy ledger as markers at their exact date
+    and price. Lines are downsampled to about points points with lttb, so
+    the time to draw does not grow with the number of bars. matplotlib is
+    only imported here, with a figure not tied to any GUI backend.
+
+    Parameters
+    ----------
+    strategy: bt.Strategy
+    As returned by cerebro.run().
+    filename: str
+    The extension gives the format, .png, .svg, .pdf...
+    points: int
+    Points per line, None to draw every bar.
+    width, height: float
+    Size in inches.
+    dpi: int
+    '''
+    from matplotlib.figure import Figure
+
+    data = strategy.datas[0]
+    overlays, panels = [], []
+    for ind in strategy.getindicators():
+        if ind.plotinfo.plot and any(_lines(ind)):
+            (panels if ind.plotinfo.subplot else overlays).append(ind)
+    for obs in strategy.getobservers():
+        # Markers come from the ledger
+        if obs.plotinfo.plot and any(_lines(obs)) and \
+           not isinstance(obs, (bt.observers.BuySell, bt.observers.Trades,
+                                bt.observers.DataTrades)):
+            panels.append(obs)
+
+    fig = Figure(figsize=(width, height), dpi=dpi)
+    axes = fig.subplots(1 + len(panels), 1, sharex=True, squeeze=False,
+                        gridspec_kw=dict(height_ratios=[3] + [1] * len(panels)))
+    axes = axes[:, 0]
+
+    ax = axes[0]
+    ax.plot(*_series(data.close, data, points), linewidth=0.8,
+            label=data._name or 'close')
+    for ind in overlays:
+        clock = _clockdata(ind, strategy)
+        for name, line in _lines(ind):
+            ax.plot(*_series(line, clock, points), linewidth=0.8,
+                    label='{} {}'.format(ind.plotlabel(), name))
+
+    if hasattr(strategy, 'ledger'):
+        records = strategy.ledger.records
+        for kind, marker, color in ((ledger.BUY, '^', 'green'),
+                                    (ledger.SELL, 'v', 'red')):
+            fills = records[records['kind'] == kind]
+            ax.scatter(_dates(fills['dt']), fills['price'], marker=marker,
+                       color=color, s=30, zorder=3)
+
+    if getattr(data.plotinfo, 'plotlog', False):  # set in main.py
+        ax.set_yscale('log')
+    ax.legend(loc='upper left', fontsize='small')
+
+    for ax, obj in zip(axes[1:], panels):
+        clock = _clockdata(obj, strategy)
+        for name, line in _lines(obj):
+            ax.plot(*_series(line, clock, points), linewidth=0.8, label=name)
+        ax.set_title(obj.plotlabel(), loc='left', fontsize='small')
+        ax.legend(loc='upper left', fontsize='small')
+
+    fig.tight_layout()
+    fig.savefig(filename)
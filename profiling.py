@@ -0,0 +1,189 @@
+import array
+import collections
+import itertools
+import json
+import os
+import sys
+import time
+
+import backtrader as bt
+import numpy as np
+
+import stratlog
+
+
+# Strategy callbacks timed by the profiler
+CALLBACKS = ('prenext', 'next', 'notify_order', 'notify_trade', 'notify_timer')
+
+# Where the profiles are saved at stop, None to only log them
+_exportdir = None
+
+# Runs exported by this process, part of the file names
+_runs = itertools.count(1)
+
+
+def configure(exportdir=None):
+    '''Save the profiles at stop as
+    <exportdir>/<strategy>.<time>.<pid>.<run>.profile.json, one file per run
+    even for the runs of an optstrategy or of the sweep workers.
+    '''
+    global _exportdir
+    _exportdir = exportdir
+
+
+class _Counter(object):
+    # Calls of one callback: all of them are counted, the first one and
+    # then one in every calls are timed (nanoseconds) and checked for
+    # allocated memory blocks
+
+    __slots__ = ('calls', 'times', 'blocks')
+
+    def __init__(self):
+        self.calls = 0
+        self.times = array.array('q')
+        self.blocks = 0
+
+
+def _wrap(method, counter, every, allocations):
+    # Replacement of a bound method, set on the instance
+    clock = time.perf_counter_ns
+    times = counter.times
+
+    def timed(*args, **kwargs):
+        counter.calls += 1
+        if (counter.calls - 1) % every:
+            return method(*args, **kwargs)
+
+        blocks = sys.getallocatedblocks() if allocations else 0
+        start = clock()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            times.append(clock() - start)
+            if allocations:
+                counter.blocks += sys.getallocatedblocks() - blocks
+
+    return timed
+
+
+def _overhead():
+    # Memory blocks the measurement itself leaves allocated per timed call
+    counter = _Counter()
+    noop = _wrap(lambda: None, counter, 1, True)
+    for _ in range(100):
+        noop()
+    return int(round(counter.blocks / 100.0))
+
+
+class Profiler(bt.Analyzer):
+    '''Call counts and timings of the strategy callbacks and indicators.
+
+    Nothing is instrumented unless the analyzer is added:
+    cerebro.addanalyzer(Profiler, samplerate=0.1). At start the callbacks
+    (see CALLBACKS) and the indicators of the strategy are replaced, on the
+    instance, by counting wrappers. Indicators are timed with their
+    sub-indicators, per bar (next) or for the whole run (runonce). At stop
+    the profile is logged and, if configured, saved.
+
+    Parameters
+    ----------
+    samplerate: float
+    Fraction of the calls timed, all of them are counted.
+    allocations: bool
+    Also count the memory blocks left allocated by the timed calls (net of
+    the ones freed, see sys.getallocatedblocks).
+    '''
+
+    params = (
+        ('samplerate', 1.0),
+        ('allocations', False),
+    )
+
+    def start(self):
+        every = max(1, int(round(1.0 / self.p.samplerate)))
+        self._every = every
+        self._counters = collections.OrderedDict()
+        self._overhead = _overhead() if self.p.allocations else 0
+
+        strategy = self.strategy
+        for name in CALLBACKS:
+            self._instrument(strategy, name, name)
+
+        names = collections.Counter()
+        for indicator in strategy.getindicators():
+            label = indicator.plotlabel()
+            names[label] += 1
+            if names[label] > 1:
+                label = '{} #{}'.format(label, names[label])
+            self._instrument(indicator, '_next', label)
+            self._instrument(indicator, '_once', label)
+
+    def _instrument(self, obj, method, name):
+        counter = self._counters.setdefault(name, _Counter())
+        setattr(obj, method, _wrap(getattr(obj, method), counter, self._every,
+                                   self.p.allocations))
+
+    def stop(self):
+        for name, counter in self._counters.items():
+            if not counter.calls:
+                continue
+
+            times = np.frombuffer(counter.times, dtype='i8') / 1e9
+            timed = len(times)
+            self.rets[name] = stats = collections.OrderedDict()
+            stats['calls'] = counter.calls
+            stats['timed'] = timed
+            # Sampled time scaled to all the calls
+            stats['total'] = times.sum() * counter.calls / timed if timed else 0.0
+            stats['mean'] = times.mean() if timed else 0.0
+            stats['p99'] = float(np.percentile(times, 99)) if timed else 0.0
+            if self.p.allocations:
+                stats['blocks'] = counter.blocks - self._overhead * timed
+
+        # Restore the methods of the class
+        for obj in [self.strategy] + list(self.strategy.getindicators()):
+            for method in CALLBACKS + ('_next', '_once'):
+                obj.__dict__.pop(method, None)
+
+        name = type(self.strategy).__name__
+        for line in _format(self.rets):
+            stratlog.log(self.strategy, 'Profile %s', line)
+        if _exportdir is not None:
+            os.makedirs(_exportdir, exist_ok=True)
+            filename = os.path.join(_exportdir, '{}.{}.{}.{}.profile.json'.format(
+                name, time.strftime('%Y%m%d-%H%M%S'), os.getpid(), next(_runs)))
+            # Renamed when complete, readers never see a partial file
+            with open(filename + '.tmp', 'w') as f:
+                json.dump(self.rets, f, indent=1)
+            os.replace(filename + '.tmp', filename)
+
+
+class FirstBar(bt.Analyzer):
+    '''perf_counter time at which the first bar reached the strategy, in
+    first (None if none did). Minus the time the run started it is the
+    startup: preloading, runonce indicators and, in a cold process, imports.
+    '''
+
+    def start(self):
+        self.first = None
+
+    def prenext(self):
+        if self.first is None:
+            self.first = time.perf_counter()
+
+    def nextstart(self):
+        self.prenext()
+
+    def next(self):
+        self.prenext()
+
+
+def _format(profile):
+    # Text table, one line per callback/indicator
+    yield '{:<36} {:>9} {:>9} {:>10} {:>10} {:>10}'.format(
+        'callback', 'calls', 'timed', 'total s', 'mean us', 'p99 us')
+    for name, stats in profile.items():
+        yield '{:<36} {:>9} {:>9} {:>10.4f} {:>10.1f} {:>10.1f}'.format(
+            name, stats['calls'], stats['timed'], stats['total'],
+            stats['mean'] * 1e6, stats['p99'] * 1e6) + \
+            (' {:>8} blocks'.format(stats['blocks']) if 'blocks' in stats else '')
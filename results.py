@@ -0,0 +1,270 @@
+import datetime as dt
+import hashlib
+import json
+import sqlite3
+
+import backtrader as bt
+import numpy as np
+
+from feeds import to_seconds
+
+
+# Fund curve of a run, one row per bar
+CURVE_DTYPE = np.dtype([
+    ('dt', 'f8'),  # backtrader date number
+    ('value', 'f8'),
+    ('fundvalue', 'f8'),
+])
+
+# Columns of the runs table, besides the metrics (a JSON object)
+COLUMNS = ('hash', 'strategy', 'params', 'ticker', 'fromdate', 'todate',
+           'datahash', 'cash', 'value', 'fundvalue', 'created')
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    hash TEXT PRIMARY KEY,
+    strategy TEXT NOT NULL,
+    params TEXT NOT NULL,
+    ticker TEXT NOT NULL,
+    fromdate TEXT,
+    todate TEXT,
+    datahash TEXT,
+    cash REAL,
+    value REAL,
+    fundvalue REAL,
+    created TEXT,
+    metrics TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_strategy ON runs (strategy, params, ticker);
+CREATE INDEX IF NOT EXISTS runs_ticker ON runs (ticker, strategy);
+CREATE TABLE IF NOT EXISTS curves (
+    hash TEXT PRIMARY KEY REFERENCES runs (hash),
+    curve BLOB
+);
+'''
+
+# Hashes per statement, under the SQLite limit of variables
+_CHUNK = 500
+
+
+def datahash(bars):
+    ''' Digest of the bars (array or list of arrays) a run was fed '''
+    if not isinstance(bars, (list, tuple)):
+        bars = [bars]
+
+    digest = hashlib.blake2b(digest_size=16)
+    for arr in bars:
+        digest.update(np.ascontiguousarray(arr).tobytes())
+    return digest.hexdigest()
+
+
+def allparams(strategy, params):
+    ''' Every param of the strategy, the defaults updated with params '''
+    values = dict(strategy.params._getitems())
+    values.update(params)
+    return values
+
+
+def confighash(strategy, params, ticker, fromdate, todate, datahash, cash,
+               resample=(), feedkwargs=None):
+    '''Key of a run configuration: strategy class, all its params, ticker,
+    dates used, data, starting cash, timeframes resampled to and the extra
+    arguments of the feeds (a dict or one per feed). A run with the same
+    key gives the same results.
+    '''
+    if isinstance(feedkwargs, dict):
+        feedkwargs = [feedkwargs]
+    config = [strategy.__name__, allparams(strategy, params), ticker,
+              str(fromdate), str(todate), datahash, cash, list(resample),
+              [dict(kwargs) for kwargs in feedkwargs or ()]]
+    text = json.dumps(config, sort_keys=True, default=str)
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+def daterange(bars, fromdate=None, todate=None):
+    '''First and last date of the bars, as stored with a run. fromdate and
+    todate (the ones of the feed) leave out the bars a run does not see, a
+    todate without a time takes the whole day.
+    '''
+    secs = bars['datetime']
+    first, last = 0, len(secs)
+    if fromdate is not None:
+        first = np.searchsorted(secs, to_seconds(fromdate))
+    if todate is not None:
+        if not isinstance(todate, dt.datetime):
+            todate = todate + dt.timedelta(days=1)
+            last = np.searchsorted(secs, to_seconds(todate))
+        else:
+            last = np.searchsorted(secs, to_seconds(todate), side='right')
+    if first >= last:
+        return None, None
+    dates = secs[[first, last - 1]].astype('datetime64[s]').astype('datetime64[D]')
+    return str(dates[0]), str(dates[1])
+
+
+class FundCurve(bt.Analyzer):
+    ''' Broker value and fund value of every bar, see CURVE_DTYPE '''
+
+    def start(self):
+        self._rows = []
+
+    def next(self):
+        broker = self.strategy.broker
+        self._rows.append((self.data.datetime[0], broker.getvalue(),
+                           broker.get_fundvalue()))
+
+    def stop(self):
+        self.rets['curve'] = np.array(self._rows, dtype=CURVE_DTYPE)
+
+
+class ResultStore(object):
+    '''Runs and their results in a local SQLite file.
+
+    Every run is stored with its configuration (strategy, params, ticker,
+    dates, data hash and cash), keyed by confighash (which covers the
+    resampling and feed arguments too), with its final value, fund value,
+    other metrics and fund curve. Runs are written by the
+    process that owns the store, in batches of one transaction, so pool
+    workers only return their rows. sweep and universe.run skip the runs
+    already in the store.
+
+    Parameters
+    ----------
+    filename: str
+    batch: int
+    Rows buffered by add before they are written.
+    '''
+
+    def __init__(self, filename='results.db', batch=100):
+        self.filename = filename
+        self.batch = batch
+        self._pending = []
+        self._db = sqlite3.connect(filename)
+        self._db.executescript(_SCHEMA)
+
+    def done(self, hashes):
+        ''' The hashes with a stored run '''
+        self.flush()
+        hashes = list(hashes)
+        found = set()
+        for i in range(0, len(hashes), _CHUNK):
+            chunk = hashes[i:i + _CHUNK]
+            cursor = self._db.execute(
+                'SELECT hash FROM runs WHERE hash IN ({})'.format(
+                    ','.join('?' * len(chunk))), chunk)
+            found.update(row[0] for row in cursor)
+        return found
+
+    def add(self, row, curve=None):
+        '''Buffer a run, written with the next flush (automatic every batch
+        rows).
+
+        row has the COLUMNS but created (params as a dict), other numeric
+        keys are kept as metrics. curve is its CURVE_DTYPE array, if any.
+        '''
+        self._pending.append((row, curve))
+        if len(self._pending) >= self.batch:
+            self.flush()
+
+    def flush(self):
+        ''' Write the buffered runs in one transaction '''
+        if not self._pending:
+            return
+
+        created = dt.datetime.now().isoformat(timespec='seconds')
+        runs, curves = [], []
+        for row, curve in self._pending:
+            metrics = dict((name, value) for name, value in row.items()
+                           if name not in COLUMNS and
+                           isinstance(value, (int, float, np.number)))
+            runs.append((row['hash'], row['strategy'],
+                         json.dumps(row['params'], sort_keys=True, default=str),
+                         row['ticker'], row.get('fromdate'), row.get('todate'),
+                         row.get('datahash'), row.get('cash'),
+                         _real(row.get('value')), _real(row.get('fundvalue')),
+                         created, json.dumps(metrics, default=float)))
+            if curve is not None:
+                curves.append((row['hash'], curve.tobytes()))
+
+        with self._db:
+            self._db.executemany('INSERT OR REPLACE INTO runs VALUES '
+                                 '(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', runs)
+            self._db.executemany('INSERT OR REPLACE INTO curves VALUES (?, ?)',
+                                 curves)
+        self._pending = []
+
+    def query(self, strategy=None, ticker=None, hashes=None, **params):
+        '''Stored runs, best fund value first, as dicts with the params and
+        metrics decoded. Filter by strategy (class or name), ticker, hashes
+        and param values (fast=50).
+        '''
+        self.flush()
+        where, args = [], []
+        if strategy is not None:
+            where.append('strategy = ?')
+            args.append(getattr(strategy, '__name__', strategy))
+        if ticker is not None:
+            where.append('ticker = ?')
+            args.append(ticker)
+        for name, value in params.items():
+            if not name.isidentifier():
+                raise ValueError('Invalid param name {!r}'.format(name))
+            where.append('json_extract(params, ?) = ?')
+            args.extend(('$.' + name, value))
+
+        # One statement per chunk of hashes, like done
+        if hashes is None:
+            chunks = [None]
+        else:
+            hashes = list(hashes)
+            chunks = [hashes[i:i + _CHUNK]
+                      for i in range(0, len(hashes), _CHUNK)]
+
+        rows = []
+        for chunk in chunks:
+            sql, chunkargs = 'SELECT * FROM runs', list(args)
+            chunkwhere = list(where)
+            if chunk is not None:
+                chunkwhere.append('hash IN ({})'.format(','.join('?' * len(chunk))))
+                chunkargs.extend(chunk)
+            if chunkwhere:
+                sql += ' WHERE ' + ' AND '.join(chunkwhere)
+
+            cursor = self._db.execute(sql, chunkargs)
+            names = [d[0] for d in cursor.description]
+            for values in cursor:
+                row = dict(zip(names, values))
+                row['params'] = json.loads(row['params'])
+                row.update(json.loads(row.pop('metrics') or '{}'))
+                rows.append(row)
+
+        # NULL fund values (NaN) last
+        rows.sort(key=lambda row: (row['fundvalue'] is not None,
+                                   row['fundvalue'] or 0.0), reverse=True)
+        return rows
+
+    def curve(self, hash):
+        ''' CURVE_DTYPE fund curve of a run, None if not stored '''
+        self.flush()
+        row = self._db.execute('SELECT curve FROM curves WHERE hash = ?',
+                               (hash,)).fetchone()
+        if row is None:
+            return None
+        return np.frombuffer(row[0], dtype=CURVE_DTYPE)
+
+    def close(self):
+        self.flush()
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _real(value):
+    # NaN is stored as NULL
+    if value is None or value != value:
+        return None
+    return float(value)
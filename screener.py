@@ -0,0 +1,195 @@
+import collections
+
+import numpy as np
+
+import strategies as strg
+
+
+# Entry conditions by name: functions of a (symbols x bars) close matrix
+# returning a boolean matrix of the same shape, True where the condition is
+# met on that bar
+PATTERNS = collections.OrderedDict()
+
+
+def register(name, func):
+    ''' Add a pattern, see PATTERNS '''
+    PATTERNS[name] = func
+
+
+def _packed(func):
+    # Run func over the bars of each symbol: the values of a row are moved
+    # to its end, in order, so column j - 1 is always the previous bar of
+    # the symbol even with missing dates, as in a backtest over it. The
+    # results are put back in the columns of the values.
+    def wrapper(closes, *args, **kwargs):
+        closes = np.asarray(closes, dtype='f8')
+        valid = ~np.isnan(closes)
+        order = np.argsort(valid, axis=1, kind='stable')
+        hits = func(np.take_along_axis(closes, order, axis=1), *args, **kwargs)
+        out = np.zeros(closes.shape, dtype=bool)
+        np.put_along_axis(out, order, hits, axis=1)
+        return out & valid
+
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+
+def sma(closes, period):
+    '''Simple moving average of every row of a (symbols x bars) matrix, NaN
+    until period values are available. Window sums come from one cumulative
+    sum along the bars (of the distance to the first close of each row, so
+    the sums stay small): they can differ from backtrader's in the last
+    bits, which only matters when a close equals its average.
+    '''
+    closes = np.asarray(closes, dtype='f8')
+    valid = ~np.isnan(closes)
+    first = np.argmax(valid, axis=1)
+    base = closes[np.arange(len(closes)), first]
+    base[np.isnan(base)] = 0.0
+
+    shifted = np.where(valid, closes - base[:, None], 0.0)
+    zeros = np.zeros((len(closes), 1))
+    csum = np.concatenate((zeros, np.cumsum(shifted, axis=1)), axis=1)
+    counts = np.concatenate((zeros, np.cumsum(valid, axis=1)), axis=1)
+
+    out = np.full(closes.shape, np.nan)
+    if closes.shape[1] >= period:
+        sums = csum[:, period:] - csum[:, :-period]
+        full = counts[:, period:] - counts[:, :-period] == period
+        out[:, period - 1:] = np.where(full, sums / period + base[:, None],
+                                       np.nan)
+    return out
+
+
+def crossover(data0, data1):
+    '''backtrader's CrossOver of every row of two matrices: 1.0 when data0
+    crosses data1 upwards, -1.0 downwards and 0.0 otherwise (see
+    vectorized.crossover). A row starts at its first bar with both values.
+    '''
+    diff = data0 - data1
+    valid = ~np.isnan(diff)
+    cols = np.arange(diff.shape[1])
+    start = np.argmax(valid, axis=1)[:, None]
+
+    # Last non zero difference, seeded with the first one
+    idx = np.where(valid & (diff != 0.0), cols, 0)
+    idx = np.where(cols <= start, start, idx)
+    nzd = np.take_along_axis(diff, np.maximum.accumulate(idx, axis=1), axis=1)
+
+    cross = np.zeros(diff.shape)
+    before = nzd[:, :-1]
+    cross[:, 1:] = (before < 0.0) & (data0[:, 1:] > data1[:, 1:])
+    cross[:, 1:] -= (before > 0.0) & (data0[:, 1:] < data1[:, 1:])
+    return cross
+
+
+@_packed
+def three_lower_closes(closes):
+    '''CandleStrat entry: the close is lower than the previous one, which is
+    lower than the one before. Not defined on the first two bars, where
+    the strategy reads before the start of the data (on preloaded data
+    close[-1] of the first bar is the last close of the series).
+    '''
+    out = np.zeros(closes.shape, dtype=bool)
+    out[:, 2:] = (closes[:, 2:] < closes[:, 1:-1]) & \
+        (closes[:, 1:-1] < closes[:, :-2])
+    return out
+
+
+@_packed
+def close_above_sma(closes, maPeriod=strg.smaStrategy.params.maPeriod):
+    ''' smaStrategy entry: the close is above its SMA '''
+    return closes > sma(closes, maPeriod)
+
+
+@_packed
+def golden_cross(closes, fast=strg.GoldenCross.params.fast,
+                 slow=strg.GoldenCross.params.slow):
+    ''' GoldenCross entry: the fast SMA crosses the slow one upwards '''
+    return crossover(sma(closes, fast), sma(closes, slow)) > 0.0
+
+
+register('three_lower_closes', three_lower_closes)
+register('close_above_sma', close_above_sma)
+register('golden_cross', golden_cross)
+
+
+def load(cache, tickers, fromdate, todate, bars=None):
+    '''Close matrix of the tickers from the local cache.
+
+    Columns are the dates of all the tickers together, so the last column
+    is the last date any ticker has and a ticker whose data stopped before
+    has NaN there. NaN where a ticker has no bar, the patterns skip them.
+    bars limits the columns to the last ones.
+
+    Returns (closes, dates), dates being the datetime64[s] of each column.
+    '''
+    series = [cache.get(ticker, fromdate, todate) for ticker in tickers]
+    dates = np.unique(np.concatenate(
+        [s['datetime'] for s in series] + [np.zeros(0, dtype='i8')]))
+    if bars is not None:
+        dates = dates[len(dates) - min(len(dates), bars):]
+
+    closes = np.full((len(tickers), len(dates)), np.nan)
+    for row, s in enumerate(series):
+        s = s[np.isin(s['datetime'], dates)]
+        closes[row, np.searchsorted(dates, s['datetime'])] = s['close']
+    return closes, dates.astype('datetime64[s]')
+
+
+def screen(tickers, closes, dates, patterns=('three_lower_closes',), last=1):
+    '''Symbols matching any of the patterns on the last dates.
+
+    Parameters
+    ----------
+    tickers: list
+    Symbol of each row.
+    closes, dates: np.ndarray
+    (symbols x bars) matrix and the date of each column, see load.
+    patterns: list
+    Names in PATTERNS.
+    last: int
+    Number of dates checked at the end, 1 for the last one only.
+
+    Returns one dict (ticker, date, pattern) per match, by date.
+    '''
+    matches = []
+    for name in patterns:
+        hits = PATTERNS[name](closes)
+        hits[:, :max(0, hits.shape[1] - last)] = False
+        for row, col in zip(*np.nonzero(hits)):
+            matches.append(dict(ticker=tickers[row], date=dates[col],
+                                pattern=name))
+
+    matches.sort(key=lambda match: (match['date'], match['ticker']))
+    return matches
+
+
+if __name__ == '__main__':
+    import argparse
+    import datetime as dt
+
+    from datacache import DataCache
+
+    parser = argparse.ArgumentParser(
+        description='Tickers matching entry patterns on their last bars')
+    parser.add_argument('tickers', help='file with one ticker per line')
+    parser.add_argument('--patterns', nargs='+', default=['three_lower_closes'],
+                        choices=list(PATTERNS))
+    parser.add_argument('--last', type=int, default=1,
+                        help='dates checked, 1 for the last one only')
+    parser.add_argument('--offline', action='store_true')
+    args = parser.parse_args()
+
+    with open(args.tickers) as f:
+        tickers = [line.strip() for line in f if line.strip()]
+
+    # Enough history for the longest average
+    todate = dt.date.today()
+    fromdate = todate - dt.timedelta(days=400)
+    closes, dates = load(DataCache(offline=args.offline), tickers, fromdate,
+                         todate)
+    for match in screen(tickers, closes, dates, args.patterns, args.last):
+        print('{} {:<8} {}'.format(str(match['date'].astype('datetime64[D]')),
+                                   match['ticker'], match['pattern']))
@@ -0,0 +1,54 @@
+import multiprocessing
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+
+class SharedArray(object):
+    '''Copy of a NumPy array in a shared memory block.
+
+    Worker processes attach to the block by name (see attach) and see the
+    same memory, so big arrays are not pickled to every worker.
+
+    Use it as a context manager or call close() to free the block.
+    '''
+
+    def __init__(self, arr):
+        arr = np.ascontiguousarray(arr)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        self.array = np.ndarray(arr.shape, dtype=arr.dtype, buffer=self.shm.buf)
+        self.array[...] = arr
+
+    @property
+    def descriptor(self):
+        ''' Picklable (name, shape, dtype) to pass to attach '''
+        return (self.shm.name, self.array.shape, self.array.dtype)
+
+    def close(self):
+        self.array = None
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def attach(descriptor):
+    '''Read-only array over the shared block described by descriptor.
+
+    Returns (shm, array), the shm object must be kept alive while the array
+    is in use.
+    '''
+    name, shape, dtype = descriptor
+    shm = shared_memory.SharedMemory(name=name)
+    if multiprocessing.get_start_method() == 'spawn':
+        # The creator owns the block, do not let the tracker of this process
+        # unlink it. Forked workers share the tracker of the creator.
+        resource_tracker.unregister(shm._name, 'shared_memory')
+
+    arr = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    arr.flags.writeable = False
+    return shm, arr
@@ -1,7 +1,12 @@
 import backtrader as bt
-import numpy as np
 import math
 
+import checkpoint
+import indcache
+import stratlog
+from indicators import RollingStats
+from ledger import Ledger
+
 
 class CandleStrat(bt.Strategy):
     '''Candle Stick Strategy.
@@ -19,11 +24,9 @@ class CandleStrat(bt.Strategy):
         ('orderPercentage',0.99),
     )
 
-    def log(self, txt, dt=None):
-        ''' Logging function fot this strategy '''
-        dt = dt or self.datas[0].datetime.date(0)
-        # Print dates
-        print('%s, %s' % (dt.isoformat(), txt))
+    def log(self, txt, *args, **kwargs):
+        ''' Logging function fot this strategy, see stratlog.log '''
+        stratlog.log(self, txt, *args, **kwargs)
 
     def __init__(self):
         # Keep a reference to the "close" line in the data[0] dataseries
@@ -32,6 +35,7 @@ class CandleStrat(bt.Strategy):
         self.order = None  # Variable for pending orders tracking
         self.buyprice = None  # Variable for buy price traking
         self.buycomm = None  # Variable for commission tracking
+        self.ledger = Ledger()  # Fills and closed trades
 
     def notify_order(self, order):
         if order.status in [order.Submitted, order.Accepted]:
@@ -40,20 +44,21 @@ class CandleStrat(bt.Strategy):
 
         if order.status in [order.Completed]:
             # If orders ar completed do:
+            self.ledger.fill(order)
             if order.isbuy():
-                self.log('BUY EXECUTED, Size: {}, Price: {:.2f}, Cost: {:.2f}, Comm: {:.2f}'.format(order.executed.size,
+                self.log('BUY EXECUTED, Size: %s, Price: %.2f, Cost: %.2f, Comm: %.2f', order.executed.size,
                                                                                           order.executed.price,
                                                                                           order.executed.value,
-                                                                                          order.executed.comm))
+                                                                                          order.executed.comm)
             elif order.issell():
-               self.log('SELL EXECUTED, Size: {}, Price: {:.2f}, Cost: {:.2f}, Comm: {:.2f}'.format(order.executed.size,
+               self.log('SELL EXECUTED, Size: %s, Price: %.2f, Cost: %.2f, Comm: %.2f', order.executed.size,
                                                                                           order.executed.price,
                                                                                           order.executed.value,
-                                                                                          order.executed.comm))
+                                                                                          order.executed.comm)
 
         elif order.status in [order.Canceled, order.Margin, order.Rejected]:
             # Message if the orders weren't completed.
-            self.log('Order Canceled/Margin/Rejected')
+            self.log('Order Canceled/Margin/Rejected', level=stratlog.WARNING)
 
         self.bar_executed = len(self)
 
@@ -63,14 +68,15 @@ class CandleStrat(bt.Strategy):
     def notify_trade(self, trade):
         if not trade.isclosed:
             return
+        self.ledger.trade(trade)
         # Show results of a trade.
-        self.log('OPERATION PROFIT, GROSS {:.2f}, NET: {:.2f}'.format(trade.pnl, trade.pnlcomm))
+        self.log('OPERATION PROFIT, GROSS %.2f, NET: %.2f', trade.pnl, trade.pnlcomm)
 
 
     # Here comes the core of the strategy.
     def next(self):
         # Simply log the closing price of the series from the reference
-        self.log('Close, {}'.format( self.dataclose[0]))
+        self.log('Close, %s', self.dataclose[0], level=stratlog.DEBUG)
 
         if self.order:
             # If there is a pending order don't do anything
@@ -87,21 +93,31 @@ class CandleStrat(bt.Strategy):
                     self.size = math.floor(amountToinvest / self.dataclose[0])
 
                     # BUY with default parameters
-                    self.log('BUY CREATE, {}'.format(self.dataclose[0]))
+                    self.log('BUY CREATE, %s', self.dataclose[0])
                     self.order= self.buy(size=self.size)
 
         else:
             # If we are in the market we already own stocks.
             # Check if extibars has passed and then sell
             if len(self) >= (self.bar_executed + self.params.exitbars):
-                self.log('SELL CREATE {}'.format(self.dataclose[0]))
+                self.log('SELL CREATE %s', self.dataclose[0])
                 self.order = self.sell(size=self.size)
 
+    def stop(self):
+        self.ledger.export(type(self).__name__)
+
 class BuyAndHold_More_Fund(bt.Strategy):
     params = dict(
         monthly_cash=100.0,  # amount of cash to buy every month
     )
 
+    # Kept by checkpoint.Checkpoint to continue in a later run
+    checkpointattrs = ('cash_start',)
+
+    def log(self, txt, *args, **kwargs):
+        ''' Logging function fot this strategy, see stratlog.log '''
+        stratlog.log(self, txt, *args, **kwargs)
+
     def start(self):
         # Activate the fund mode and set the default value at 100
         self.broker.set_fundmode(fundmode=True, fundstartval=100.00)
@@ -109,6 +125,9 @@ class BuyAndHold_More_Fund(bt.Strategy):
         self.cash_start = self.broker.get_cash()
         self.val_start = 100.0
 
+        # Fills and monthly fund share snapshots
+        self.ledger = Ledger()
+
         # Add a timer which will be called on the 1st trading day of the month
         self.add_timer(
             bt.timer.SESSION_END,  # when it will be called
@@ -116,6 +135,9 @@ class BuyAndHold_More_Fund(bt.Strategy):
             monthcarry=True,  # called on the 2nd day if the 1st is holiday
         )
 
+        # Continue from the checkpoint of a previous run, if given
+        checkpoint.restore(self)
+
     def notify_timer(self, timer, when, *args, **kwargs):
         # Add the influx of monthly cash to the broker
         self.broker.add_cash(self.p.monthly_cash)
@@ -124,13 +146,18 @@ class BuyAndHold_More_Fund(bt.Strategy):
         target_value = self.broker.get_value() + self.p.monthly_cash
         self.order_target_value(target=target_value)
 
-        dt = self.datas[0].datetime.date(0)
-        print('{} Cash Added Shares {}'.format(dt, math.floor(self.broker.get_fundshares())))
+        self.log('Cash Added Shares %s', math.floor(self.broker.get_fundshares()))
+        self.ledger.fund(self.datas[0].datetime[0], self.broker)
+
+    def notify_order(self, order):
+        if order.status in [order.Completed]:
+            self.ledger.fill(order)
 
     def stop(self):
         # calculate the actual returns
         self.froi = self.broker.get_fundvalue() - self.val_start
-        print('Fund Value: {:.2f}%'.format(self.froi))
+        self.log('Fund Value: %.2f%%', self.froi)
+        self.ledger.export(type(self).__name__)
 
 class smaStrategy(bt.Strategy):
     ''' Simple Moving Average up cross strategy
@@ -150,10 +177,9 @@ class smaStrategy(bt.Strategy):
         ('orderPercentage', 0.95),
     )
 
-    def log(self, txt, dt=None):
-        ''' Logging function fot this strategy'''
-        dt = dt or self.datas[0].datetime.date(0)
-        print('%s, %s' % (dt.isoformat(), txt))
+    def log(self, txt, *args, **kwargs):
+        ''' Logging function fot this strategy, see stratlog.log '''
+        stratlog.log(self, txt, *args, **kwargs)
 
     def __init__(self):
         # Keep a reference to the "close" line in the data[0] dataseries
@@ -166,9 +192,11 @@ class smaStrategy(bt.Strategy):
         self.order = None
         self.buyprice = None
         self.buycomm = None
+        self.ledger = Ledger()
 
-        # Add a MovingAverageSimple indicator
-        self.sma = bt.indicators.SimpleMovingAverage(
+        # Add a MovingAverageSimple indicator, computed once per period and
+        # data when optimizing (see indcache)
+        self.sma = indcache.cached(bt.indicators.SimpleMovingAverage,
             self.datas[0], period=self.params.maPeriod)
 
     def notify_order(self, order):
@@ -179,36 +207,38 @@ class smaStrategy(bt.Strategy):
         # Check if an order has been completed
         # Attention: broker could reject order if not enough cash
         if order.status in [order.Completed]:
+            self.ledger.fill(order)
             if order.isbuy():
-                self.log('BUY EXECUTED, Size: {}, Price: {:.2f}, Cost: {:.2f}, Comm {:.2f}'.format(order.executed.size,
+                self.log('BUY EXECUTED, Size: %s, Price: %.2f, Cost: %.2f, Comm %.2f', order.executed.size,
                                                                                          order.executed.price,
                                                                                          order.executed.value,
-                                                                                         order.executed.comm))
+                                                                                         order.executed.comm)
 
                 self.buyprice = order.executed.price
                 self.buycomm = order.executed.comm
             else:  # Sell
-                self.log('SELL EXECUTED, Size:{}, Price: {:.2f}, Cost: {:.2f}, Comm {:.4f}'.format(order.executed.size,
+                self.log('SELL EXECUTED, Size:%s, Price: %.2f, Cost: %.2f, Comm %.4f', order.executed.size,
                                                                                          order.executed.price,
                                                                                          order.executed.value,
-                                                                                         order.executed.comm))
+                                                                                         order.executed.comm)
 
             self.bar_executed = len(self)
 
         elif order.status in [order.Canceled, order.Margin, order.Rejected]:
-            self.log('Order Canceled/Margin/Rejected')
+            self.log('Order Canceled/Margin/Rejected', level=stratlog.WARNING)
 
         self.order = None
 
     def notify_trade(self, trade):
         if not trade.isclosed:
             return
+        self.ledger.trade(trade)
 
-        self.log('OPERATION PROFIT, GROSS {:.2f}, NET {:.2f}'.format(trade.pnl, trade.pnlcomm))
+        self.log('OPERATION PROFIT, GROSS %.2f, NET %.2f', trade.pnl, trade.pnlcomm)
 
     def next(self):
         # Simply log the closing price of the series from the reference
-        self.log('Close, {:.2f}'.format(self.dataclose[0]))
+        self.log('Close, %.2f', self.dataclose[0], level=stratlog.DEBUG)
 
         # Check if an order is pending ... if yes, we cannot send a 2nd one
         if self.order:
@@ -224,7 +254,7 @@ class smaStrategy(bt.Strategy):
                 self.size = math.floor(amountToinvest / self.data.close)
 
                 # BUY, BUY, BUY!!! (with all possible default parameters)
-                self.log('BUY CREATE, {:.2f}'.format(self.dataclose[0]))
+                self.log('BUY CREATE, %.2f', self.dataclose[0])
 
                 # Keep track of the created order to avoid a 2nd order
                 self.order = self.buy(size=self.size)
@@ -233,7 +263,7 @@ class smaStrategy(bt.Strategy):
 
             if self.dataclose[0] < self.sma[0]:
                 # SELL, SELL, SELL!!! (with all possible default parameters)
-                self.log('SELL CREATE, {:.2f}'.format(self.dataclose[0]))
+                self.log('SELL CREATE, %.2f', self.dataclose[0])
 
                 # Keep track of the created order to avoid a 2nd order
                 self.order = self.sell(size=self.size)
@@ -241,7 +271,8 @@ class smaStrategy(bt.Strategy):
     def stop(self):
         # calculate the actual returns
         self.froi = self.broker.get_fundvalue() - self.val_start
-        print('Fund Value: {:.2f}%'.format(self.froi))
+        self.log('Fund Value: %.2f%%', self.froi)
+        self.ledger.export(type(self).__name__)
 
 class wmaStrategy(bt.Strategy):
     '''
@@ -270,10 +301,9 @@ class wmaStrategy(bt.Strategy):
         ('orderPercentage', 0.99),
     )
 
-    def log(self, txt, dt=None):
-        ''' Logging function fot this strategy'''
-        dt = dt or self.datas[0].datetime.date(0)
-        print('%s, %s' % (dt.isoformat(), txt))
+    def log(self, txt, *args, **kwargs):
+        ''' Logging function fot this strategy, see stratlog.log '''
+        stratlog.log(self, txt, *args, **kwargs)
 
     def __init__(self):
        # Tracking of daily and weekly close price and volume
@@ -290,11 +320,17 @@ class wmaStrategy(bt.Strategy):
         self.order = None
         self.buyprice = None
         self.buycomm = None
+        self.ledger = Ledger()
 
         # Weighted Moving Average calculation
-        self.wma = bt.indicators.WeightedMovingAverage(
+        self.wma = indcache.cached(bt.indicators.WeightedMovingAverage,
             self.datas[1], period=self.params.wmaPriceperiod)
 
+        # Average weekly volume of the previous wmaVolumePeriod weeks, only
+        # updated when a new weekly bar arrives
+        self.volMean = RollingStats(
+            self.datavolumeS, period=self.params.wmaVolumePeriod, lag=1).mean
+
 
     def notify_order(self, order):
         if order.status in [order.Submitted, order.Accepted]:
@@ -303,25 +339,26 @@ class wmaStrategy(bt.Strategy):
 
         # If orders are completed do:
         if order.status in [order.Completed]:
+            self.ledger.fill(order)
             if order.isbuy():
-                self.log('BUY EXECUTED, Size {}, Price: {:.2f}, Cost: {:.2f}, Comm {:.2f}'.format(
+                self.log('BUY EXECUTED, Size %s, Price: %.2f, Cost: %.2f, Comm %.2f',
                                                                                          order.executed.size,
                                                                                          order.executed.price,
                                                                                          order.executed.value,
-                                                                                         order.executed.comm))
+                                                                                         order.executed.comm)
 
                 self.buyprice = order.executed.price
                 self.buycomm = order.executed.comm
 
             else:  # Sell
-                self.log('SELL EXECUTED, Size {}, Price: {:.2f}, Cost: {:.2f}, Comm {:.2f}'.format(
+                self.log('SELL EXECUTED, Size %s, Price: %.2f, Cost: %.2f, Comm %.2f',
                                                                                          order.executed.size,
                                                                                          order.executed.price,
                                                                                          order.executed.value,
-                                                                                         order.executed.comm))
+                                                                                         order.executed.comm)
 
         elif order.status in [order.Canceled, order.Margin, order.Rejected]:
-            self.log('Order Canceled/Margin/Rejected')
+            self.log('Order Canceled/Margin/Rejected', level=stratlog.WARNING)
 
         # After order is completed reset status
         self.order = None
@@ -329,17 +366,17 @@ class wmaStrategy(bt.Strategy):
     def notify_trade(self, trade):
         if not trade.isclosed:
             return
+        self.ledger.trade(trade)
         # After a trade is closed show me the results.
-        self.log('OPERATION PROFIT, GROSS {:.2f}, NET {:.2f}'.format(trade.pnl, trade.pnlcomm))
+        self.log('OPERATION PROFIT, GROSS %.2f, NET %.2f', trade.pnl, trade.pnlcomm)
 
     def next(self):
         # Show daily close price and volume
-        self.log('Close, {:.2f}'.format(self.datacloseD[0]))
-        self.log('Volume, {:.2f}'.format(self.datavolumeD[0]))
+        self.log('Close, %.2f', self.datacloseD[0], level=stratlog.DEBUG)
+        self.log('Volume, %.2f', self.datavolumeD[0], level=stratlog.DEBUG)
 
         # Check if this week volume is greater than de volume of previous month
-        self.isVolAlto = ((self.datavolumeS[0]) / (np.mean(self.datavolumeS.get(size=self.params.wmaVolumePeriod,
-                                                                                ago=-1)))) > self.params.volReltship
+        self.isVolAlto = (self.datavolumeS[0] / self.volMean[0]) > self.params.volReltship
 
         if self.order:
             # If there are pending orders don´t do anything
@@ -354,7 +391,7 @@ class wmaStrategy(bt.Strategy):
                 amountToinvest = (self.params.orderPercentage * self.broker.cash)
                 self.size = math.floor(amountToinvest / self.datacloseD[0])
 
-                self.log('BUY CREATE, {:.2f}'.format(self.datacloseD[0]))
+                self.log('BUY CREATE, %.2f', self.datacloseD[0])
 
                 # Buy on daily time frame at market value.
                 self.order = self.buy(data=self.datas[0], size=self.size)
@@ -363,7 +400,7 @@ class wmaStrategy(bt.Strategy):
             # If we are in the market sell when closing price crosses downward wma and volume is large.
             if (self.datacloseS[0] < 0.98*self.wma[0] and self.isVolAlto):
 
-                self.log('SELL CREATE, {:.2f}'.format(self.datacloseD[0]))
+                self.log('SELL CREATE, %.2f', self.datacloseD[0])
 
                 # Sell on daily time frame at market value.
                 self.order = self.sell(data=self.datas[0], size=self.size)
@@ -371,7 +408,8 @@ class wmaStrategy(bt.Strategy):
     def stop(self):
         # calculate the actual returns
         self.froi = self.broker.get_fundvalue() - self.val_start
-        print('Fund Value: {:.2f}%'.format(self.froi))
+        self.log('Fund Value: %.2f%%', self.froi)
+        self.ledger.export(type(self).__name__)
 
 class GoldenCross(bt.Strategy):
     '''Golden Cross Strategy
@@ -396,17 +434,32 @@ class GoldenCross(bt.Strategy):
         ('slow', 200),
         ('orderPercentage', 0.95))
 
+    def log(self, txt, *args, **kwargs):
+        ''' Logging function fot this strategy, see stratlog.log '''
+        stratlog.log(self, txt, *args, **kwargs)
+
     def __init__(self):
         #Needed indicators.
 
-        self.fastMovingAverage = bt.indicators.SimpleMovingAverage(self.data.close, period = self.params.fast,
-                                                   plotname = '50 day moving average')
+        # Shared between the instances of an optimization (see indcache): each
+        # average is computed once per period, each crossover once per pair
+        self.fastMovingAverage = indcache.cached(bt.indicators.SimpleMovingAverage, self.data.close,
+                                                 period = self.params.fast, plotname = '50 day moving average')
 
-        self.slowMovingAverage = bt.indicators.SimpleMovingAverage(self.data.close, period = self.params.slow,
-                                                   plotname = '200 day moving average')
+        self.slowMovingAverage = indcache.cached(bt.indicators.SimpleMovingAverage, self.data.close,
+                                                 period = self.params.slow, plotname = '200 day moving average')
 
-        self.crossover = bt.indicators.CrossOver(self.fastMovingAverage, self.slowMovingAverage)
+        self.crossover = indcache.cached(bt.indicators.CrossOver, self.fastMovingAverage, self.slowMovingAverage)
 
+        self.ledger = Ledger()  # Fills and closed trades
+
+    def notify_order(self, order):
+        if order.status in [order.Completed]:
+            self.ledger.fill(order)
+
+    def notify_trade(self, trade):
+        if trade.isclosed:
+            self.ledger.trade(trade)
 
 
     def next(self):
@@ -416,24 +469,26 @@ class GoldenCross(bt.Strategy):
                 amountToinvest = (self.params.orderPercentage * self.broker.cash)
                 self.size = math.floor(amountToinvest / self.data.close)
 
-                print('Buy {} shares at {}'.format(self.size, self.data.close[0]))
+                self.log('Buy %s shares at %s', self.size, self.data.close[0])
                 self.buy(size=self.size)
 
         if self.position.size > 0:
             if (self.crossover < 0):
-                print('Sell {} shares at {}'.format(self.size, self.data.close[0]))
+                self.log('Sell %s shares at %s', self.size, self.data.close[0])
                 self.sell(size=self.size)
 
+    def stop(self):
+        self.ledger.export(type(self).__name__)
+
 class BuyTheDip(bt.Strategy):
     params = (
         ('maPeriod', 9 ),
         ('orderPercentage', 0.95),
     )
 
-    def log(self, txt, dt=None):
-        ''' Logging function fot this strategy'''
-        dt = dt or self.datas[0].datetime.date(0)
-        print('%s, %s' % (dt.isoformat(), txt))
+    def log(self, txt, *args, **kwargs):
+        ''' Logging function fot this strategy, see stratlog.log '''
+        stratlog.log(self, txt, *args, **kwargs)
 
     def __init__(self):
        # Tracking of daily and weekly close price and volume
@@ -446,10 +501,12 @@ class BuyTheDip(bt.Strategy):
         self.order = None
         self.buyprice = None
         self.buycomm = None
+        self.ledger = Ledger()
         self.compra = 0
 
-        # Add a MovingAverageSimple indicator
-        self.sma = bt.indicators.SimpleMovingAverage(
+        # Add a MovingAverageSimple indicator, computed once per period and
+        # data when optimizing (see indcache)
+        self.sma = indcache.cached(bt.indicators.SimpleMovingAverage,
             self.datas[0], period=self.params.maPeriod)
 
     def notify_order(self, order):
@@ -459,18 +516,19 @@ class BuyTheDip(bt.Strategy):
 
         # If orders are completed do:
         if order.status in [order.Completed]:
+            self.ledger.fill(order)
             if order.isbuy():
-                self.log('BUY EXECUTED, Size {}, Price: {:.2f}, Cost: {:.2f}, Comm {:.2f}'.format(
+                self.log('BUY EXECUTED, Size %s, Price: %.2f, Cost: %.2f, Comm %.2f',
                                                                                          order.executed.size,
                                                                                          order.executed.price,
                                                                                          order.executed.value,
-                                                                                         order.executed.comm))
+                                                                                         order.executed.comm)
 
                 self.buyprice = order.executed.price
                 self.buycomm = order.executed.comm
 
         elif order.status in [order.Canceled, order.Margin, order.Rejected]:
-            self.log('Order Canceled/Margin/Rejected')
+            self.log('Order Canceled/Margin/Rejected', level=stratlog.WARNING)
 
         # After order is completed reset status
         self.order = None
@@ -478,12 +536,13 @@ class BuyTheDip(bt.Strategy):
     def notify_trade(self, trade):
         if not trade.isclosed:
             return
+        self.ledger.trade(trade)
         # After a trade is closed show me the results.
-        self.log('OPERATION PROFIT, GROSS {:.2f}, NET {:.2f}'.format(trade.pnl, trade.pnlcomm))
+        self.log('OPERATION PROFIT, GROSS %.2f, NET %.2f', trade.pnl, trade.pnlcomm)
 
     def next(self):
         # Show daily close price and volume
-        self.log('Close, {:.2f}'.format(self.datacloseD[0]))
+        self.log('Close, %.2f', self.datacloseD[0], level=stratlog.DEBUG)
 
         if self.order:
             # If there are pending orders don´t do anything
@@ -500,7 +559,7 @@ class BuyTheDip(bt.Strategy):
             amountToinvest = (self.params.orderPercentage * self.broker.cash)
             self.size = math.floor(amountToinvest / self.datacloseD[0])
 
-            self.log('BUY CREATE, {:.2f}'.format(self.datacloseD[0]))
+            self.log('BUY CREATE, %.2f', self.datacloseD[0])
 
             # Buy on daily time frame at market value.
             self.order = self.buy(data=self.datas[0], size=self.size)
@@ -509,5 +568,6 @@ class BuyTheDip(bt.Strategy):
     def stop(self):
         # calculate the actual returns
         self.froi = self.broker.get_fundvalue() - self.val_start
-        print('Fund Value: {:.2f}%'.format(self.froi))
+        self.log('Fund Value: %.2f%%', self.froi)
+        self.ledger.export(type(self).__name__)
 
@@ -0,0 +1,152 @@
+import atexit
+import collections
+import json
+import queue
+import threading
+
+
+# Levels, same values as the standard logging module
+DEBUG = 10
+INFO = 20
+WARNING = 30
+QUIET = 100  # above every level, nothing is logged
+
+LEVELNAMES = {DEBUG: 'DEBUG', INFO: 'INFO', WARNING: 'WARNING'}
+
+
+class _Writer(threading.Thread):
+    '''Background thread writing records as JSON lines.
+
+    Records are queued unformatted by the strategies and the thread formats
+    and writes them in batches of up to batch records.
+    '''
+
+    def __init__(self, filename, batch):
+        super(_Writer, self).__init__(daemon=True)
+        self.f = open(filename, 'a')
+        self.batch = batch
+        self.queue = queue.Queue()
+        self.start()
+
+    def run(self):
+        while True:
+            records = [self.queue.get()]
+            while len(records) < self.batch:
+                try:
+                    records.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            done = None in records
+            self.f.write(''.join(json.dumps(asdict(record)) + '\n'
+                                 for record in records if record is not None))
+            self.f.flush()
+            for _ in records:
+                self.queue.task_done()
+
+            if done:
+                self.f.close()
+                return
+
+
+class Logger(object):
+    '''Strategy logger with levels and lazy formatting.
+
+    Messages below the level return before the date is fetched or the text
+    is formatted. The enabled ones go, as records, to one or more sinks.
+
+    Parameters
+    ----------
+    level: int
+    Minimum level to log (DEBUG, INFO, WARNING or QUIET).
+    stdout: bool
+    Print the messages as 'date, text' (the original strategies output).
+    ringsize: int
+    Keep the last ringsize records in memory (see records), 0 disables it.
+    filename: str
+    Append the records as JSON lines to this file from a background thread.
+    batch: int
+    Maximum records written at once by the background thread.
+    '''
+
+    def __init__(self, level=INFO, stdout=True, ringsize=0, filename=None,
+                 batch=1000):
+        self.level = level
+        self.stdout = stdout
+        self.ring = collections.deque(maxlen=ringsize) if ringsize else None
+        self.writer = _Writer(filename, batch) if filename else None
+
+    def enabled(self, level):
+        return level >= self.level
+
+    def emit(self, record):
+        if self.stdout:
+            print('%s, %s' % (record[0].isoformat(), _format(record)))
+
+        if self.ring is not None:
+            self.ring.append(record)
+
+        if self.writer is not None:
+            self.writer.queue.put(record)
+
+    def records(self):
+        ''' Records kept in memory, as dicts '''
+        return [asdict(record) for record in self.ring or ()]
+
+    def flush(self):
+        ''' Wait until the background thread has written everything '''
+        if self.writer is not None:
+            self.writer.queue.join()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.queue.put(None)
+            self.writer.join()
+            self.writer = None
+
+
+def _format(record):
+    txt, args = record[3], record[4]
+    return txt % args if args else txt
+
+
+def asdict(record):
+    ''' Record tuple (dt, level, strategy, txt, args) to a JSON ready dict '''
+    return dict(dt=record[0].isoformat(),
+                level=LEVELNAMES.get(record[1], record[1]),
+                strategy=record[2], msg=_format(record))
+
+
+_logger = Logger()
+atexit.register(lambda: _logger.close())
+
+
+def configure(**kwargs):
+    ''' Replace the shared logger, takes the Logger parameters '''
+    global _logger
+    _logger.close()
+    _logger = Logger(**kwargs)
+    return _logger
+
+
+def quiet():
+    ''' Log nothing, the cheapest mode for sweeps '''
+    return configure(level=QUIET, stdout=False)
+
+
+def getlogger():
+    return _logger
+
+
+def log(strategy, txt, *args, **kwargs):
+    '''Log txt % args for strategy.
+
+    Keyword arguments: level (default INFO) and dt (default the date of the
+    first data of the strategy).
+    '''
+    level = kwargs.get('level', INFO)
+    if level < _logger.level:
+        return
+
+    dt = kwargs.get('dt') or strategy.datas[0].datetime.date(0)
+    _logger.emit((dt, level, type(strategy).__name__, txt, args))
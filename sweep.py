@@ -0,0 +1,229 @@
+import itertools
+import multiprocessing
+import os
+
+import backtrader as bt
+import numpy as np
+
+import results
+import stratlog
+from profiling import Profiler
+from feeds import ArrayData
+from sharedmem import SharedArray, attach
+
+
+class FinalValue(bt.Analyzer):
+    ''' Broker value and fund value at the end of the run '''
+
+    def stop(self):
+        self.rets['value'] = self.strategy.broker.getvalue()
+        self.rets['fundvalue'] = self.strategy.broker.get_fundvalue()
+
+
+# Worker process state, set once per process by _initworker
+_worker = dict()
+
+# Tasks per process, so the workers that finish first take more
+TASKS_PER_PROCESS = 4
+
+
+def _initworker(descriptors, feedkwargs, quiet):
+    if quiet:
+        # Keep the workers from fighting over the terminal
+        stratlog.quiet()
+
+    _worker['shared'] = [attach(descriptor) for descriptor in descriptors]
+    _worker['feedkwargs'] = feedkwargs
+
+
+def _runtask(task):
+    strategy, combos, cash, resample, profile, curve = task
+
+    cerebro = bt.Cerebro(stdstats=False, optreturn=True, maxcpus=1)
+    for (shm, bars), kwargs in zip(_worker['shared'], _worker['feedkwargs']):
+        cerebro.adddata(ArrayData(dataname=bars, **kwargs))
+    for timeframe in resample:
+        cerebro.resampledata(cerebro.datas[0], timeframe=timeframe)
+
+    cerebro.broker.setcash(cash)
+    # optstrategy runs the product of its values, the runs of this chunk of
+    # the product are given to cerebro directly instead
+    cerebro.optstrategy(strategy)
+    cerebro.strats[-1] = [(strategy, (), params) for params in combos]
+    cerebro.addanalyzer(FinalValue, _name='finalvalue')
+    if profile:
+        cerebro.addanalyzer(Profiler, _name='profiler', samplerate=profile)
+    if curve:
+        cerebro.addanalyzer(results.FundCurve, _name='fundcurve')
+
+    rows = []
+    for run in cerebro.run():
+        strat = run[0]
+        row = dict((name, getattr(strat.params, name)) for name in combos[0])
+        row.update(strat.analyzers.finalvalue.get_analysis())
+        if profile:
+            row['profile'] = strat.analyzers.profiler.get_analysis()
+        if curve:
+            row['curve'] = strat.analyzers.fundcurve.get_analysis()['curve']
+        rows.append(row)
+
+    return rows
+
+
+def _gridvalues(grid):
+    '''Names and lists of values of a grid. Any iterable but a string is a
+    list of values (NumPy arrays give Python scalars), anything else a
+    single one.
+    '''
+    if not grid:
+        raise ValueError('Empty grid, give at least one strategy param')
+
+    values = []
+    for value in grid.values():
+        if isinstance(value, str) or not hasattr(value, '__iter__'):
+            value = [value]
+        values.append([v.item() if isinstance(v, np.generic) else v
+                       for v in value])
+    return list(grid), values
+
+
+def _splitgrid(grid, chunks, skip=None):
+    '''Split every combination of the grid in up to chunks lists of params
+    dicts of about the same size, each one run by a worker as one optimized
+    Cerebro. Parameter sets for which skip(params) is true are left out.
+    '''
+    names, values = _gridvalues(grid)
+    combos = [dict(zip(names, combo)) for combo in itertools.product(*values)]
+    combos = [params for params in combos if skip is None or not skip(params)]
+
+    chunks = max(1, min(chunks, len(combos)))
+    size, extra = divmod(len(combos), chunks)
+    first = 0
+    for i in range(chunks if combos else 0):
+        last = first + size + (i < extra)
+        yield combos[first:last]
+        first = last
+
+
+def sweep(strategy, bars, cash=1000, resample=(), processes=None, quiet=True,
+          feedkwargs=None, profile=None, store=None, ticker='', **grid):
+    '''Run a parameter grid of a strategy over a process pool.
+
+    The bars are copied once into shared memory and every worker feeds
+    them to its own Cerebro, no data is pickled per run. The grid is given
+    like to cerebro.optstrategy, its combinations are split in about
+    TASKS_PER_PROCESS chunks per process and each chunk is one optimized
+    Cerebro run by a worker, so even a one param grid uses every process.
+
+    Parameters
+    ----------
+    strategy: bt.Strategy subclass
+    bars: np.ndarray or list of them
+    BAR_DTYPE arrays, for example from DataCache.get, one feed each. A
+    weekly array from DataCache.getresampled(..., lagged=True) saves
+    resampling in every run.
+    cash: float
+    Starting cash of every run.
+    resample: list
+    Timeframes to resample the first feed to (wmaStrategy needs Weeks,
+    unless a weekly array is given).
+    processes: int
+    Pool size, defaults to the number of cores.
+    quiet: bool
+    Drop what the strategies log in the workers.
+    feedkwargs: dict or list of them
+    Extra arguments for the ArrayData feeds (timeframe, fromdate...).
+    profile: float
+    Profile the runs timing this fraction of the calls (see profiling).
+    store: results.ResultStore
+    Save every run with its fund curve, the parameter sets already stored
+    for the same data are not run again but read from it.
+    ticker: str
+    Recorded with the runs in the store.
+
+    Returns a list with one dict per parameter set (params, final broker
+    value and fund value, profile if asked) sorted by fund value, best
+    first.
+    '''
+    if not isinstance(bars, (list, tuple)):
+        bars, feedkwargs = [bars], [feedkwargs or dict()]
+    feedkwargs = feedkwargs or [dict() for _ in bars]
+    # Read once, iterators in the grid would be empty the second time
+    grid = dict(zip(*_gridvalues(grid)))
+
+    rows, skip = [], None
+    if store is not None:
+        datahash = results.datahash(bars)
+        # Dates the first feed uses
+        fromdate, todate = results.daterange(
+            bars[0], feedkwargs[0].get('fromdate'), feedkwargs[0].get('todate'))
+
+        def key(params):
+            return results.confighash(strategy, params, ticker, fromdate,
+                                      todate, datahash, cash, tuple(resample),
+                                      feedkwargs)
+
+        hashes = [key(dict(zip(grid, combo)))
+                  for combo in itertools.product(*grid.values())]
+        done = store.done(hashes)
+        for stored in store.query(hashes=done):
+            row = dict((name, stored['params'][name]) for name in grid)
+            row.update(value=stored['value'], fundvalue=stored['fundvalue'])
+            rows.append(row)
+
+        def skip(params):
+            return key(params) in done
+
+    chunks = (processes or os.cpu_count() or 1) * TASKS_PER_PROCESS
+    tasks = [(strategy, combos, cash, tuple(resample), profile,
+              store is not None) for combos in _splitgrid(grid, chunks, skip)]
+
+    shared = [SharedArray(arr) for arr in bars]
+    try:
+        initargs = ([s.descriptor for s in shared], feedkwargs, quiet)
+        with multiprocessing.Pool(processes, _initworker, initargs) as pool:
+            for row in itertools.chain.from_iterable(
+                    pool.imap_unordered(_runtask, tasks)):
+                if store is not None:
+                    params = dict((name, row[name]) for name in grid)
+                    store.add(dict(hash=key(params), strategy=strategy.__name__,
+                                   params=results.allparams(strategy, params),
+                                   ticker=ticker, fromdate=fromdate,
+                                   todate=todate, datahash=datahash, cash=cash,
+                                   value=row['value'],
+                                   fundvalue=row['fundvalue']),
+                              row.pop('curve'))
+                rows.append(row)
+    finally:
+        for s in shared:
+            s.close()
+        if store is not None:
+            store.flush()
+
+    rows.sort(key=lambda row: row['fundvalue'], reverse=True)
+    return rows
+
+
+def print_table(rows):
+    ''' Print the sweep results as a text table '''
+    if not rows:
+        return
+
+    names = [name for name in rows[0] if name != 'profile']
+    print(' '.join('{:>12}'.format(name) for name in names))
+    for row in rows:
+        print(' '.join('{:>12.2f}'.format(row[name])
+                       if isinstance(row[name], float)
+                       else '{:>12}'.format(row[name]) for name in names))
+
+
+if __name__ == '__main__':
+    import datetime as dt
+
+    import strategies as strg
+    from datacache import DataCache
+
+    bars = DataCache().get('KO', dt.date(2007, 1, 1), dt.date(2021, 5, 20))
+    rows = sweep(strg.GoldenCross, bars, cash=1000,
+                 fast=range(10, 60, 10), slow=range(100, 260, 20))
+    print_table(rows)
@@ -0,0 +1,33 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import stratlog  # noqa: E402
+from bench import synthetic  # noqa: E402
+
+
+stratlog.quiet()
+
+
+@pytest.fixture(scope='session')
+def bars():
+    ''' About 4 years of synthetic daily bars, no network needed '''
+    return synthetic(1500, '1d')
+
+
+@pytest.fixture
+def cache(tmp_path, bars):
+    ''' DataCache serving the synthetic bars as ticker SYN '''
+    from datacache import DataCache
+    from feeds import to_seconds
+
+    def fetcher(ticker, fromdate, todate, interval='1d'):
+        secs = bars['datetime']
+        first = secs.searchsorted(to_seconds(fromdate))
+        last = secs.searchsorted(to_seconds(todate), side='right')
+        return bars[first:last].copy()
+
+    return DataCache(str(tmp_path / 'cache'), fetcher=fetcher)
@@ -0,0 +1,39 @@
+import subprocess
+
+import numpy as np
+
+import bench
+from feeds import BAR_DTYPE
+
+
+def test_synthetic():
+    bars = bench.synthetic(1000, '1m')
+    assert bars.dtype == BAR_DTYPE
+    assert np.all(np.diff(bars['datetime']) == 60)
+    assert np.all(bars['high'] >= np.maximum(bars['open'], bars['close']))
+    assert np.all(bars['low'] <= np.minimum(bars['open'], bars['close']))
+
+
+def test_runcase():
+    result = bench.runcase('GoldenCross', '1d', 2000, 'runonce')
+    assert result['bars'] == 2000 and 'error' not in result
+    assert 0 < result['startup'] <= result['wall']
+
+
+def test_killed_case(monkeypatch):
+    # A child killed for memory dies without a traceback
+    def run(*args, **kwargs):
+        return subprocess.CompletedProcess(args, -9, '', '')
+    monkeypatch.setattr(subprocess, 'run', run)
+
+    result = bench._spawncase('GoldenCross', '1d', 10, 'stream')
+    assert result['error'] == 'exit code -9'
+
+
+def test_compare():
+    case = dict(strategy='GoldenCross', interval='1d', bars=10, mode='stream')
+    baseline = dict(results=[dict(case, barspersec=1000.0, peakrss=100.0)])
+    same = dict(results=[dict(case, barspersec=900.0, peakrss=110.0)])
+    worse = dict(results=[dict(case, barspersec=700.0, peakrss=130.0)])
+    assert bench.compare(same, baseline) == []
+    assert len(bench.compare(worse, baseline)) == 2
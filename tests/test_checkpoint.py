@@ -0,0 +1,64 @@
+import backtrader as bt
+import pytest
+
+import checkpoint
+import strategies as strg
+from feeds import ArrayData, from_seconds
+
+
+def _run(bars, filename, state=None, todate=None):
+    cerebro = bt.Cerebro(stdstats=False)
+    fromdate = state['fromdate'] if state else None
+    cerebro.adddata(ArrayData(dataname=bars, fromdate=fromdate, todate=todate))
+    cerebro.broker.setcash(1000)
+    cerebro.addstrategy(strg.BuyAndHold_More_Fund)
+    cerebro.addanalyzer(checkpoint.Checkpoint, filename=filename, state=state)
+    run = cerebro.run()[0]
+    return cerebro.broker, run.ledger.records
+
+
+@pytest.mark.parametrize('split', [40, 400, 1001])
+def test_resume_matches_full_replay(bars, tmp_path, split):
+    filename = str(tmp_path / 'checkpoint.pkl')
+    broker, records = _run(bars, filename)
+
+    _run(bars, filename, todate=from_seconds(bars['datetime'][split]))
+    state = checkpoint.load(filename)
+    assert state['broker']['_value'] > 0
+    resumed, resumedrecords = _run(bars, filename, state=state)
+
+    assert resumed.getvalue() == broker.getvalue()
+    assert resumed.get_fundvalue() == broker.get_fundvalue()
+    assert (resumedrecords == records).all()
+
+
+def test_chained_daily_runs(bars, tmp_path):
+    filename = str(tmp_path / 'checkpoint.pkl')
+    broker, _ = _run(bars, filename)
+
+    state = None
+    for split in range(1000, len(bars), 100):
+        _run(bars, filename, state=state,
+             todate=from_seconds(bars['datetime'][split]))
+        state = checkpoint.load(filename)
+    resumed, _ = _run(bars, filename, state=state)
+    assert resumed.getvalue() == broker.getvalue()
+
+
+
+class _NoRestore(strg.BuyAndHold_More_Fund):
+
+    def start(self):
+        pass
+
+
+@pytest.mark.parametrize('strategy', [strg.smaStrategy, _NoRestore])
+def test_strategies_that_cannot_resume(bars, tmp_path, strategy):
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.adddata(ArrayData(dataname=bars[:100]))
+    cerebro.addstrategy(strategy)
+    cerebro.addanalyzer(checkpoint.Checkpoint,
+                        filename=str(tmp_path / 'checkpoint.pkl'))
+    with pytest.raises(ValueError):
+        cerebro.run()
+    assert not (tmp_path / 'checkpoint.pkl').exists()
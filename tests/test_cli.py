@@ -0,0 +1,84 @@
+import io
+import json
+
+import pytest
+
+import cli
+import strategies as strg
+import vectorized
+
+
+def test_load_reports_bad_specs(monkeypatch, tmp_path):
+    monkeypatch.setattr('sys.stdin', io.StringIO(
+        '{"tickers": "SYN"}\n\n{bad\n[1]\n'))
+    specs = list(cli.load('-'))
+    assert [where for where, _ in specs] == \
+        ['stdin line 1', 'stdin line 3', 'stdin line 4']
+    assert specs[0][1] == dict(tickers='SYN')
+    assert all(isinstance(spec, ValueError) for _, spec in specs[1:])
+
+    filename = str(tmp_path / 'specs.json')
+    with open(filename, 'w') as f:
+        json.dump([dict(cash=10), 'KO'], f)
+    specs = list(cli.load(filename))
+    assert specs[0] == (filename + ' item 1', dict(cash=10))
+    assert isinstance(specs[1][1], ValueError)
+
+    specs = list(cli.load(str(tmp_path / 'missing.json')))
+    assert len(specs) == 1 and isinstance(specs[0][1], ValueError)
+
+
+def test_main_keeps_going(monkeypatch, capsys):
+    monkeypatch.setattr('sys.stdin', io.StringIO('{bad\n{"strategy": "Nope"}\n'))
+    assert cli.main(['-']) == 1
+    out = capsys.readouterr().out
+    assert 'stdin line 1: Invalid JSON' in out
+    assert 'No strategy Nope' in out
+
+
+def test_run_matches_cerebro(monkeypatch, cache, bars):
+    monkeypatch.setitem(cli._caches, (cache.cachedir, False), cache)
+    rows = cli.run(dict(strategy='GoldenCross', params=dict(fast=10, slow=50),
+                        tickers='SYN', fromdate='1970-01-01',
+                        todate='1975-01-01', cachedir=cache.cachedir))
+    assert len(rows) == 1
+    row = rows[0]
+    assert row['error'] == ''
+    assert row['bars'] == len(bars)
+    assert 0 < row['startup'] < row['wall']
+
+    _, value, fundvalue = vectorized.run_cerebro(strg.GoldenCross, bars,
+                                                 fast=10, slow=50)
+    assert row['value'] == value[-1]
+    assert row['fundvalue'] == fundvalue[-1]
+
+
+def test_resolve():
+    spec = cli.resolve(dict(tickers='KO'))
+    assert spec['tickers'] == ['KO'] and spec['todate']
+    with pytest.raises(ValueError, match='ticker'):
+        cli.resolve(dict(ticker='KO'))
+
+
+def test_malformed_spec_then_valid(monkeypatch, capsys, cache):
+    monkeypatch.setitem(cli._caches, (cache.cachedir, True), cache)
+    valid = dict(strategy='GoldenCross', params=dict(fast=10, slow=50),
+                 tickers='SYN', fromdate='1970-01-01', todate='1975-01-01',
+                 cachedir=cache.cachedir, offline=True)
+    monkeypatch.setattr('sys.stdin', io.StringIO('{"tickers": 5}\n' +
+                                                 json.dumps(valid) + '\n'))
+    assert cli.main(['-']) == 1
+    out = capsys.readouterr().out
+    assert 'stdin line 1: tickers must be a list' in out
+    ran = [line.split() for line in out.splitlines() if 'SYN' in line]
+    assert len(ran) == 1 and ran[0][:3] == ['GoldenCross', 'SYN', '1500']
+    assert 'Error' not in out
+
+
+@pytest.mark.parametrize('spec', [dict(params=[1]), dict(cash='10'),
+                                  dict(plot=1), dict(resample='1wk'),
+                                  dict(todate='tomorrow'),
+                                  dict(tickers=['KO', 3])])
+def test_resolve_types(spec):
+    with pytest.raises(ValueError):
+        cli.resolve(spec)
@@ -0,0 +1,103 @@
+import datetime as dt
+
+import backtrader as bt
+import numpy as np
+import pytest
+
+import strategies as strg
+from datacache import DataCache, merge, resample
+from feeds import to_seconds
+
+
+FROMDATE, TODATE = dt.date(1970, 1, 1), dt.date(1974, 1, 1)
+
+
+def _counting(cache):
+    calls = []
+    fetcher = cache.fetcher
+
+    def counted(ticker, fromdate, todate, interval='1d'):
+        calls.append((fromdate, todate))
+        return fetcher(ticker, fromdate, todate, interval)
+
+    cache.fetcher = counted
+    return calls
+
+
+def test_only_missing_dates_are_fetched(cache, bars):
+    calls = _counting(cache)
+    first = cache.get('SYN', dt.date(1971, 1, 1), dt.date(1972, 1, 1))
+    assert calls == [(dt.date(1971, 1, 1), dt.date(1972, 1, 1))]
+    secs = first['datetime']
+    assert np.array_equal(cache.get('SYN', dt.date(1971, 6, 1),
+                                    dt.date(1971, 7, 1)),
+                          first[(secs >= to_seconds(dt.date(1971, 6, 1))) &
+                                (secs <= to_seconds(dt.date(1971, 7, 1)))])
+    assert len(calls) == 1
+
+    both = cache.get('SYN', FROMDATE, TODATE)
+    assert calls[1:] == [(FROMDATE, dt.date(1970, 12, 31)),
+                         (dt.date(1972, 1, 2), TODATE)]
+    assert cache.coverage('SYN') == (FROMDATE, TODATE)
+    assert np.array_equal(both, bars[bars['datetime'] <= to_seconds(TODATE)])
+
+
+def test_offline(cache):
+    cache.get('SYN', FROMDATE, TODATE)
+    offline = DataCache(cache.cachedir, offline=True, fetcher=None)
+    assert np.array_equal(offline.get('SYN', FROMDATE, TODATE),
+                          cache.get('SYN', FROMDATE, TODATE))
+    with pytest.raises(IOError):
+        offline.get('KO', FROMDATE, TODATE)
+
+
+def test_merge_keeps_the_latest_bars(bars):
+    fixed = bars[5:10].copy()
+    fixed['close'] += 1.0
+    merged = merge([bars[:10], fixed, bars[8:20]])
+    assert np.array_equal(merged['datetime'], bars['datetime'][:20])
+    assert np.array_equal(merged['close'][5:8], fixed['close'][:3])
+    assert np.array_equal(merged['close'][8:], bars['close'][8:20])
+
+
+def test_resampled_appends(cache, bars):
+    calls = _counting(cache)
+    cache.get('SYN', FROMDATE, dt.date(1972, 1, 1))
+    cache.resampled('SYN', '1wk')
+    cache.get('SYN', FROMDATE, TODATE)
+    for interval in ('1wk', '1mo'):
+        assert np.array_equal(cache.resampled('SYN', interval),
+                              resample(cache.load('SYN'), interval))
+    assert len(calls) == 2
+
+
+def test_getresampled_cuts_the_edges(cache):
+    fromdate, todate = dt.date(1970, 3, 4), dt.date(1973, 11, 20)
+    cache.resampled('SYN', '1wk')
+    for interval in ('1wk', '1mo'):
+        assert np.array_equal(
+            cache.getresampled('SYN', fromdate, todate, interval),
+            resample(cache.get('SYN', fromdate, todate), interval))
+
+
+def _run(daily, weekly, runonce):
+    cerebro = bt.Cerebro(stdstats=False, runonce=runonce)
+    cerebro.adddata(daily)
+    if weekly is None:
+        cerebro.resampledata(daily, timeframe=bt.TimeFrame.Weeks)
+    else:
+        cerebro.adddata(weekly)
+    cerebro.broker.setcash(1000)
+    cerebro.addstrategy(strg.wmaStrategy)
+    cerebro.run()
+    return cerebro.broker.getvalue()
+
+
+@pytest.mark.parametrize('runonce', [True, False])
+def test_resampled_feed_matches_resampledata(cache, runonce):
+    fromdate, todate = dt.date(1970, 3, 4), dt.date(1973, 11, 20)
+    expected = _run(cache.getfeed('SYN', fromdate, todate), None, runonce)
+    value = _run(cache.getfeed('SYN', fromdate, todate),
+                 cache.getresampledfeed('SYN', fromdate, todate), runonce)
+    assert value == expected
+    assert value != 1000
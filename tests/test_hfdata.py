@@ -0,0 +1,89 @@
+import backtrader as bt
+import numpy as np
+import pytest
+
+import hfdata
+import strategies as strg
+from bench import synthetic
+from feeds import ArrayData
+
+
+@pytest.fixture(scope='module')
+def minutes():
+    return synthetic(5000, '1m')
+
+
+def _run(data, **kwargs):
+    cerebro = bt.Cerebro(stdstats=False, **kwargs)
+    cerebro.adddata(data)
+    cerebro.broker.setcash(1000)
+    cerebro.addstrategy(strg.GoldenCross, fast=10, slow=50)
+    strategy = cerebro.run()[0]
+    return cerebro.broker.getvalue(), len(strategy), data.close.array
+
+
+def test_roundtrip(minutes, tmp_path):
+    path = str(tmp_path / 'bars')
+    assert hfdata.convert(minutes[:3000], path, '1m', chunk=700) == 3000
+    assert hfdata.convert(minutes[3000:], path, '1m') == 2000
+
+    bars = hfdata.HFFile(path)
+    assert len(bars) == 5000 and bars.interval == '1m'
+    for name in hfdata.FIELDS:
+        assert np.array_equal(bars[name], minutes[name])
+    assert not bars['openinterest'].any()
+    assert np.array_equal(bars[100:200]['close'], minutes['close'][100:200])
+
+    secs = minutes['datetime']
+    window = bars.dates(secs[10], secs[20])
+    assert np.array_equal(window['datetime'], secs[10:21])
+
+    with pytest.raises(ValueError):
+        hfdata.convert(minutes[:10], path, '1m')
+    with pytest.raises(ValueError):
+        hfdata.HFWriter(path, '1d')
+
+
+@pytest.mark.parametrize('kwargs', [dict(), dict(runonce=False),
+                                    dict(preload=False)])
+def test_matches_arraydata(minutes, tmp_path, kwargs):
+    path = str(tmp_path / 'bars')
+    hfdata.convert(minutes, path, '1m')
+    timeframe = dict(timeframe=bt.TimeFrame.Minutes, compression=1)
+    expected = _run(ArrayData(dataname=minutes, **timeframe), **kwargs)
+    value, count, closes = _run(hfdata.getfeed(path, chunk=999), **kwargs)
+    assert (value, count) == expected[:2]
+    assert list(closes) == list(expected[2])
+
+
+def test_dates(minutes, tmp_path):
+    path = str(tmp_path / 'bars')
+    hfdata.convert(minutes, path, '1m')
+    fromdate = minutes['datetime'][1000].astype('datetime64[s]').item()
+    todate = minutes['datetime'][3999].astype('datetime64[s]').item()
+    for preload in (True, False):
+        cerebro = bt.Cerebro(stdstats=False, preload=preload)
+        data = hfdata.getfeed(path, fromdate=fromdate, todate=todate)
+        cerebro.adddata(data)
+        cerebro.addstrategy(bt.Strategy)
+        cerebro.run()
+        assert len(data) == 3000
+        assert data.close[0] == minutes['close'][3999]
+
+
+def test_csv(minutes, tmp_path):
+    filename = str(tmp_path / 'bars.csv')
+    with open(filename, 'w') as f:
+        f.write('Date,Open,High,Low,Close,Adj Close,Volume\n')
+        for row in minutes[:50]:
+            when = row['datetime'].astype('datetime64[s]')
+            f.write('{}+00:00,{!r},{!r},{!r},{!r},0,{!r}\n'.format(
+                str(when).replace('T', ' '), row['open'], row['high'],
+                row['low'], row['close'], row['volume']))
+        f.write('2000-01-01,null,null,null,null,null,null\n')
+
+    path = str(tmp_path / 'bars')
+    assert hfdata.convert(filename, path, '1m', chunk=16) == 50
+    bars = hfdata.HFFile(path)
+    for name in hfdata.FIELDS:
+        assert np.array_equal(bars[name], minutes[:50][name])
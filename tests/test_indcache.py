@@ -0,0 +1,78 @@
+import datetime as dt
+
+import backtrader as bt
+import pytest
+
+import indcache
+import strategies as strg
+from feeds import ArrayData
+from sweep import FinalValue
+
+
+def _optimize(bars, strategy, weekly=None, **kwargs):
+    cerebro = bt.Cerebro(stdstats=False, maxcpus=1, optreturn=False, **kwargs)
+    cerebro.adddata(ArrayData(dataname=bars))
+    if weekly is not None:
+        cerebro.adddata(ArrayData(dataname=weekly, timeframe=bt.TimeFrame.Weeks))
+    cerebro.broker.setcash(1000)
+    cerebro.optstrategy(strategy, **strategy.grid)
+    # The broker is shared by the runs, their values are in the analyzer
+    cerebro.addanalyzer(FinalValue, _name='finalvalue')
+    return [run[0] for run in cerebro.run()]
+
+
+def _values(runs):
+    return [run.analyzers.finalvalue.get_analysis()['value'] for run in runs]
+
+
+class _GoldenCross(strg.GoldenCross):
+    grid = dict(fast=[10, 20], slow=[50, 100])
+
+
+class _wmaStrategy(strg.wmaStrategy):
+    grid = dict(volReltship=[1.0, 1.05, 1.1])
+
+
+def test_shared_lines_give_the_same_results(bars):
+    cache = indcache.configure()
+    cached = _optimize(bars, _GoldenCross)
+    # 4 SMAs and 4 crossovers, each SMA is used by two runs
+    assert cache.misses == 8 and cache.hits == 4
+    plain = _optimize(bars, _GoldenCross, runonce=False)
+    assert _values(cached) == _values(plain)
+    assert len(set(_values(cached))) == 4
+
+
+def test_plain_indicators_without_runonce(bars):
+    indcache.configure()
+    for kwargs in (dict(runonce=False), dict(preload=False),
+                   dict(exactbars=-2)):
+        strategy = _optimize(bars, _GoldenCross, **kwargs)[0]
+        assert not any(isinstance(ind, indcache._CachedIndicator)
+                       for ind in strategy.getindicators())
+
+
+def test_cached_lines_are_read_only(bars):
+    indcache.configure()
+    strategy = _optimize(bars, _GoldenCross)[0]
+    with pytest.raises(TypeError):
+        strategy.crossover.lines[0].array[0] = 1.0
+    with pytest.raises(TypeError):
+        strategy.crossover.lines[0].array.append(1.0)
+
+
+def test_weekly_feed_is_shared(bars, cache):
+    fromdate, todate = dt.date(1970, 1, 1), dt.date(1975, 1, 1)
+    daily = cache.get('SYN', fromdate, todate)
+    weekly = cache.getresampled('SYN', fromdate, todate, '1wk', lagged=True)
+    indcache.configure()
+    runs = _optimize(daily, _wmaStrategy, weekly=weekly)
+    assert indcache.getcache().misses == 1 and indcache.getcache().hits == 2
+
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.adddata(ArrayData(dataname=daily))
+    cerebro.resampledata(cerebro.datas[0], timeframe=bt.TimeFrame.Weeks)
+    cerebro.broker.setcash(1000)
+    cerebro.addstrategy(strg.wmaStrategy, volReltship=1.05)
+    cerebro.run()
+    assert _values(runs)[1] == cerebro.broker.getvalue()
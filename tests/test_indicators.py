@@ -0,0 +1,51 @@
+import backtrader as bt
+import numpy as np
+import pytest
+
+from feeds import ArrayData
+from indicators import RollingStats
+
+
+class _Record(bt.Strategy):
+    params = (('data', 0), ('period', 4), ('lag', 0),)
+
+    def __init__(self):
+        data = self.datas[self.p.data]
+        self.stats = RollingStats(data.volume, period=self.p.period,
+                                  lag=self.p.lag)
+        self.mean = bt.ind.SMA(data.volume(-self.p.lag), period=self.p.period)
+        self.std = bt.ind.StdDev(data.volume(-self.p.lag),
+                                 period=self.p.period)
+        self.rows = []
+
+    def next(self):
+        self.rows.append((self.stats.mean[0], self.mean[0], self.stats.std[0],
+                          self.std[0], self.stats.sum[0]))
+
+
+def _run(bars, weekly, runonce, **kwargs):
+    cerebro = bt.Cerebro(stdstats=False, runonce=runonce)
+    data = ArrayData(dataname=bars)
+    cerebro.adddata(data)
+    if weekly:
+        cerebro.resampledata(data, timeframe=bt.TimeFrame.Weeks)
+        kwargs['data'] = 1
+    cerebro.addstrategy(_Record, **kwargs)
+    return np.array(cerebro.run()[0].rows)
+
+
+@pytest.mark.parametrize('runonce', [True, False])
+@pytest.mark.parametrize('weekly', [False, True])
+@pytest.mark.parametrize('lag', [0, 1])
+def test_matches_sma_and_stddev(bars, runonce, weekly, lag):
+    rows = _run(bars, weekly, runonce, period=4, lag=lag)
+    assert len(rows) > 1000
+    assert np.allclose(rows[:, 0], rows[:, 1], rtol=1e-9)
+    assert np.allclose(rows[:, 2], rows[:, 3], rtol=1e-6)
+    assert np.allclose(rows[:, 4], 4 * rows[:, 1], rtol=1e-9)
+
+
+def test_modes_agree(bars):
+    assert np.allclose(_run(bars, True, True, period=4, lag=1),
+                       _run(bars, True, False, period=4, lag=1),
+                       rtol=1e-9)
@@ -0,0 +1,54 @@
+import glob
+import os
+
+import backtrader as bt
+import numpy as np
+
+import ledger
+import strategies as strg
+import vectorized
+from feeds import ArrayData
+
+
+def test_ledger_grows():
+    records = ledger.Ledger(capacity=2)
+    records.extend(np.zeros(3, dtype=ledger.LEDGER_DTYPE))
+    for _ in range(5):
+        records._append(np.zeros(1, dtype=ledger.LEDGER_DTYPE)[0])
+    assert len(records) == 8
+    assert len(records.records) == 8
+
+
+def test_ledger_fills_match_the_broker(bars):
+    fills, _, _ = vectorized.run_cerebro(strg.GoldenCross, bars, fast=10,
+                                         slow=50)
+
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.adddata(ArrayData(dataname=bars))
+    cerebro.broker.setcash(1000)
+    cerebro.addstrategy(strg.GoldenCross, fast=10, slow=50)
+    records = cerebro.run()[0].ledger.records
+
+    traded = records[np.isin(records['kind'], [ledger.BUY, ledger.SELL])]
+    assert len(traded) == len(fills)
+    assert np.array_equal(np.abs(traded['size']), np.abs(fills['size']))
+    assert np.allclose(traded['price'], fills['price'], rtol=1e-12)
+    assert np.count_nonzero(records['kind'] == ledger.TRADE) == \
+        np.count_nonzero(traded['kind'] == ledger.SELL)
+
+
+def test_export_one_file_per_run(bars, tmp_path):
+    ledger.configure(exportdir=str(tmp_path))
+    try:
+        cerebro = bt.Cerebro(stdstats=False, maxcpus=1)
+        cerebro.adddata(ArrayData(dataname=bars))
+        cerebro.optstrategy(strg.GoldenCross, fast=[10, 20], slow=[50, 100])
+        cerebro.run()
+    finally:
+        ledger.configure()
+
+    files = glob.glob(os.path.join(str(tmp_path), 'GoldenCross.*.npy'))
+    assert len(files) == 4
+    assert not glob.glob(os.path.join(str(tmp_path), '*.tmp'))
+    for filename in files:
+        assert np.load(filename).dtype == ledger.LEDGER_DTYPE
@@ -0,0 +1,53 @@
+import queue
+
+import backtrader as bt
+import pytest
+
+import strategies as strg
+from feeds import ArrayData
+from livefeed import DecisionLatency, ReplayServer, SocketData
+
+
+def _run(data):
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.adddata(data)
+    cerebro.broker.setcash(1000)
+    cerebro.addstrategy(strg.GoldenCross, fast=10, slow=50)
+    cerebro.addanalyzer(DecisionLatency, _name='latency')
+    strategy = cerebro.run()[0]
+    return cerebro.broker.getvalue(), len(data), strategy.analyzers.latency
+
+
+@pytest.mark.parametrize('unix', [False, True])
+def test_socket_matches_arraydata(bars, tmp_path, unix):
+    bars = bars[:400]
+    expected, count, _ = _run(ArrayData(dataname=bars))
+
+    kwargs = dict(path=str(tmp_path / 'bars.sock')) if unix else dict()
+    with ReplayServer(bars, **kwargs) as server:
+        if not unix:
+            kwargs = dict(port=server.port)
+        value, live, latency = _run(SocketData(**kwargs))
+
+    assert (value, live) == (expected, count)
+    analysis = latency.get_analysis()
+    assert analysis['orders'] > 0
+    assert 0 <= analysis['p50'] <= analysis['max']
+
+
+def test_ticks_from_a_queue():
+    ticks = queue.Queue()
+    for i, price in enumerate([10.0, 11.0, 9.5]):
+        ticks.put((0.0, dict(datetime=86400 * i, price=price, volume=5)))
+    ticks.put(None)
+
+    cerebro = bt.Cerebro(stdstats=False)
+    data = SocketData(queue=ticks)
+    cerebro.adddata(data)
+    cerebro.addstrategy(bt.Strategy)
+    cerebro.run()
+
+    assert len(data) == 3
+    assert list(data.close.get(size=3)) == [10.0, 11.0, 9.5]
+    assert list(data.high.get(size=3)) == list(data.low.get(size=3))
+    assert data.datetime.date(0).isoformat() == '1970-01-03'
@@ -0,0 +1,37 @@
+import backtrader as bt
+import numpy as np
+import pytest
+
+import plotting
+import strategies as strg
+from feeds import ArrayData
+
+
+def test_lttb_keeps_the_ends_and_peaks():
+    x = np.arange(10000, dtype='f8')
+    y = np.sin(x / 100.0)
+    y[5003] = 10.0
+    keep = plotting.lttb(x, y, 200)
+    assert len(keep) == 200
+    assert keep[0] == 0 and keep[-1] == len(x) - 1
+    assert np.all(np.diff(keep) > 0)
+    assert 5003 in keep
+
+
+def test_lttb_small_series():
+    assert plotting.lttb(np.arange(5), np.arange(5), 10).tolist() == \
+        list(range(5))
+
+
+def test_plot_to_file(bars, tmp_path):
+    pytest.importorskip('matplotlib')
+    cerebro = bt.Cerebro()
+    cerebro.adddata(ArrayData(dataname=bars))
+    cerebro.broker.setcash(1000)
+    cerebro.addstrategy(strg.GoldenCross, fast=10, slow=50)
+    strategy = cerebro.run()[0]
+
+    filename = str(tmp_path / 'chart.png')
+    plotting.plot(strategy, filename, points=500)
+    with open(filename, 'rb') as f:
+        assert f.read(8) == b'\x89PNG\r\n\x1a\n'
@@ -0,0 +1,54 @@
+import glob
+import json
+import os
+
+import backtrader as bt
+
+import profiling
+import strategies as strg
+from feeds import ArrayData
+from sweep import sweep
+
+
+def _run(bars, **kwargs):
+    cerebro = bt.Cerebro(stdstats=False, **kwargs)
+    cerebro.adddata(ArrayData(dataname=bars))
+    cerebro.broker.setcash(1000)
+    cerebro.addstrategy(strg.GoldenCross, fast=10, slow=50)
+    cerebro.addanalyzer(profiling.Profiler, _name='profiler')
+    strategy = cerebro.run()[0]
+    return cerebro, strategy.analyzers.profiler.get_analysis()
+
+
+def test_counts_every_call(bars):
+    for kwargs in (dict(), dict(runonce=False)):
+        _, profile = _run(bars, **kwargs)
+        calls = profile['next']['calls'] + profile.get('prenext', {}).get('calls', 0)
+        assert calls == len(bars)
+        assert profile['next']['timed'] == profile['next']['calls']
+
+
+def test_does_not_change_results(bars):
+    cerebro, _ = _run(bars)
+    plain = bt.Cerebro(stdstats=False)
+    plain.adddata(ArrayData(dataname=bars))
+    plain.broker.setcash(1000)
+    plain.addstrategy(strg.GoldenCross, fast=10, slow=50)
+    plain.run()
+    assert cerebro.broker.getvalue() == plain.broker.getvalue()
+
+
+def test_export_one_file_per_run(bars, tmp_path):
+    profiling.configure(exportdir=str(tmp_path))
+    try:
+        rows = sweep(strg.GoldenCross, bars, processes=2, profile=0.5,
+                     fast=[10, 20], slow=[50, 100])
+    finally:
+        profiling.configure()
+
+    assert all(row['profile']['next']['calls'] for row in rows)
+    files = glob.glob(os.path.join(str(tmp_path), 'GoldenCross.*.profile.json'))
+    assert len(files) == 4
+    for filename in files:
+        with open(filename) as f:
+            assert 'next' in json.load(f)
@@ -0,0 +1,99 @@
+import datetime as dt
+
+import backtrader as bt
+import numpy as np
+import pytest
+
+import results
+import strategies as strg
+from sweep import sweep
+
+
+def _key(**kwargs):
+    config = dict(strategy=strg.GoldenCross, params=dict(fast=10), ticker='SYN',
+                  fromdate='1970-01-01', todate='1974-01-01', datahash='abc',
+                  cash=1000)
+    config.update(kwargs)
+    return results.confighash(**config)
+
+
+def test_configs_do_not_collide():
+    keys = [_key(), _key(params=dict(fast=20)), _key(ticker='KO'),
+            _key(todate='1973-01-01'), _key(datahash='def'), _key(cash=2000),
+            _key(resample=(bt.TimeFrame.Weeks,)),
+            _key(resample=(bt.TimeFrame.Months,)),
+            _key(feedkwargs=dict(fromdate=dt.datetime(1971, 1, 1))),
+            _key(feedkwargs=dict(fromdate=dt.datetime(1972, 1, 1))),
+            _key(feedkwargs=[dict(), dict(timeframe=bt.TimeFrame.Weeks)])]
+    assert len(set(keys)) == len(keys)
+
+    # Default params and a single feed dict are the same configuration
+    assert _key() == _key(params=dict(fast=10, slow=200))
+    assert _key(feedkwargs=dict(a=1, b=2)) == _key(feedkwargs=[dict(b=2, a=1)])
+
+
+def test_daterange(bars):
+    assert results.daterange(bars) == ('1970-01-01', '1974-02-08')
+    assert results.daterange(bars, dt.date(1971, 1, 1), dt.date(1971, 1, 31)) \
+        == ('1971-01-01', '1971-01-31')
+    assert results.daterange(bars, dt.datetime(1971, 1, 1),
+                             dt.datetime(1971, 1, 30, 23)) == \
+        ('1971-01-01', '1971-01-30')
+    assert results.daterange(bars[:0]) == (None, None)
+
+
+def test_sweep_reads_stored_runs(bars, tmp_path):
+    grid = dict(fast=[10, 20], slow=[50, 100])
+    with results.ResultStore(str(tmp_path / 'results.db')) as store:
+        first = sweep(strg.GoldenCross, bars, processes=1, store=store,
+                      ticker='SYN', **grid)
+        assert len(store.query()) == 4
+
+        # Everything is stored, nothing is run
+        second = sweep(strg.GoldenCross, bars, processes=1, store=store,
+                       ticker='SYN', **grid)
+        assert second == first
+
+        # Other dates are another configuration
+        sweep(strg.GoldenCross, bars, processes=1, store=store, ticker='SYN',
+              feedkwargs=dict(fromdate=dt.datetime(1971, 1, 1)), **grid)
+        assert len(store.query()) == 8
+
+        rows = store.query(strategy=strg.GoldenCross, fast=10, slow=50)
+        assert len(rows) == 2
+        assert sorted(row['fromdate'] for row in rows) == \
+            ['1970-01-01', '1971-01-01']
+        assert [row['fundvalue'] for row in store.query()] == \
+            sorted((row['fundvalue'] for row in store.query()), reverse=True)
+
+        curve = store.curve(rows[0]['hash'])
+        assert curve.dtype == results.CURVE_DTYPE
+        assert curve['value'][-1] == rows[0]['value']
+
+
+def test_query_many_hashes(tmp_path):
+    with results.ResultStore(str(tmp_path / 'results.db'), batch=10000) as store:
+        for i in range(1200):
+            store.add(dict(hash=str(i), strategy='GoldenCross',
+                           params=dict(fast=i), ticker='SYN', value=float(i),
+                           fundvalue=float(i)))
+        hashes = [str(i) for i in range(0, 1200, 2)] + ['missing']
+        assert len(store.done(hashes)) == 600
+        rows = store.query(hashes=hashes)
+        assert len(rows) == 600
+        assert rows[0]['fundvalue'] == 1198.0
+        assert store.query(hashes=[]) == []
+
+
+def test_query_param_names(tmp_path):
+    with results.ResultStore(str(tmp_path / 'results.db')) as store:
+        with pytest.raises(ValueError):
+            store.query(**{"fast') = 1 OR 1=1 --": 1})
+
+
+def test_sweep_generator_grid_with_store(bars, tmp_path):
+    with results.ResultStore(str(tmp_path / 'results.db')) as store:
+        rows = sweep(strg.GoldenCross, bars, processes=1, store=store,
+                     fast=(fast for fast in [10, 20]), slow=iter([50, 100]))
+        assert len(rows) == 4
+        assert len(store.query()) == 4
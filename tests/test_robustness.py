@@ -0,0 +1,63 @@
+import backtrader as bt
+import numpy as np
+import pytest
+
+import robustness
+import strategies as strg
+import vectorized
+from feeds import ArrayData
+
+
+def test_maxdrawdown_matches_backtrader(bars):
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.adddata(ArrayData(dataname=bars))
+    cerebro.broker.setcash(1000)
+    cerebro.addstrategy(strg.GoldenCross, fast=10, slow=50)
+    cerebro.addanalyzer(bt.analyzers.DrawDown, _name='drawdown')
+    strategy = cerebro.run()[0]
+
+    _, _, fundvalue = vectorized.run(strg.GoldenCross, bars, fast=10, slow=50)
+    expected = strategy.analyzers.drawdown.get_analysis().max.drawdown
+    assert robustness.maxdrawdown(fundvalue) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('method', ['bootstrap', 'gbm'])
+def test_generate(bars, method):
+    bars = bars[:300]
+    closes, sources = robustness.generate(bars, 50, method, block=20, seed=1)
+    assert closes.shape == sources.shape == (50, 300)
+    assert (closes[:, 0] == bars['close'][0]).all()
+    assert ((sources >= 0) & (sources < 300)).all()
+
+    again, _ = robustness.generate(bars, 50, method, block=20, seed=1)
+    assert np.array_equal(closes, again)
+
+    if method == 'bootstrap':
+        # Every return is a historical one, from its source bar
+        returns = np.log(bars['close'][1:] / bars['close'][:-1])
+        assert np.allclose(np.log(closes[:, 1:] / closes[:, :-1]),
+                           returns[sources[:, 1:] - 1])
+    else:
+        assert (sources[:, 1:] == np.arange(1, 300)).all()
+
+    path = robustness.pathbars(bars, closes[3], sources[3])
+    assert np.array_equal(path['close'], closes[3])
+    assert (path['high'] >= path['low']).all()
+
+
+def test_run(bars):
+    bars = bars[:500]
+    results = robustness.run(strg.GoldenCross, bars, npaths=20, seed=3,
+                             processes=2, chunk=6, fast=10, slow=50)
+    assert results['path'].tolist() == list(range(20))
+
+    closes, sources = robustness.generate(bars, 20, seed=3)
+    path = robustness.pathbars(bars, closes[7], sources[7])
+    fills, _, fundvalue = vectorized.run_cerebro(strg.GoldenCross, path,
+                                                 fast=10, slow=50)
+    assert results[7]['fundvalue'] == fundvalue[-1]
+    assert results[7]['fills'] == len(fills)
+
+    rows = robustness.summary(results)
+    assert [row['metric'] for row in rows] == ['fundvalue', 'maxdrawdown']
+    assert rows[0]['p5'] <= rows[0]['p50'] <= rows[0]['p95']
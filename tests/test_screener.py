@@ -0,0 +1,73 @@
+import datetime as dt
+
+import numpy as np
+
+import screener
+import vectorized
+from feeds import BAR_DTYPE
+
+
+def _closes(bars, count=4):
+    # Rows of different lengths, NaN padded on the left
+    closes = np.full((count, len(bars)), np.nan)
+    for row in range(count):
+        closes[row, row * 100:] = bars['close'][row * 50:len(bars) - row * 50]
+    return closes
+
+
+def test_sma_matches_vectorized(bars):
+    closes = _closes(bars)
+    averages = screener.sma(closes, 30)
+    for row, close in enumerate(closes):
+        valid = ~np.isnan(close)
+        expected = vectorized.sma(close[valid], 30)
+        assert np.allclose(averages[row, valid], expected, rtol=1e-12,
+                           equal_nan=True)
+        assert np.isnan(averages[row, ~valid]).all()
+
+
+def test_patterns_match_row_by_row(bars):
+    closes = _closes(bars)
+    above = screener.close_above_sma(closes, 30)
+    crosses = screener.golden_cross(closes, 10, 50)
+    lower = screener.three_lower_closes(closes)
+    for row, close in enumerate(closes):
+        valid = ~np.isnan(close)
+        close = close[valid]
+        fast, slow = vectorized.sma(close, 10), vectorized.sma(close, 50)
+        assert np.array_equal(above[row, valid],
+                              close > vectorized.sma(close, 30))
+        assert np.array_equal(crosses[row, valid],
+                              vectorized.crossover(fast, slow, 49) > 0)
+        assert lower[row, valid][2:].tolist() == \
+            [c2 < c1 < c0 for c0, c1, c2 in zip(close, close[1:], close[2:])]
+        assert not (above[row, ~valid].any() or crosses[row, ~valid].any() or
+                    lower[row, ~valid].any())
+
+
+def test_missing_dates_are_skipped():
+    closes = np.array([[5.0, 4.0, np.nan, 3.0], [5.0, 4.0, 3.0, np.nan]])
+    assert screener.three_lower_closes(closes).tolist() == \
+        [[False, False, False, True], [False, False, True, False]]
+
+
+def test_stale_ticker_does_not_match(cache):
+    fresh = np.zeros(4, dtype=BAR_DTYPE)
+    fresh['datetime'] = 86400 * np.arange(4)
+    fresh['close'] = [5.0, 4.0, 3.0, 2.0]
+
+    def fetcher(ticker, fromdate, todate, interval='1d'):
+        # STALE stopped a day before the others, on the same pattern
+        return fresh[:3].copy() if ticker == 'STALE' else fresh.copy()
+
+    cache.fetcher = fetcher
+    tickers = ['FRESH', 'STALE']
+    closes, dates = screener.load(cache, tickers, dt.date(1970, 1, 1),
+                                  dt.date(1970, 1, 4))
+    assert closes.shape == (2, 4)
+    assert np.isnan(closes[1, -1])
+
+    matches = screener.screen(tickers, closes, dates, last=1)
+    assert [match['ticker'] for match in matches] == ['FRESH']
+    assert matches[0]['date'] == np.datetime64('1970-01-04')
+    assert len(screener.screen(tickers, closes, dates, last=2)) == 3
@@ -0,0 +1,71 @@
+import datetime as dt
+import json
+
+import backtrader as bt
+import pytest
+
+import stratlog
+import strategies as strg
+from feeds import ArrayData
+
+
+@pytest.fixture(autouse=True)
+def quiet():
+    yield
+    stratlog.quiet()
+
+
+class _Strategy(object):
+    # Enough of a strategy for log when dt is given
+    pass
+
+
+def test_levels_and_ring():
+    logger = stratlog.configure(level=stratlog.INFO, stdout=False, ringsize=2)
+    when = dt.date(2021, 5, 20)
+    stratlog.log(_Strategy(), 'hidden %s', 1, level=stratlog.DEBUG, dt=when)
+    for i in range(3):
+        stratlog.log(_Strategy(), 'close %.2f', i, dt=when)
+    stratlog.log(_Strategy(), 'margin', level=stratlog.WARNING, dt=when)
+
+    assert logger.records() == [
+        dict(dt='2021-05-20', level='INFO', strategy='_Strategy',
+             msg='close 2.00'),
+        dict(dt='2021-05-20', level='WARNING', strategy='_Strategy',
+             msg='margin')]
+
+
+def test_stdout(capsys):
+    stratlog.configure(level=stratlog.DEBUG)
+    stratlog.log(_Strategy(), 'BUY CREATE, %s', 10.5, dt=dt.date(2021, 5, 20))
+    assert capsys.readouterr().out == '2021-05-20, BUY CREATE, 10.5\n'
+
+
+def test_quiet_skips_formatting():
+    stratlog.quiet()
+
+    class Fails(object):
+        def __mod__(self, args):
+            raise AssertionError('formatted')
+
+    # Neither the date nor the text are needed below the level
+    stratlog.log(None, Fails(), 1, level=stratlog.WARNING)
+
+
+def test_file(bars, tmp_path):
+    filename = str(tmp_path / 'log.jsonl')
+    logger = stratlog.configure(stdout=False, filename=filename, batch=7)
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.adddata(ArrayData(dataname=bars))
+    cerebro.broker.setcash(1000)
+    cerebro.addstrategy(strg.GoldenCross, fast=10, slow=50)
+    cerebro.run()
+    logger.close()
+
+    with open(filename) as f:
+        records = [json.loads(line) for line in f]
+    assert records
+    assert all(record['strategy'] == 'GoldenCross' for record in records)
+    assert any(record['msg'].startswith('Buy ') for record in records)
+    assert [record['dt'] for record in records] == \
+        sorted(record['dt'] for record in records)
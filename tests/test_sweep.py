@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+import strategies as strg
+import vectorized
+from sweep import _splitgrid, sweep
+
+
+def test_sweep_matches_single_runs(bars):
+    rows = sweep(strg.GoldenCross, bars, processes=2, fast=[10, 20],
+                 slow=[50, 100])
+
+    assert len(rows) == 4
+    assert [row['fundvalue'] for row in rows] == \
+        sorted((row['fundvalue'] for row in rows), reverse=True)
+    for row in rows:
+        _, value, fundvalue = vectorized.run_cerebro(
+            strg.GoldenCross, bars, fast=row['fast'], slow=row['slow'])
+        assert row['value'] == value[-1]
+        assert row['fundvalue'] == fundvalue[-1]
+
+
+def test_splitgrid_chunks_every_combination():
+    chunks = list(_splitgrid(dict(a=[1, 2], b=range(3), c=[7, 8]), 5))
+    assert [len(chunk) for chunk in chunks] == [3, 3, 2, 2, 2]
+    combos = [params for chunk in chunks for params in chunk]
+    assert len(combos) == 12
+    assert len(set(tuple(sorted(params.items())) for params in combos)) == 12
+
+
+def test_one_param_grid_uses_many_tasks():
+    chunks = list(_splitgrid(dict(maPeriod=range(10, 50)), 8))
+    assert len(chunks) == 8
+    assert list(_splitgrid(dict(maPeriod=[10, 20]), 8)) == \
+        [[dict(maPeriod=10)], [dict(maPeriod=20)]]
+
+
+def test_splitgrid_values():
+    # Any iterable but a string is a list of values
+    chunks = list(_splitgrid(dict(fast=np.array([10, 20]), name='abc',
+                                  slow=(x for x in [50])), 2))
+    assert chunks == [[dict(fast=10, name='abc', slow=50)],
+                      [dict(fast=20, name='abc', slow=50)]]
+    assert type(chunks[0][0]['fast']) is int
+
+
+def test_splitgrid_skip():
+    chunks = list(_splitgrid(dict(a=[1, 2], b=[3, 4]), 4,
+                             skip=lambda params: params['b'] == 4 or
+                             params['a'] == 2))
+    assert chunks == [[dict(a=1, b=3)]]
+    assert list(_splitgrid(dict(a=[1]), 4, skip=lambda params: True)) == []
+
+
+def test_one_param_sweep(bars):
+    rows = sweep(strg.smaStrategy, bars, processes=2,
+                 maPeriod=[10, 15, 20, 30, 40])
+    assert sorted(row['maPeriod'] for row in rows) == [10, 15, 20, 30, 40]
+    for row in rows:
+        _, value, _ = vectorized.run_cerebro(strg.smaStrategy, bars,
+                                             maPeriod=row['maPeriod'])
+        assert row['value'] == value[-1]
+
+
+def test_empty_grid(bars):
+    with pytest.raises(ValueError):
+        list(_splitgrid(dict(), 4))
+    with pytest.raises(ValueError):
+        sweep(strg.GoldenCross, bars)
@@ -0,0 +1,68 @@
+import datetime as dt
+
+import results
+import strategies as strg
+import universe
+import vectorized
+
+
+FROMDATE, TODATE = dt.date(1970, 1, 1), dt.date(1975, 1, 1)
+
+
+def _fill(cache, bars):
+    # Workers read the cache offline, the fake fetcher only lives here
+    cache.get('SYN', FROMDATE, TODATE)
+    fetcher = cache.fetcher
+    cache.fetcher = lambda ticker, *args: fetcher(ticker, *args)[:800]
+    cache.get('SHORT', FROMDATE, TODATE)
+    return dict(SYN=bars, SHORT=bars[:800])
+
+
+def test_run(cache, bars):
+    barsets = _fill(cache, bars)
+    rows = universe.run(strg.GoldenCross, ['SYN', 'MISSING', 'SHORT'],
+                        FROMDATE, TODATE, cachedir=cache.cachedir,
+                        offline=True, processes=2, fast=10, slow=50)
+
+    assert [row['ticker'] for row in rows][-1] == 'MISSING'
+    assert rows[-1]['error']
+    for row in rows[:-1]:
+        assert row['error'] == ''
+        ticker = barsets[row['ticker']]
+        _, value, fundvalue = vectorized.run_cerebro(strg.GoldenCross, ticker,
+                                                     fast=10, slow=50)
+        assert row['bars'] == len(ticker)
+        assert (row['value'], row['fundvalue']) == (value[-1], fundvalue[-1])
+        assert row['trades'] > 0
+    assert rows[0]['fundvalue'] >= rows[1]['fundvalue']
+
+
+def test_store(cache, bars, tmp_path):
+    _fill(cache, bars)
+    kwargs = dict(cachedir=cache.cachedir, offline=True, processes=1,
+                  fast=10, slow=50)
+    with results.ResultStore(str(tmp_path / 'results.db')) as store:
+        first = universe.run(strg.GoldenCross, ['SYN', 'SHORT'], FROMDATE,
+                             TODATE, store=store, **kwargs)
+        assert len(store.query(strategy=strg.GoldenCross)) == 2
+
+        second = universe.run(strg.GoldenCross, ['SYN', 'SHORT'], FROMDATE,
+                              TODATE, store=store, **kwargs)
+        assert second == first
+        assert len(store.query()) == 2
+        assert store.query(ticker='SHORT')[0]['todate'] == \
+            results.daterange(bars[:800])[1]
+
+
+def test_plots_per_strategy(cache, bars, tmp_path):
+    _fill(cache, bars)
+    plotdir = tmp_path / 'charts'
+    for strategy, params in ((strg.GoldenCross, dict(fast=10, slow=50)),
+                             (strg.GoldenCross, dict(fast=20, slow=50)),
+                             (strg.smaStrategy, dict())):
+        universe.run(strategy, ['SHORT'], FROMDATE, TODATE,
+                     cachedir=cache.cachedir, offline=True, processes=1,
+                     plotdir=str(plotdir), **params)
+    assert sorted(path.name for path in plotdir.iterdir()) == [
+        'SHORT.GoldenCross.fast=10,slow=50.png',
+        'SHORT.GoldenCross.fast=20,slow=50.png', 'SHORT.smaStrategy.png']
@@ -0,0 +1,75 @@
+import math
+
+import numpy as np
+import pytest
+
+import strategies as strg
+import vectorized
+
+
+def test_sma_is_exact(bars):
+    closes = bars['close']
+    average = vectorized.sma(closes, 30)
+    assert np.isnan(average[:29]).all()
+    expected = [math.fsum(closes[i - 29:i + 1]) / 30
+                for i in range(29, len(closes))]
+    assert np.array_equal(average[29:], expected)
+
+
+def test_crossover():
+    fast = np.array([np.nan, 1.0, 2.0, 2.0, 3.0, 2.0, 1.0])
+    slow = np.array([np.nan, 2.0, 2.0, 2.0, 2.0, 2.0, 2.0])
+    assert vectorized.crossover(fast, slow, 1).tolist() == \
+        [0.0, 0.0, 0.0, 0.0, 1.0, 0.0, -1.0]
+
+
+@pytest.mark.parametrize('strategy, kwargs', [
+    (strg.smaStrategy, dict()),
+    (strg.smaStrategy, dict(maPeriod=40)),
+    (strg.GoldenCross, dict(fast=10, slow=50)),
+    (strg.GoldenCross, dict(fast=20, slow=100, orderPercentage=0.5)),
+    (strg.wmaStrategy, dict(volReltship=1.0)),
+])
+def test_matches_cerebro(bars, strategy, kwargs):
+    vectorized.validate(strategy, bars, **kwargs)
+    fills, _, _ = vectorized.run(strategy, bars, **kwargs)
+    assert len(fills) > 2
+
+
+def test_data_shorter_than_the_averages(bars):
+    # backtrader itself fails there, nothing is traded
+    fills, value, fundvalue = vectorized.run(strg.GoldenCross, bars[:100])
+    assert len(fills) == 0
+    assert (value == 1000).all() and (fundvalue == 100).all()
+
+
+@pytest.mark.parametrize('monthly_cash', [100.0, 250.0])
+def test_dca_matches_cerebro(bars, monthly_cash):
+    vectorized.validate(strg.BuyAndHold_More_Fund, bars,
+                        monthly_cash=monthly_cash)
+
+
+def test_dca_amounts_at_once(bars):
+    amounts = [50.0, 100.0, 300.0]
+    records, value, fundvalue = vectorized.dca(bars, 1000, amounts)
+    assert value.shape == fundvalue.shape == (3, len(bars))
+    for i, amount in enumerate(amounts):
+        _, single, singlefund = vectorized.run_dca(bars, 1000, amount)
+        assert np.array_equal(value[i], single)
+        assert np.array_equal(fundvalue[i], singlefund)
+
+    rows = vectorized.dca_grid(dict(SYN=bars, EMPTY=bars[:0]), 1000, amounts)
+    assert len(rows) == 3 and all(row['ticker'] == 'SYN' for row in rows)
+    assert [row['fundvalue'] for row in rows] == \
+        sorted(fundvalue[:, -1], reverse=True)
+    assert rows[0]['contributed'] == \
+        records['contribution'][amounts.index(rows[0]['monthly_cash'])].sum()
+
+
+def test_schedule(bars):
+    months = vectorized.schedule(bars)
+    assert months[0] == 0
+    dates = bars['datetime'][months].astype('datetime64[s]')
+    assert len(set(dates.astype('datetime64[M]'))) == len(months)
+    assert (dates.astype('datetime64[D]') - dates.astype('datetime64[M]')
+            <= np.timedelta64(3, 'D')).all()
@@ -0,0 +1,54 @@
+import numpy as np
+
+import vectorized
+import walkforward
+
+
+FAST, SLOW = [10, 20], [50, 100]
+
+
+def test_windows():
+    assert walkforward.windows(10, 4, 3) == [(0, 4, 7), (3, 7, 10)]
+    assert walkforward.windows(11, 4, 3) == [(0, 4, 7), (3, 7, 10), (6, 10, 11)]
+    assert walkforward.windows(4, 4, 3) == []
+
+
+def test_whole_history_matches_run_goldencross(bars):
+    pairs = [(10, 50), (20, 100), (50, 20)]
+    cross, starts = walkforward.crossovers(bars['close'], pairs)
+    for row, (fast, slow) in enumerate(pairs):
+        expected = vectorized.run_goldencross(bars, fast=fast, slow=slow)
+        result = walkforward.backtest(bars, cross[row], starts[row], 0,
+                                      len(bars), 1000, 0.95)
+        assert np.array_equal(result[0], expected[0])
+        assert np.array_equal(result[1], expected[1])
+
+
+def test_walkforward(bars):
+    rows, equity = walkforward.walkforward(bars, FAST, SLOW, train=400,
+                                           test=250, processes=2)
+    spans = walkforward.windows(len(bars), 400, 250)
+    assert len(rows) == len(spans) == 5
+    assert len(equity) == len(bars) - 400
+    assert np.array_equal(equity['datetime'], bars['datetime'][400:])
+
+    pairs = [(fast, slow) for fast in FAST for slow in SLOW]
+    cross, starts = walkforward.crossovers(bars['close'], pairs)
+    cash = 1000
+    for row, (first, teststart, testend) in zip(rows, spans):
+        # The best pair of the train window...
+        trained = [walkforward.backtest(bars, cross[i], starts[i], first,
+                                        teststart, 1000, 0.95)[2][-1]
+                   for i in range(len(pairs))]
+        best = int(np.argmax(trained))
+        assert (row['fast'], row['slow']) == pairs[best]
+        assert row['trainvalue'] == trained[best]
+
+        # ... run on the test bars with the cash left by the previous one
+        _, value, fundvalue = walkforward.backtest(
+            bars, cross[best], starts[best], teststart, testend, cash, 0.95)
+        assert row['testvalue'] == fundvalue[-1]
+        assert np.array_equal(equity['value'][teststart - 400:testend - 400],
+                              value)
+        cash = value[-1]
+    assert equity['fundvalue'][-1] == cash / 10.0
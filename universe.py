@@ -0,0 +1,200 @@
+import multiprocessing
+import os
+import resource
+
+import backtrader as bt
+import numpy as np
+
+import ledger
+import plotting
+import results
+import stratlog
+from datacache import DataCache
+from sweep import FinalValue, print_table
+
+
+# Worker process state, set once per process by _initworker
+_worker = dict()
+
+
+def _initworker(cachedir, offline, memlimit):
+    stratlog.quiet()
+    if memlimit:
+        # Past the cap allocations fail (MemoryError) instead of the machine
+        # running out of memory
+        limit = memlimit * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    _worker['cache'] = DataCache(cachedir, offline=offline)
+
+
+def _runticker(task):
+    (ticker, strategy, fromdate, todate, cash, exactbars, plotdir, curve,
+     params) = task
+    row = dict(ticker=ticker, bars=0, value=np.nan, fundvalue=np.nan,
+               trades=0, maxdrawdown=np.nan, error='')
+
+    try:
+        cerebro = bt.Cerebro(stdstats=False, exactbars=exactbars)
+        data = _worker['cache'].getfeed(ticker, fromdate, todate)
+        cerebro.adddata(data)
+        cerebro.broker.setcash(cash)
+        cerebro.addstrategy(strategy, **params)
+        cerebro.addanalyzer(FinalValue, _name='finalvalue')
+        cerebro.addanalyzer(bt.analyzers.DrawDown, _name='drawdown')
+        if curve:
+            cerebro.addanalyzer(results.FundCurve, _name='fundcurve')
+
+        strat = cerebro.run()[0]
+        row['bars'] = len(data)
+        row.update(strat.analyzers.finalvalue.get_analysis())
+        row['maxdrawdown'] = strat.analyzers.drawdown.get_analysis().max.drawdown
+        if hasattr(strat, 'ledger'):
+            row['trades'] = int(np.count_nonzero(
+                strat.ledger.records['kind'] == ledger.TRADE))
+        if plotdir:
+            plotting.plot(strat, os.path.join(plotdir, plotname(
+                ticker, strategy, params)))
+        if curve:
+            row['curve'] = strat.analyzers.fundcurve.get_analysis()['curve']
+    except (Exception, MemoryError) as e:
+        row['error'] = '{}: {}'.format(type(e).__name__, e)
+
+    return row
+
+
+def plotname(ticker, strategy, params):
+    ''' <ticker>.<strategy>[.<name>=<value>,...].png, params sorted by name '''
+    name = '{}.{}'.format(ticker, strategy.__name__)
+    if params:
+        name += '.' + ','.join('{}={}'.format(key, value)
+                               for key, value in sorted(params.items()))
+    return name + '.png'
+
+
+def run(strategy, tickers, fromdate, todate, cash=1000, cachedir='cache',
+        offline=False, processes=None, exactbars=-2, memlimit=None,
+        maxtasksperchild=100, plotdir=None, store=None, **params):
+    '''Run a strategy over every ticker of a universe, one Cerebro each.
+
+    Tickers are handed out one at a time to a process pool. A worker only
+    holds the ticker it is running: the bars are read from the local cache
+    (memory-mapped) and the feed converts them in chunks, with exactbars the
+    lines of the run are not all kept either.
+
+    Parameters
+    ----------
+    strategy: bt.Strategy subclass
+    tickers: list
+    fromdate, todate: date
+    cash: float
+    Starting cash of every run.
+    cachedir: str
+    offline: bool
+    See DataCache. Missing bars are downloaded unless offline.
+    processes: int
+    Pool size, defaults to the number of cores.
+    exactbars: int
+    Cerebro exactbars, the default -2 keeps full lines only for the data and
+    the indicators of the strategy. 1 saves the most memory but only suits
+    strategies that declare their lookback (CandleStrat does not).
+    memlimit: int
+    Address space cap of every worker in MB, a ticker going over it fails
+    with MemoryError.
+    maxtasksperchild: int
+    Tickers run by a worker before it is replaced, returning its memory.
+    plotdir: str
+    Save the chart of every ticker in plotdir, named by plotname (see
+    plotting.plot), drawn by the worker that ran it.
+    store: results.ResultStore
+    Save the run of every ticker with its fund curve. Tickers already
+    stored for the same bars are not run again but read from it, their
+    bars are read (and updated) by this process first to hash them.
+
+    Returns one dict per ticker (bars, final value and fund value, closed
+    trades, max drawdown % and error, empty if it ran) sorted by fund value,
+    best first, failed tickers last.
+    '''
+    if plotdir:
+        os.makedirs(plotdir, exist_ok=True)
+
+    rows, configs = [], dict()
+    if store is not None:
+        cache = DataCache(cachedir, offline=offline)
+        for ticker in tickers:
+            try:
+                bars = cache.get(ticker, fromdate, todate)
+            except Exception:
+                continue  # run anyway, the worker reports the error
+            datahash = results.datahash(bars)
+            first, last = results.daterange(bars)
+            configs[ticker] = dict(
+                hash=results.confighash(strategy, params, ticker, first, last,
+                                        datahash, cash),
+                strategy=strategy.__name__,
+                params=results.allparams(strategy, params), ticker=ticker,
+                fromdate=first, todate=last, datahash=datahash, cash=cash)
+
+        done = store.done(config['hash'] for config in configs.values())
+        for stored in store.query(hashes=done):
+            rows.append(dict((name, stored[name]) for name in (
+                'ticker', 'bars', 'value', 'fundvalue', 'trades',
+                'maxdrawdown')))
+            rows[-1]['error'] = ''
+        tickers = [ticker for ticker in tickers
+                   if ticker not in configs or configs[ticker]['hash'] not in done]
+
+    tasks = [(ticker, strategy, fromdate, todate, cash, exactbars, plotdir,
+              store is not None, params) for ticker in tickers]
+
+    initargs = (cachedir, offline, memlimit)
+    try:
+        with multiprocessing.Pool(processes, _initworker, initargs,
+                                  maxtasksperchild=maxtasksperchild) as pool:
+            for row in pool.imap_unordered(_runticker, tasks):
+                curve = row.pop('curve', None)
+                if store is not None and not row['error'] and \
+                   row['ticker'] in configs:
+                    stored = dict(configs[row['ticker']])
+                    stored.update((name, row[name]) for name in (
+                        'bars', 'value', 'fundvalue', 'trades', 'maxdrawdown'))
+                    store.add(stored, curve)
+                rows.append(row)
+    finally:
+        if store is not None:
+            store.flush()
+
+    rows.sort(key=lambda row: (bool(row['error']), -np.nan_to_num(row['fundvalue'])))
+    return rows
+
+
+if __name__ == '__main__':
+    import argparse
+    import datetime as dt
+
+    import strategies as strg
+
+    parser = argparse.ArgumentParser(
+        description='Run a strategy over a list of tickers')
+    parser.add_argument('strategy', help='strategy class, e.g. GoldenCross')
+    parser.add_argument('tickers', help='file with one ticker per line')
+    parser.add_argument('--fromdate', default='2007-01-01')
+    parser.add_argument('--todate', default=dt.date.today().isoformat())
+    parser.add_argument('--processes', type=int)
+    parser.add_argument('--memlimit', type=int, help='MB per worker')
+    parser.add_argument('--offline', action='store_true')
+    parser.add_argument('--plotdir', help='save a chart per ticker here')
+    parser.add_argument('--store', help='results database, e.g. results.db')
+    args = parser.parse_args()
+
+    with open(args.tickers) as f:
+        tickers = [line.strip() for line in f if line.strip()]
+
+    store = results.ResultStore(args.store) if args.store else None
+    rows = run(getattr(strg, args.strategy), tickers,
+               dt.date.fromisoformat(args.fromdate),
+               dt.date.fromisoformat(args.todate),
+               offline=args.offline, processes=args.processes,
+               memlimit=args.memlimit, plotdir=args.plotdir, store=store)
+    if store is not None:
+        store.close()
+    print_table(rows)
@@ -0,0 +1,456 @@
+import contextlib
+import io
+import math
+
+import backtrader as bt
+import numpy as np
+
+import datacache
+import strategies as strg
+from feeds import ArrayData
+
+
+# Trades produced by the vectorized engine, one row per filled order
+FILL_DTYPE = np.dtype([
+    ('bar', 'i8'),  # index of the bar where the order was filled
+    ('size', 'i8'),  # positive buy, negative sell
+    ('price', 'f8'),
+])
+
+
+def sma(values, period):
+    '''Simple moving average, bit for bit equal to backtrader's SMA.
+
+    Backtrader sums every window with math.fsum (correctly rounded). Here the
+    values are turned into exact integers (scaled by a common power of 2), so
+    a running sum gives the exact window sums, which are then rounded once.
+    The first period - 1 values are NaN.
+    '''
+    values = np.asarray(values, dtype='f8')
+    out = np.full(len(values), np.nan)
+    if len(values) < period:
+        return out
+
+    mant, expo = np.frexp(values)
+    mant = (mant * 2.0 ** 53).astype('i8')  # exact, frexp mantissa has 53 bits
+    expo = expo - 53
+    emin = int(expo[mant != 0].min()) if mant.any() else 0
+
+    # Python ints (object arrays) do not overflow
+    exact = mant.astype(object) * (2 ** (expo - emin).astype(object))
+    csum = np.concatenate(([0], np.cumsum(exact)))
+    windows = csum[period:] - csum[:-period]
+
+    # int / int is correctly rounded in Python, just like fsum
+    if emin < 0:
+        sums = windows / (2 ** -emin)
+    else:
+        sums = windows * (2 ** emin)
+    out[period - 1:] = sums.astype('f8') / period
+    return out
+
+
+def crossover(data0, data1, start):
+    '''backtrader's CrossOver of two lines: 1.0 when data0 crosses data1
+    upwards, -1.0 downwards and 0.0 otherwise. Defined from start + 1, where
+    start is the first index with both lines available.
+    '''
+    diff = data0 - data1
+    cross = np.zeros(len(diff))
+    if start >= len(diff):
+        return cross
+
+    # Last non zero difference (seeded with the first difference)
+    idx = np.where(diff != 0.0, np.arange(len(diff)), 0)
+    idx[:start + 1] = start
+    nzd = diff[np.maximum.accumulate(idx)]
+
+    before, after = nzd[start:-1], slice(start + 1, None)
+    cross[after] = ((before < 0.0) & (data0[after] > data1[after])).astype('f8')
+    cross[after] -= ((before > 0.0) & (data0[after] < data1[after]))
+    return cross
+
+
+def backtest(bars, buysignal, sellsignal, start, cash, orderPercentage):
+    '''Fills and fund curve of a long only, all in/all out strategy.
+
+    Orders are sized with math.floor(orderPercentage * cash / close), sent at
+    market when a signal is seen (from the start bar on) and filled at the
+    open of the next bar, like backtrader's default broker does. A buy with
+    not enough cash at the open is rejected. The loop only runs once per
+    trade, the bars in between are handled with array operations.
+
+    Returns (fills, value, fundvalue).
+    '''
+    opens, closes = bars['open'], bars['close']
+    n = len(closes)
+
+    buys = np.flatnonzero(buysignal[start:]) + start
+    sells = np.flatnonzero(sellsignal[start:]) + start
+
+    fills = []
+    value = np.empty(n)
+    size, entry, last = 0, 0.0, 0  # position and first bar not valued yet
+    fundshares = cash / 100.0  # fundstartval=100 in every strategy
+    i = start
+
+    while True:
+        # Next signal of the current side, from bar i
+        signals = sells if size else buys
+        k = np.searchsorted(signals, i)
+        if k == len(signals) or signals[k] + 1 >= n:
+            break  # no more orders or order not filled before the end
+
+        created, filled = signals[k], signals[k] + 1
+        price = opens[filled]
+
+        if not size:
+            ordersize = math.floor(orderPercentage * cash / closes[created])
+            if not ordersize:
+                i = filled  # backtrader does not send an order for 0 shares
+                continue
+
+            _valuecurve(value, last, filled, cash, size, entry, closes)
+            last = filled
+            if cash - ordersize * closes[created] < 0.0 or \
+               cash - ordersize * price < 0.0:
+                i = filled  # margin, order rejected
+                continue
+
+            cash -= ordersize * price
+            size, entry = ordersize, price
+            fills.append((filled, ordersize, price))
+        else:
+            _valuecurve(value, last, filled, cash, size, entry, closes)
+            last = filled
+            # closed value at entry price plus pnl, as backtrader does
+            cash += size * entry + size * (price - entry)
+            fills.append((filled, -size, price))
+            size, entry = 0, 0.0
+
+        i = filled
+
+    _valuecurve(value, last, n, cash, size, entry, closes)
+    return np.array(fills, dtype=FILL_DTYPE), value, value / fundshares
+
+
+def _valuecurve(value, first, last, cash, size, entry, closes):
+    # Broker value of the bars first:last, same operations as backtrader
+    if not size:
+        value[first:last] = cash
+        return
+
+    closes = closes[first:last]
+    dvalue = size * closes
+    unrealized = size * (closes - entry)
+    value[first:last] = cash + ((dvalue - unrealized) + unrealized)
+
+
+def run_sma(bars, cash=1000, maPeriod=15, orderPercentage=0.95):
+    ''' smaStrategy: long while the close is above its SMA '''
+    closes = bars['close']
+    average = sma(closes, maPeriod)
+    return backtest(bars, closes > average, closes < average, maPeriod - 1,
+                    cash, orderPercentage)
+
+
+def run_goldencross(bars, cash=1000, fast=50, slow=200, orderPercentage=0.95):
+    ''' GoldenCross: long between an upward and a downward SMA crossover '''
+    closes = bars['close']
+    start = max(fast, slow) - 1
+    cross = crossover(sma(closes, fast), sma(closes, slow), start)
+    return backtest(bars, cross > 0.0, cross < 0.0, start + 1, cash,
+                    orderPercentage)
+
+
+def wma(values, period):
+    '''Weighted moving average, bit for bit equal to backtrader's WMA: the
+    same rounded products summed with math.fsum. The first period - 1 values
+    are NaN.
+    '''
+    values = np.asarray(values, dtype='f8')
+    out = np.full(len(values), np.nan)
+    if len(values) < period:
+        return out
+
+    coef = 2.0 / (period * (period + 1.0))
+    weights = np.arange(1.0, period + 1.0)
+    windows = np.lib.stride_tricks.sliding_window_view(values, period) * weights
+    out[period - 1:] = [coef * math.fsum(window) for window in windows.tolist()]
+    return out
+
+
+def run_wma(bars, cash=1000, wmaPriceperiod=30, wmaVolumePeriod=4,
+            volReltship=1.05, orderPercentage=0.99):
+    '''wmaStrategy: long from a weekly close above its WMA to one 2% below,
+    both on a weekly volume above the average of the previous weeks.
+
+    The weekly bars are resampled from the daily ones and, like with
+    cerebro.resampledata, a week is seen from the first daily bar of the
+    next one.
+    '''
+    weekly = datacache.resample(bars, '1wk')
+    closes, volumes = weekly['close'], weekly['volume']
+    average = wma(closes, wmaPriceperiod)
+
+    # RollingStats(period=wmaVolumePeriod, lag=1).mean, as computed in once
+    csum = np.concatenate(([0.0], np.cumsum(volumes)))
+    volmean = np.full(len(weekly), np.nan)
+    volmean[wmaVolumePeriod:] = (csum[wmaVolumePeriod:-1] -
+                                 csum[:-wmaVolumePeriod - 1]) / wmaVolumePeriod
+
+    # Weeks seen on every daily bar, the strategy starts when all the
+    # indicators have their period
+    keys = datacache.periodkeys(bars['datetime'], '1wk')
+    weekstarts = np.flatnonzero(np.diff(keys)) + 1
+    seen = np.searchsorted(weekstarts, np.arange(len(bars)), side='right')
+    week = np.maximum(seen - 1, 0)
+    ready = seen >= max(wmaPriceperiod, wmaVolumePeriod + 1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        highvolume = ready & (volumes[week] / volmean[week] > volReltship)
+    buys = highvolume & (closes[week] > average[week])
+    sells = highvolume & (closes[week] < 0.98 * average[week])
+
+    start = int(np.argmax(ready)) if ready.any() else len(bars)
+    return backtest(bars, buys, sells, start, cash, orderPercentage)
+
+
+# Monthly purchases of the DCA evaluator, one row per month and cash amount
+MONTH_DTYPE = np.dtype([
+    ('bar', 'i8'),  # first bar of the month, when the cash is added
+    ('contribution', 'f8'),
+    ('size', 'i8'),  # shares bought, filled on the next bar, 0 if none
+    ('price', 'f8'),
+    ('fundshares', 'f8'),  # after the contribution
+])
+
+
+def schedule(bars):
+    '''Index of the first bar of every month of daily bars, where the
+    SESSION_END timer of BuyAndHold_More_Fund (monthdays=[1] with
+    monthcarry) fires. The first bar of the data is always one.
+    '''
+    months = bars['datetime'].astype('datetime64[s]').astype('datetime64[M]')
+    return np.flatnonzero(np.concatenate(([True], months[1:] != months[:-1])))
+
+
+def dca(bars, cash=1000, amounts=(100.0,), months=None):
+    '''BuyAndHold_More_Fund for several monthly cash amounts at once.
+
+    On the first bar of every month the cash is added to the broker, which
+    issues fund shares at the current fund value, and a market order buys
+    as many shares as the cash pays at the close. It is filled at the next
+    open unless the cash is not enough there (margin). The loop runs once
+    per month over all the amounts, the bars in between are array
+    operations with the same float operations as backtrader's broker.
+
+    Parameters
+    ----------
+    bars: np.ndarray
+    BAR_DTYPE daily bars.
+    cash: float
+    Starting cash.
+    amounts: list
+    Monthly cash amounts.
+    months: np.ndarray
+    First bar of every month, see schedule. Computed if not given, pass it
+    to evaluate many amounts of the same bars.
+
+    Returns (months, value, fundvalue): MONTH_DTYPE (amounts x months)
+    records and the (amounts x bars) broker value and fund value.
+    '''
+    opens, closes = bars['open'], bars['close']
+    n = len(closes)
+    if months is None:
+        months = schedule(bars)
+    amounts = np.asarray(amounts, dtype='f8')
+
+    k = len(amounts)
+    cashs = np.full(k, float(cash))
+    sizes = np.zeros(k, dtype='i8')
+    prices = np.zeros(k)  # average price of the position
+    fundshares = np.full(k, cash / 100.0)  # fundstartval=100
+
+    records = np.zeros((k, len(months)), dtype=MONTH_DTYPE)
+    # Position after every fill (segment 0 before any) and the bars where
+    # each one starts
+    segments = [(cashs.copy(), sizes.copy(), prices.copy())]
+    starts = [0]
+    # Fund shares by bar, the contribution counts from the next bar
+    shares = [fundshares.copy()]
+    sharestarts = [0]
+
+    for t, bar in enumerate(months):
+        close = closes[bar]
+        value = cashs + ((sizes * close - sizes * (close - prices)) +
+                         sizes * (close - prices))
+        fundshares = fundshares + amounts / (value / fundshares)
+        cashs = cashs + amounts
+        shares.append(fundshares.copy())
+        sharestarts.append(bar + 1)
+
+        # order_target_value(value + amount), sized at the close
+        diff = (value + amounts) - sizes * close
+        ordersizes = np.where(diff > 0.0, diff // close, 0.0).astype('i8')
+
+        records['bar'][:, t] = bar
+        records['contribution'][:, t] = amounts
+        records['fundshares'][:, t] = fundshares
+        if bar + 1 >= n:
+            continue  # not filled before the end
+
+        # Checked with the cash at the close when submitted and at the open
+        price = opens[bar + 1]
+        filled = (ordersizes > 0) & (cashs - ordersizes * close >= 0.0) & \
+            (cashs - ordersizes * price >= 0.0)
+        ordersizes = np.where(filled, ordersizes, 0)
+
+        newsizes = sizes + ordersizes
+        average = (prices * sizes + ordersizes * price) / np.maximum(newsizes, 1)
+        prices = np.where(filled, np.where(sizes == 0, price, average), prices)
+        cashs = np.where(filled, cashs - ordersizes * price, cashs)
+        sizes = newsizes
+
+        records['size'][:, t] = ordersizes
+        records['price'][:, t] = np.where(filled, price, 0.0)
+        segments.append((cashs.copy(), sizes.copy(), prices.copy()))
+        starts.append(bar + 1)
+
+    # Every bar valued with the position and fund shares it had
+    idx = np.searchsorted(starts, np.arange(n), side='right') - 1
+    cashs, sizes, prices = [np.stack(arrays, axis=1)[:, idx]
+                            for arrays in zip(*segments)]
+    value = cashs + ((sizes * closes - sizes * (closes - prices)) +
+                     sizes * (closes - prices))
+    idx = np.searchsorted(sharestarts, np.arange(n), side='right') - 1
+    fundvalue = value / np.stack(shares, axis=1)[:, idx]
+    return records, value, fundvalue
+
+
+def run_dca(bars, cash=1000, monthly_cash=100.0):
+    ''' BuyAndHold_More_Fund: monthly cash added and invested, see dca '''
+    records, value, fundvalue = dca(bars, cash, [monthly_cash])
+    records = records[0][records[0]['size'] > 0]
+    fills = np.zeros(len(records), dtype=FILL_DTYPE)
+    fills['bar'] = records['bar'] + 1
+    fills['size'] = records['size']
+    fills['price'] = records['price']
+    return fills, value[0], fundvalue[0]
+
+
+def dca_grid(barsets, cash=1000, amounts=(100.0,)):
+    '''Evaluate BuyAndHold_More_Fund over many tickers and monthly amounts.
+
+    The month schedule of every ticker is computed once and all the amounts
+    are run together, see dca.
+
+    Parameters
+    ----------
+    barsets: dict
+    Ticker to BAR_DTYPE daily bars.
+    cash: float
+    amounts: list
+    Monthly cash amounts.
+
+    Returns one dict per ticker and amount (contributed cash, shares held,
+    final value and fund value), best fund value first, for print_table.
+    '''
+    rows = []
+    for ticker, bars in barsets.items():
+        if not len(bars):
+            continue
+
+        records, value, fundvalue = dca(bars, cash, amounts, schedule(bars))
+        for i, amount in enumerate(amounts):
+            rows.append(dict(ticker=ticker, monthly_cash=float(amount),
+                             contributed=float(records['contribution'][i].sum()),
+                             shares=int(records['size'][i].sum()),
+                             value=value[i, -1], fundvalue=fundvalue[i, -1]))
+
+    rows.sort(key=lambda row: -row['fundvalue'])
+    return rows
+
+
+# Strategies with a vectorized version
+VECTORIZED = {
+    strg.smaStrategy: run_sma,
+    strg.GoldenCross: run_goldencross,
+    strg.wmaStrategy: run_wma,
+    strg.BuyAndHold_More_Fund: run_dca,
+}
+
+
+def run(strategy, bars, cash=1000, **kwargs):
+    '''Vectorized backtest of one of the VECTORIZED strategies.
+
+    Takes the same params as the strategy (defaults from the strategy).
+    Returns (fills, value, fundvalue), see backtest.
+    '''
+    params = dict(strategy.params._getitems())
+    params.update(kwargs)
+    return VECTORIZED[strategy](bars, cash=cash, **params)
+
+
+class _Recorder(bt.Analyzer):
+    # Per bar broker value, fund value and fills of the event driven run
+
+    def start(self):
+        self.values = []
+        self.fundvalues = []
+        self.fills = []
+
+    def notify_order(self, order):
+        if order.status == order.Completed:
+            self.fills.append((len(self.strategy) - 1, order.executed.size,
+                               order.executed.price))
+
+    def next(self):
+        self.values.append(self.strategy.broker.getvalue())
+        self.fundvalues.append(self.strategy.broker.get_fundvalue())
+
+
+def run_cerebro(strategy, bars, cash=1000, **kwargs):
+    ''' Same as run, but with the event driven Cerebro engine '''
+    cerebro = bt.Cerebro(stdstats=False)
+    data = ArrayData(dataname=bars)
+    cerebro.adddata(data)
+    if strategy is strg.wmaStrategy:
+        cerebro.resampledata(data, timeframe=bt.TimeFrame.Weeks)
+    cerebro.broker.setcash(cash)
+    cerebro.addstrategy(strategy, **kwargs)
+    cerebro.addanalyzer(_Recorder, _name='recorder')
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        recorder = cerebro.run()[0].analyzers.recorder
+
+    # The resampler delivers the last week with one more call on the last bar
+    n = len(bars)
+    fills = np.array(recorder.fills, dtype=FILL_DTYPE)
+    return fills, np.array(recorder.values[:n]), np.array(recorder.fundvalues[:n])
+
+
+def validate(strategy, bars, cash=1000, **kwargs):
+    '''Check that the vectorized and the event driven engines give the same
+    fills and exactly the same value and fund value curves. Raises
+    AssertionError if not.
+    '''
+    fills, value, fundvalue = run(strategy, bars, cash, **kwargs)
+    btfills, btvalue, btfundvalue = run_cerebro(strategy, bars, cash, **kwargs)
+
+    # The executed price backtrader reports is an average of the execution
+    # bits, which can be one ulp away from the bar open
+    if not (np.array_equal(fills[['bar', 'size']], btfills[['bar', 'size']])
+            and np.allclose(fills['price'], btfills['price'], rtol=1e-12)):
+        raise AssertionError('{} fills differ: {} vs {}'.format(
+            strategy.__name__, fills, btfills))
+
+    if not np.array_equal(value, btvalue):
+        bar = np.flatnonzero(value != btvalue)[0]
+        raise AssertionError('{} value differs from bar {}: {} vs {}'.format(
+            strategy.__name__, bar, value[bar], btvalue[bar]))
+
+    if not np.array_equal(fundvalue, btfundvalue):
+        bar = np.flatnonzero(fundvalue != btfundvalue)[0]
+        raise AssertionError('{} fund value differs from bar {}: {} vs {}'.format(
+            strategy.__name__, bar, fundvalue[bar], btfundvalue[bar]))
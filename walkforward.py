@@ -0,0 +1,182 @@
+import itertools
+import multiprocessing
+
+import numpy as np
+
+import vectorized
+from sharedmem import SharedArray, attach
+
+
+# Stitched out of sample curve, one row per test bar
+EQUITY_DTYPE = np.dtype([
+    ('datetime', 'i8'),
+    ('value', 'f8'),
+    ('fundvalue', 'f8'),
+])
+
+
+def windows(n, train, test):
+    '''Rolling (trainstart, teststart, testend) bar indices over n bars: train
+    bars to optimize on followed by test bars to evaluate on, moved test bars
+    at a time. The last test window can be shorter.
+    '''
+    return [(start, start + train, min(start + train + test, n))
+            for start in range(0, n - train, test)]
+
+
+def crossovers(closes, pairs):
+    '''GoldenCross signals of every (fast, slow) pair over the whole history.
+
+    Each SMA period is computed once and shared by the pairs using it.
+    Returns (cross, starts): the (pairs x bars) crossover matrix and the
+    first bar each pair can trade on.
+    '''
+    periods = sorted(set(itertools.chain(*pairs)))
+    averages = dict((period, vectorized.sma(closes, period))
+                    for period in periods)
+
+    cross = np.zeros((len(pairs), len(closes)))
+    starts = np.zeros(len(pairs), dtype='i8')
+    for row, (fast, slow) in enumerate(pairs):
+        start = max(fast, slow) - 1
+        if start + 1 < len(closes):
+            cross[row] = vectorized.crossover(averages[fast], averages[slow],
+                                              start)
+        starts[row] = start + 1
+    return cross, starts
+
+
+def backtest(bars, cross, start, first, last, cash, orderPercentage):
+    '''GoldenCross over the bars first:last with the crossover computed over
+    the whole history: the indicators are warm from the first bar of the
+    window, which starts flat with cash. See vectorized.backtest.
+    '''
+    return vectorized.backtest(bars[first:last], cross[first:last] > 0.0,
+                               cross[first:last] < 0.0, max(0, start - first),
+                               cash, orderPercentage)
+
+
+# Worker process state, set once per process by _initworker
+_worker = dict()
+
+
+def _initworker(descriptors, starts):
+    _worker['shared'] = [attach(descriptor) for descriptor in descriptors]
+    _worker['starts'] = starts
+
+
+def _optimize(task):
+    # Best pair of a train window by final fund value
+    window, first, last, cash, orderPercentage = task
+    (_, bars), (_, cross) = _worker['shared']
+
+    best, bestvalue = 0, -np.inf
+    for row, start in enumerate(_worker['starts']):
+        _, _, fundvalue = backtest(bars, cross[row], start, first, last, cash,
+                                   orderPercentage)
+        if fundvalue[-1] > bestvalue:
+            best, bestvalue = row, fundvalue[-1]
+
+    return window, best, bestvalue
+
+
+def walkforward(bars, fast=range(10, 60, 10), slow=range(100, 260, 20),
+                train=756, test=252, cash=1000, orderPercentage=0.95,
+                processes=None):
+    '''Walk-forward optimization of GoldenCross.
+
+    For every window (see windows) the (fast, slow) pair with the best fund
+    value on the train bars is run on the test bars that follow. The
+    crossovers of all the pairs are computed once over the whole history
+    (see crossovers) and shared with the workers of a process pool, which
+    optimize the train windows in parallel by slicing them.
+
+    The test windows are chained: each starts flat with the value the
+    previous one ended with (its position sold at the last close).
+
+    Parameters
+    ----------
+    bars: np.ndarray
+    BAR_DTYPE daily bars, for example from DataCache.get.
+    fast, slow: list
+    SMA periods to try, every combination.
+    train, test: int
+    Bars of the train and test windows, 756 and 252 are about 3 years and 1.
+    cash: float
+    Starting cash.
+    orderPercentage: float
+    processes: int
+    Pool size, defaults to the number of cores.
+
+    Returns (rows, equity): one dict per window (dates, best pair, train
+    fund value and the fund value reached in the test window, 100 at its
+    start) and the EQUITY_DTYPE out of sample curve.
+    '''
+    pairs = list(itertools.product(fast, slow))
+    cross, starts = crossovers(bars['close'], pairs)
+    spans = windows(len(bars), train, test)
+
+    shared = [SharedArray(bars), SharedArray(cross)]
+    try:
+        tasks = [(i, first, last, cash, orderPercentage)
+                 for i, (first, last, _) in enumerate(spans)]
+        initargs = ([s.descriptor for s in shared], starts)
+        with multiprocessing.Pool(processes, _initworker, initargs) as pool:
+            best = sorted(pool.imap_unordered(_optimize, tasks))
+    finally:
+        for s in shared:
+            s.close()
+
+    fundshares = cash / 100.0
+    rows = []
+    values = []
+    for (window, row, trainvalue), (first, teststart, testend) in zip(best, spans):
+        _, value, fundvalue = backtest(bars, cross[row], starts[row], teststart,
+                                       testend, cash, orderPercentage)
+        values.append(value)
+        fast, slow = pairs[row]
+        rows.append(dict(trainfrom=_date(bars, first),
+                         testfrom=_date(bars, teststart),
+                         testto=_date(bars, testend - 1), fast=fast, slow=slow,
+                         trainvalue=trainvalue, testvalue=fundvalue[-1]))
+        cash = value[-1]
+
+    teststart = spans[0][1] if spans else len(bars)
+    equity = np.zeros(len(bars) - teststart, dtype=EQUITY_DTYPE)
+    equity['datetime'] = bars['datetime'][teststart:]
+    if values:
+        equity['value'] = np.concatenate(values)
+        equity['fundvalue'] = equity['value'] / fundshares
+    return rows, equity
+
+
+def _date(bars, i):
+    return str(bars['datetime'][i].astype('datetime64[s]').astype('datetime64[D]'))
+
+
+if __name__ == '__main__':
+    import argparse
+    import datetime as dt
+
+    from datacache import DataCache
+    from sweep import print_table
+
+    parser = argparse.ArgumentParser(
+        description='Walk-forward optimization of GoldenCross')
+    parser.add_argument('ticker')
+    parser.add_argument('--fromdate', default='2007-01-01')
+    parser.add_argument('--todate', default='2021-05-20')
+    parser.add_argument('--train', type=int, default=756)
+    parser.add_argument('--test', type=int, default=252)
+    parser.add_argument('--processes', type=int)
+    parser.add_argument('--offline', action='store_true')
+    args = parser.parse_args()
+
+    bars = DataCache(offline=args.offline).get(
+        args.ticker, dt.date.fromisoformat(args.fromdate),
+        dt.date.fromisoformat(args.todate))
+    rows, equity = walkforward(bars, train=args.train, test=args.test,
+                               processes=args.processes)
+    print_table(rows)
+    if len(equity):
+        print('Out of sample fund value: {:.2f}'.format(equity['fundvalue'][-1]))